@@ -0,0 +1,30 @@
+# coding: utf-8
+
+import os
+import argparse
+import logging
+from tmnt.utils.log_utils import logging_config
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
+
+parser = argparse.ArgumentParser('Build a document co-occurrence index over a reference corpus for computing coherence (NPMI)')
+
+parser.add_argument('--vec_file', type=str, help='Reference corpus in sparse vector format')
+parser.add_argument('--vocab_file', type=str, help='Vocabulary file associated with sparse vector data', default=None)
+parser.add_argument('--index_dir', type=str, help='Output directory for index files')
+parser.add_argument('--chunk_size', type=int, help='Number of documents to process at a time', default=10000)
+parser.add_argument('--log_dir', type=str, help='Logging directory', default='.')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    logging_config(folder=args.log_dir, name='cooccurrence_index', level='info')
+    if args.vec_file is None or args.index_dir is None:
+        raise Exception("Reference corpus vector file and index output directory must be provided")
+    vocab_size = None
+    if args.vocab_file:
+        with open(args.vocab_file) as f:
+            vocab_size = sum(1 for _ in f)
+    index = CooccurrenceIndex.from_svmlight_file(args.vec_file, vocab_size=vocab_size, index_dir=args.index_dir,
+                                                 chunk_size=args.chunk_size)
+    logging.info("Co-occurrence index over {} documents (vocabulary size = {}) written to {}"
+                 .format(index.n_docs, index.vocab_size, os.path.join(args.index_dir, index.checksum)))
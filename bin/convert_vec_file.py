@@ -0,0 +1,26 @@
+# coding: utf-8
+
+import argparse
+import logging
+from tmnt.utils.log_utils import logging_config
+from tmnt.data_loading import load_vocab, svmlight_to_binary_corpus
+
+parser = argparse.ArgumentParser('Convert a sparse vector (svmlight) file to a binary, memory-mappable corpus directory')
+
+parser.add_argument('--vec_file', type=str, help='Input corpus in sparse vector format')
+parser.add_argument('--vocab_file', type=str, help='Vocabulary file associated with sparse vector data')
+parser.add_argument('--corpus_dir', type=str, help='Output directory for binary corpus files')
+parser.add_argument('--chunk_size', type=int, help='Number of documents to convert at a time', default=100000)
+parser.add_argument('--str_encoding', type=str, help='String/file encoding to use', default='utf-8')
+parser.add_argument('--log_dir', type=str, help='Logging directory', default='.')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    logging_config(folder=args.log_dir, name='convert_vec_file', level='info')
+    if args.vec_file is None or args.vocab_file is None or args.corpus_dir is None:
+        raise Exception("Vector file, vocabulary file and output corpus directory must be provided")
+    vocab = load_vocab(args.vocab_file, encoding=args.str_encoding)
+    svmlight_to_binary_corpus(args.vec_file, args.corpus_dir, len(vocab), vocabulary=vocab.idx_to_token,
+                              chunk_size=args.chunk_size)
+    logging.info("Binary corpus written to {}".format(args.corpus_dir))
@@ -0,0 +1,30 @@
+# coding: utf-8
+
+import os
+import argparse
+import logging
+from tmnt.utils.log_utils import logging_config
+from tmnt.inference import encode_file_parallel
+
+parser = argparse.ArgumentParser('Encode a corpus with a trained topic model using multiple worker processes')
+
+parser.add_argument('--model_dir', type=str, help='Directory with trained model files')
+parser.add_argument('--input_file', type=str, help='Input corpus in sparse vector format or JSON list format')
+parser.add_argument('--input_format', type=str, help='Input format: vec or json', default='vec')
+parser.add_argument('--output_file', type=str, help='Output .npy file for document encodings')
+parser.add_argument('--num_workers', type=int, help='Number of worker processes (default is the number of CPUs)', default=None)
+parser.add_argument('--num_shards', type=int, help='Number of input shards (default is four per worker)', default=None)
+parser.add_argument('--chunk_size', type=int, help='Number of documents to encode at a time within a worker', default=10000)
+parser.add_argument('--use_probs', action='store_true', help='Output recalibrated topic probabilities')
+parser.add_argument('--log_dir', type=str, help='Logging directory', default='.')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    os.environ["MXNET_STORAGE_FALLBACK_LOG_VERBOSE"] = "0"
+    logging_config(folder=args.log_dir, name='encode_corpus', level='info')
+    if args.model_dir is None or args.input_file is None or args.output_file is None:
+        raise Exception("Model directory, input file and output file must be provided")
+    encodings, _ = encode_file_parallel(args.model_dir, args.input_file, out_file=args.output_file,
+                                        file_format=args.input_format, n_workers=args.num_workers,
+                                        n_shards=args.num_shards, chunk_size=args.chunk_size, use_probs=args.use_probs)
+    logging.info("Encodings for {} documents written to {}".format(encodings.shape[0], args.output_file))
@@ -9,7 +9,7 @@ import mxnet as mx
 from tmnt.inference import BowVAEInferencer
 from tmnt.data_loading import file_to_data, load_vocab
 from tmnt.eval_npmi import NPMI, EvaluateNPMI
-from tmnt.utils.ngram_helpers import BigramReader
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
 from tmnt.data_loading import DataIterLoader, SparseMatrixDataIter
 import gluonnlp as nlp
 
@@ -32,6 +32,8 @@ def setup_parser():
     parser.add_argument('--plot_file', type=str, help='Output plot')
     parser.add_argument('--words_per_topic', type=int, help='Number of terms per topic to output', default=10)
     parser.add_argument('--override_top_k_terms', type=str, help='File of topic terms to use instead of those from model', default=None)
+    parser.add_argument('--reference_index', type=str, default=None,
+                        help='Directory with a co-occurrence index over a reference corpus to compute NPMI against (instead of test_file)')
     return parser
 
 def read_vector_file(file):
@@ -54,6 +56,13 @@ def evaluate(inference, data_loader, total_words, ctx=mx.cpu()):
     return perplexity
 
 
+def get_npmi(npmi_eval, args, vocab):
+    if args.reference_index:
+        return npmi_eval.evaluate_index(CooccurrenceIndex.load(args.reference_index))
+    tst_csr, _, _, _ = file_to_data(args.test_file, len(vocab))
+    return npmi_eval.evaluate_csr_mat(tst_csr)
+
+
 def get_top_k_terms_from_file(in_file):
     top_k_terms = []
     with io.open(in_file, 'r') as fp:
@@ -73,10 +82,9 @@ if __name__ == "__main__":
     vocab = load_vocab(args.vocab_file)        
     if args.override_top_k_terms:
         top_k_words_per_topic = get_top_k_terms_from_file(args.override_top_k_terms)
-        tst_csr, _, _, _ = file_to_data(args.test_file, len(vocab))
         top_k_words_per_topic_ids = [ [ vocab[t] for t in t_set ]  for t_set in top_k_words_per_topic ]
         npmi_eval = EvaluateNPMI(top_k_words_per_topic_ids)
-        test_npmi = npmi_eval.evaluate_csr_mat(tst_csr)
+        test_npmi = get_npmi(npmi_eval, args, vocab)
         print("**** Test NPMI = {} *******".format(test_npmi))
         exit(0)
 
@@ -100,8 +108,7 @@ if __name__ == "__main__":
     top_k_words_per_topic_ids = [ [ inference_model.vocab[t] for t in t_set ]  for t_set in top_k_words_per_topic ]
 
     npmi_eval = EvaluateNPMI(top_k_words_per_topic_ids)
-    tst_csr, _, _, _ = file_to_data(args.test_file, len(vocab))
-    test_npmi = npmi_eval.evaluate_csr_mat(tst_csr)
+    test_npmi = get_npmi(npmi_eval, args, vocab)
     print("**** Test NPMI = {} *******".format(test_npmi))
     exit(0)
 
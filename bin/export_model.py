@@ -17,6 +17,7 @@ parser.add_argument('--json_output_file', type=str, help='JSON output file')
 parser.add_argument('--json_simple', type=str, help='JSON output file')
 parser.add_argument('--html_vis', type=str, help='PyLDAVis HTML file', default=None)
 parser.add_argument('--str_encoding', type=str, help='String/file encoding', default='utf-8')
+parser.add_argument('--bundle_file', type=str, help='NumPy inference bundle (.npz) for use without MXNet', default=None)
 
 args = parser.parse_args()
 
@@ -36,6 +37,9 @@ if __name__ == '__main__':
         vis_data = pyLDAvis.prepare(**opts)
         pyLDAvis.save_html(vis_data, args.html_vis)
 
+    if args.bundle_file:
+        infer.export_bundle(args.bundle_file)
+
     if args.json_simple:
         w_pr, _, _, _ = infer.get_model_details(args.vec_file)
         k, n = w_pr.shape
@@ -9,7 +9,6 @@ import mxnet as mx
 from tmnt.inference import BowVAEInferencer
 from tmnt.data_loading import file_to_data, load_vocab
 from tmnt.eval_npmi import NPMI, EvaluateNPMI
-from tmnt.utils.ngram_helpers import BigramReader
 from tmnt.data_loading import DataIterLoader, SparseMatrixDataIter
 import gluonnlp as nlp
 
@@ -6,6 +6,7 @@ import logging
 import json
 from tmnt.utils.log_utils import logging_config
 from tmnt.preprocess.vectorizer import TMNTVectorizer
+from tmnt.data_loading import write_binary_corpus
 
 parser = argparse.ArgumentParser('Prepare a training and validation/test dataset for topic model training')
 
@@ -32,9 +33,17 @@ parser.add_argument('--label_min_cnt', type=int, help='Minimum label count (lowe
 parser.add_argument('--str_encoding', type=str, help='String/file encoding to use', default='utf-8')
 parser.add_argument('--log_dir', type=str, help='Logging directory', default='.')
 parser.add_argument('--token_pattern', type=str, help='Token regular expression for CountVectorizer', default=None)
+parser.add_argument('--binary', action='store_true',
+                    help='Write vector outputs as binary (memory-mappable) corpus directories rather than svmlight files')
 
 args = parser.parse_args()
 
+def write_vectors(vectorizer, X, y, vec_file):
+    if args.binary:
+        write_binary_corpus(X, y, vec_file, vocabulary=vectorizer.get_vocab().idx_to_token)
+    else:
+        vectorizer.write_to_vec_file(X, y, vec_file)
+
 if __name__ == '__main__':
     logging_config(folder=args.log_dir, name='vectorizer', level='info')
     if args.vocab_file is None:
@@ -56,16 +65,16 @@ if __name__ == '__main__':
                        count_vectorizer_kwargs=count_vectorizer_kwargs)
     tr_X, tr_y = \
         vectorizer.fit_transform_json_dir(args.tr_input) if os.path.isdir(args.tr_input) else vectorizer.fit_transform_json(args.tr_input)
-    vectorizer.write_to_vec_file(tr_X, tr_y, args.tr_vec_file)
+    write_vectors(vectorizer, tr_X, tr_y, args.tr_vec_file)
     vectorizer.write_vocab(args.vocab_file)
     if args.val_input and args.val_vec_file:
         val_X, val_y = \
             vectorizer.transform_json_dir(args.val_input) if os.path.isdir(args.val_input) else vectorizer.transform_json(args.val_input)
-        vectorizer.write_to_vec_file(val_X, val_y, args.val_vec_file)
+        write_vectors(vectorizer, val_X, val_y, args.val_vec_file)
     if args.tst_input and args.tst_vec_file:
         tst_X, tst_y = \
             vectorizer.transform_json_dir(args.tst_input) if os.path.isdir(args.tst_input) else vectorizer.transform_json(args.tst_input)
-        vectorizer.write_to_vec_file(tst_X, tst_y, args.tst_vec_file)
+        write_vectors(vectorizer, tst_X, tst_y, args.tst_vec_file)
     if args.label_map:
         with io.open(args.label_map, 'w') as fp:
             fp.write(json.dumps(vectorizer.label_map, indent=4))
@@ -0,0 +1,46 @@
+# coding: utf-8
+
+import os
+import asyncio
+import argparse
+import logging
+from tmnt.utils.log_utils import logging_config
+from tmnt.serving import InferenceServer
+
+parser = argparse.ArgumentParser('Serve topic model encodings and predictions over HTTP with dynamic micro-batching')
+
+parser.add_argument('--model_dir', type=str, help='Directory with trained model files', default=None)
+parser.add_argument('--bundle_file', type=str, help='NumPy inference bundle (used instead of model_dir; no MXNet)', default=None)
+parser.add_argument('--host', type=str, help='Host address', default='127.0.0.1')
+parser.add_argument('--port', type=int, help='Port', default=8080)
+parser.add_argument('--max_batch_size', type=int, help='Maximum number of texts per batch', default=64)
+parser.add_argument('--max_wait_ms', type=float, help='Maximum wait (milliseconds) for additional texts in a batch', default=5.0)
+parser.add_argument('--log_dir', type=str, help='Logging directory', default='.')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logging_config(folder=args.log_dir, name='serve_model', level='info')
+    if args.bundle_file:
+        from tmnt.runtime import NumpyBowVAEInferencer
+        inferencer = NumpyBowVAEInferencer.from_bundle(args.bundle_file)
+    elif args.model_dir:
+        from tmnt.inference import BowVAEInferencer
+        inferencer = BowVAEInferencer.from_saved(model_dir=args.model_dir)
+    else:
+        raise Exception("Either a model directory or a bundle file must be provided")
+    server = InferenceServer(inferencer, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    async def serve():
+        http_server = await server.serve_http(args.host, args.port)
+        logging.info("Serving on {}:{}".format(args.host, args.port))
+        try:
+            await http_server.serve_forever()
+        finally:
+            http_server.close()
+            await http_server.wait_closed()
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -28,3 +28,9 @@ def test_train_and_get_topics_scipy():
     model.fit(X_scipy)
     model.get_topic_vectors()
     assert(True)
+
+def test_train_and_perplexity_sparse_input():
+    model = BowEstimator(vocabulary, batch_size=32, sparse_input=True)
+    model.fit(X_scipy)
+    assert(model.model.embedding.weight.shape == (100, model.embedding_size))
+    assert(np.isfinite(model.perplexity(X_scipy)))
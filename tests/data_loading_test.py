@@ -0,0 +1,104 @@
+import numpy as np
+from scipy.sparse import random as sp_random
+from sklearn.datasets import dump_svmlight_file
+from tmnt.data_loading import file_to_data, load_binary_corpus, svmlight_to_binary_corpus, write_binary_corpus
+
+X = sp_random(53, 30, density=0.2, format='csr', random_state=0)
+X.data = np.ceil(X.data * 4)
+y = np.arange(X.shape[0]) % 3
+
+def test_binary_corpus(tmp_path):
+    vec_file = str(tmp_path / 'test.vec')
+    dump_svmlight_file(X, y, vec_file)
+    svmlight_to_binary_corpus(vec_file, str(tmp_path / 'corpus'), X.shape[1], chunk_size=10)
+    X_b, y_b, wd_freqs, doc_lengths, meta = load_binary_corpus(str(tmp_path / 'corpus'))
+    base = X_b.indices
+    while not isinstance(base, np.memmap) and base.base is not None:
+        base = base.base
+    assert(isinstance(base, np.memmap)) ## arrays are memory-mapped rather than read into memory
+    assert(abs(X_b - X).sum() == 0 and np.all(y_b == y))
+    assert(np.allclose(wd_freqs, X.sum(axis=0).A1) and np.allclose(doc_lengths, X.sum(axis=1).A1))
+    X_s, y_s, wd_s, total_s = file_to_data(vec_file, X.shape[1])
+    X_f, y_f, wd_f, total_f = file_to_data(str(tmp_path / 'corpus'), X.shape[1])
+    assert(abs(X_f - X_s).sum() == 0 and np.all(y_f == y_s) and total_f == total_s)
+    assert(np.allclose(wd_f.asnumpy(), wd_s.asnumpy()))
+    write_binary_corpus(X, None, str(tmp_path / 'corpus2'), vocabulary=['w{}'.format(i) for i in range(X.shape[1])])
+    X_2, y_2, _, _, meta = load_binary_corpus(str(tmp_path / 'corpus2'))
+    assert(abs(X_2 - X).sum() == 0 and np.all(y_2 == 0) and meta['vocabulary'][3] == 'w3')
+
+def test_sharded_corpus_streaming(tmp_path):
+    from tmnt.data_loading import ShardedCorpus
+    dump_svmlight_file(X[:20], y[:20], str(tmp_path / 'a.vec'))
+    write_binary_corpus(X[20:], y[20:], str(tmp_path / 'b'))
+    corpus = ShardedCorpus(str(tmp_path), X.shape[1], rows_per_shard=8)
+    assert(len(corpus.shards) == 8 and corpus.n_docs == X.shape[0] and corpus.max_label == 2)
+    assert(np.allclose(corpus.word_freqs, X.sum(axis=0).A1))
+    seen = []
+    for data, labels in corpus.get_dataloader(5, shuffle=True, shuffle_buffer=16):
+        assert(data.shape[0] == 5)
+        seen.append(labels.asnumpy())
+    assert(len(seen) == X.shape[0] // 5)
+    batches = list(corpus.get_dataloader(5, last_batch_handle='keep'))
+    assert(np.all(np.concatenate([l.asnumpy() for _, l in batches]) == y))
+    assert(abs(np.vstack([d.asnumpy() for d, _ in batches]) - X.toarray()).sum() < 1e-5)
+    assert(list(corpus._binary_corpora) == [str(tmp_path / 'b')]) ## binary shards share one opened corpus
+    import pickle
+    assert(pickle.loads(pickle.dumps(corpus))._binary_corpora == {})
+
+def test_sparse_matrix_iter_reshuffles():
+    from tmnt.data_loading import SparseMatrixDataIter, DataIterLoader
+    X_orig = X.copy()
+    ids = np.arange(X.shape[0])
+    for block_size in (None, 4):
+        loader = DataIterLoader(SparseMatrixDataIter(X, ids, batch_size=10, shuffle=True, last_batch_handle='pad',
+                                                     shuffle_block_size=block_size))
+        epochs = []
+        for _ in range(2):
+            batches = [(d.asnumpy(), l.asnumpy().astype('int64')) for d, l in loader]
+            for d, l in batches:
+                assert(np.allclose(d, X[l].toarray())) ## labels stay aligned with rows
+            order = np.concatenate([l for _, l in batches])
+            assert(len(order) == 60 and np.all(np.sort(order[:X.shape[0]]) == ids))
+            epochs.append(order)
+        assert(np.any(epochs[0] != epochs[1]))
+    assert(abs(X - X_orig).sum() == 0 and np.all(X.indices == X_orig.indices))
+
+def test_sparse_matrix_iter_block_batches():
+    from tmnt.data_loading import SparseMatrixDataIter
+    ids = np.arange(X.shape[0])
+    it = SparseMatrixDataIter(X, ids, batch_size=10, shuffle=True, last_batch_handle='discard', shuffle_block_size=15)
+    assert(it.shuffle_block_size == 20)
+    n_batches = 0
+    while it.iter_next():
+        rows, labels = it._batch_rows(), it.getlabel()[0]
+        assert(isinstance(rows, slice) and np.all(labels == ids[rows])) ## whole batches lie within a block
+        n_batches += 1
+    assert(n_batches == 5)
+
+def test_sparse_matrix_iter_roll_over():
+    from tmnt.data_loading import SparseMatrixDataIter
+    ids = np.arange(X.shape[0])
+    for block_size in (None, 20):
+        it = SparseMatrixDataIter(X, ids, batch_size=10, shuffle=True, last_batch_handle='roll_over',
+                                  shuffle_block_size=block_size)
+        seen = []
+        for _ in range(3):
+            it.reset()
+            while it.iter_next():
+                seen.append(it.getlabel()[0])
+        seen = np.concatenate(seen)
+        for start in range(0, 3 * X.shape[0], X.shape[0]): ## carried-over rows begin the next epoch's order
+            assert(np.all(np.sort(seen[start:start + X.shape[0]]) == ids))
+
+def test_prefetching_loader():
+    from tmnt.data_loading import SparseMatrixDataIter, DataIterLoader, PrefetchingLoader
+    loader = DataIterLoader(SparseMatrixDataIter(X, None, batch_size=10, last_batch_handle='pad'), num_batches=6)
+    expected = [d.asnumpy() for d, _ in loader]
+    prefetcher = PrefetchingLoader(loader, depth=2)
+    for _ in range(2):
+        for _, (d, l) in zip(range(2), prefetcher): ## abandoned iteration is stopped by the next one
+            pass
+        batches = list(prefetcher)
+        assert(len(batches) == 6 and all(np.allclose(d.asnumpy(), e) for (d, _), e in zip(batches, expected)))
+        assert(batches[0][1].shape == (10, 1) and prefetcher.num_batches == 6)
+    assert(prefetcher.get_stats()['batches'] == 16 and prefetcher.stall_time >= 0.0)
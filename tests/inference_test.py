@@ -0,0 +1,183 @@
+import numpy as np
+import mxnet as mx
+import gluonnlp as nlp
+from scipy.sparse import random as sp_random
+from tmnt.estimator import BowEstimator
+from tmnt.inference import BowVAEInferencer
+from tmnt.utils.recalibrate import recalibrate_scores_batch
+
+vocabulary = nlp.Vocab(nlp.data.Counter(['a'*i for i in range(1, 41)]), unknown_token=None, padding_token=None,
+                       bos_token=None, eos_token=None)
+X = sp_random(37, 40, density=0.2, format='csr', random_state=0, dtype='float32')
+
+def _get_inferencer(**kwargs):
+    model = BowEstimator(vocabulary, batch_size=10, epochs=1)
+    model.fit(X)
+    return BowVAEInferencer(model, **kwargs)
+
+def test_encode_array():
+    inferencer = _get_inferencer(batch_size=8)
+    encs = inferencer.encode_array(X, use_probs=False)
+    assert(encs.shape == (X.shape[0], inferencer.n_latent) and encs.dtype == np.float32)
+    expected = inferencer.model.encode_data(mx.nd.array(X.toarray())).asnumpy()
+    assert(np.allclose(encs, expected, atol=1e-5))
+    probs = inferencer.encode_array(X, batch_size=5)
+    e1 = (expected - expected.min(axis=1, keepdims=True)).astype('float64')
+    e1 = np.exp(e1 - e1.max(axis=1, keepdims=True))
+    ## the reference encodings come from a dense forward pass, so allow for float32 matmul differences
+    assert(np.allclose(probs, recalibrate_scores_batch(e1 / e1.sum(axis=1, keepdims=True)), atol=1e-4))
+    assert(np.allclose(np.array(inferencer.encode_data(X)), probs))
+
+def test_streaming_encode(tmp_path):
+    from sklearn.datasets import dump_svmlight_file
+    inferencer = _get_inferencer()
+    vec_file = str(tmp_path / 'test.vec')
+    dump_svmlight_file(X, np.arange(X.shape[0]), vec_file)
+    chunks = list(inferencer.iter_encode_vec_file(vec_file, chunk_size=10))
+    assert(len(chunks) == 4)
+    assert(np.all(np.concatenate([labels for _, labels in chunks]) == np.arange(X.shape[0])))
+    expected = inferencer.encode_array(X, use_probs=False)
+    assert(np.allclose(np.concatenate([encs for encs, _ in chunks]), expected, atol=1e-5))
+    out = inferencer.write_encodings(inferencer.iter_encode_vec_file(vec_file, chunk_size=10), str(tmp_path / 'encs.npy'),
+                                     X.shape[0])
+    assert(np.allclose(np.load(str(tmp_path / 'encs.npy')), expected, atol=1e-5))
+    from tmnt.data_loading import svmlight_to_binary_corpus
+    svmlight_to_binary_corpus(vec_file, str(tmp_path / 'corpus'), X.shape[1])
+    binary_chunks = list(inferencer.iter_encode_vec_file(str(tmp_path / 'corpus'), chunk_size=10))
+    assert(np.allclose(np.concatenate([encs for encs, _ in binary_chunks]), expected, atol=1e-5))
+    texts = ['a'*i + ' ' + 'a'*(i+1) for i in range(1, 30)]
+    streamed = np.concatenate(list(inferencer.iter_encode_texts(iter(texts), chunk_size=7)))
+    assert(np.allclose(streamed, np.array(inferencer.encode_texts(texts)), atol=1e-5))
+
+def test_encode_file_parallel(tmp_path):
+    from sklearn.datasets import dump_svmlight_file
+    from tmnt.inference import encode_file_parallel, _get_shard_offsets
+    inferencer = _get_inferencer()
+    model_dir = str(tmp_path / 'model')
+    inferencer.save(model_dir)
+    vec_file = str(tmp_path / 'test.vec')
+    dump_svmlight_file(X, np.arange(X.shape[0]), vec_file)
+    shards = _get_shard_offsets(vec_file, 5)
+    assert(shards[0][0] == 0 and all(s[1] == t[0] for s, t in zip(shards[:-1], shards[1:])))
+    encodings, labels = encode_file_parallel(model_dir, vec_file, out_file=str(tmp_path / 'encs.npy'), n_workers=2,
+                                             n_shards=5, chunk_size=4)
+    assert(np.all(labels == np.arange(X.shape[0])))
+    assert(np.allclose(encodings, inferencer.encode_array(X, use_probs=False), atol=1e-5))
+    from tmnt.data_loading import write_binary_corpus
+    write_binary_corpus(X, np.arange(X.shape[0]), str(tmp_path / 'corpus'))
+    encodings, labels = encode_file_parallel(model_dir, str(tmp_path / 'corpus'), n_workers=2, n_shards=3, chunk_size=4)
+    assert(np.all(labels == np.arange(X.shape[0])))
+    assert(np.allclose(encodings, inferencer.encode_array(X, use_probs=False), atol=1e-5))
+
+def test_predict_scores():
+    model = BowEstimator(vocabulary, n_labels=3, batch_size=10, epochs=1)
+    model.fit(X, np.arange(X.shape[0]) % 3)
+    inferencer = BowVAEInferencer(model, batch_size=8)
+    inferencer.vectorizer.label_map = {'x': 0, 'y': 1, 'z': 2}
+    texts = ['a'*i + ' ' + 'a'*(i+1) for i in range(1, 30)]
+    scores, encodings = inferencer.predict_scores(texts)
+    X_texts, _ = inferencer.vectorizer.transform(texts)
+    assert(np.allclose(scores, model.model.predict(mx.nd.array(X_texts.toarray())).asnumpy(), atol=1e-5))
+    assert(np.allclose(encodings, inferencer.encode_array(X_texts), atol=1e-4))
+    labels, _ = inferencer.predict_text(texts)
+    assert(labels == [['x', 'y', 'z'][i] for i in np.argmax(scores, axis=1)])
+    from tmnt.utils.cache import EncodingCache
+    inferencer.cache = EncodingCache(max_bytes=4096)
+    inferencer.predict_text(texts[:5])
+    cached_labels, cached_encodings = inferencer.predict_text(texts[:10])
+    assert(cached_labels == labels[:10] and inferencer.cache.hits == 5 and inferencer.cache.n_bytes <= 4096)
+    assert(np.allclose(np.array(cached_encodings), encodings[:10], atol=1e-4))
+
+def test_encoding_cache():
+    from tmnt.utils.cache import EncodingCache
+    cache = EncodingCache(max_entries=20)
+    inferencer = _get_inferencer(cache=cache)
+    texts = ['a'*i + ' ' + 'a'*(i+1) for i in range(1, 30)]
+    expected = np.array(inferencer._encode_texts(texts))
+    assert(np.allclose(np.array(inferencer.encode_texts(texts)), expected, atol=1e-5))
+    assert(cache.misses == len(texts) and len(cache) == 20 and cache.evictions == len(texts) - 20)
+    cached = inferencer.encode_texts(['  ' + texts[-1].replace(' ', '\n')] + texts[:2])
+    assert(cache.hits == 1 and np.allclose(cached[0], expected[-1]))
+    assert(np.allclose(np.array(cached[1:]), expected[:2], atol=1e-5))
+    cached[0][:] = -1.0 ## modifying a returned encoding leaves the cached value intact
+    assert(np.allclose(inferencer.encode_texts(texts[-1:])[0], expected[-1]))
+    inferencer.estimator.warm_start = True
+    inferencer.estimator.fit(X) ## updated parameters invalidate the cached encodings
+    refit = inferencer.encode_texts(texts[:1])
+    assert(len(cache) == 1 and np.allclose(refit[0], inferencer._encode_texts(texts[:1])[0], atol=1e-5))
+    BowVAEInferencer(_get_inferencer().estimator, cache=cache)
+    assert(len(cache) == 0)
+
+def test_likelihood_scores():
+    inferencer = _get_inferencer(batch_size=8)
+    means, variances = inferencer.get_likelihood_scores(X, n_samples=200)
+    assert(means.shape == (X.shape[0],) and variances.shape == (X.shape[0],))
+    data = mx.nd.array(X.toarray())
+    elbos = np.array([inferencer.model(data, None)[0].asnumpy() for _ in range(200)]) / (X.sum(axis=1).A1 + 1)
+    assert(np.allclose(means, elbos.mean(axis=0), atol=0.05))
+    assert(len(inferencer.get_likelihood_stats(X)) == X.shape[0])
+
+def test_seqved_encode_texts():
+    from gluonnlp.model.bert import BERTModel, BERTEncoder
+    from tmnt.modeling import SeqBowVED
+    from tmnt.inference import SeqVEDInferencer
+    from tmnt.distribution import LogisticGaussianDistribution
+    words = ['w{}'.format(i) for i in range(50)]
+    bert_vocab = nlp.vocab.BERTVocab(nlp.data.Counter(words))
+    encoder = BERTEncoder(num_layers=1, units=16, hidden_size=32, max_length=64, num_heads=2, output_attention=False,
+                          output_all_encodings=False)
+    bert = BERTModel(encoder, vocab_size=len(bert_vocab), token_type_vocab_size=2, units=16, embed_size=16,
+                     use_pooler=True, use_decoder=False, use_classifier=False)
+    bert.initialize()
+    model = SeqBowVED(bert, LogisticGaussianDistribution(5), bow_vocab_size=len(vocabulary))
+    model.collect_params().initialize()
+    inferencer = SeqVEDInferencer(model, bert_vocab, 64, bow_vocab=vocabulary)
+    rng = np.random.RandomState(0)
+    texts = [' '.join(rng.choice(words, rng.randint(1, 60))) for _ in range(20)]
+    encodings = np.array(inferencer.encode_texts(texts, use_probs=False, batch_size=6))
+    with inferencer:
+        parallel = np.array(inferencer.encode_texts(texts[:4], use_probs=False, batch_size=6, n_workers=2))
+        pool = inferencer._tokenize_pool
+    assert(inferencer._tokenize_pool is None and np.allclose(parallel, encodings[:4], atol=1e-5))
+    assert(not any(p.is_alive() for p in pool._pool)) ## workers are shut down on leaving the block
+    expected = np.array([inferencer.encode_text(txt)[0].asnumpy()[0] for txt in texts])
+    assert(np.allclose(encodings, expected, atol=1e-5))
+    from tmnt.utils.cache import EncodingCache
+    inferencer.cache = EncodingCache()
+    inferencer.encode_text(texts[0])[0][:] = 0.0 ## modifying a returned encoding leaves the cached value intact
+    assert(np.allclose(inferencer.encode_text(texts[0])[0].asnumpy()[0], expected[0], atol=1e-5))
+    mu_weight = model.latent_dist.mu_encoder.weight
+    mu_weight.set_data(mu_weight.data() * 2.0)
+    model.params_updated()
+    assert(np.allclose(inferencer.encode_text(texts[0])[0].asnumpy(), inferencer._encode_text(texts[0])[0].asnumpy()))
+    assert(not np.allclose(inferencer.encode_text(texts[0])[0].asnumpy()[0], expected[0], atol=1e-5))
+
+def test_seqved_from_saved_offline(tmp_path):
+    import json
+    from tmnt.modeling import SeqBowVED
+    from tmnt.inference import SeqVEDInferencer
+    from tmnt.distribution import HyperSphericalDistribution
+    from tmnt.bert_store import get_bert_hparams, get_bert_model, save_bert_vocab
+    bert_vocab = nlp.vocab.BERTVocab(nlp.data.Counter(['w{}'.format(i) for i in range(50)]))
+    hparams = get_bert_hparams('bert_12_768_12')
+    hparams.update(num_layers=1, units=16, hidden_size=32, num_heads=2, embed_size=16, max_length=64)
+    bert = get_bert_model('bert_12_768_12', bert_vocab, hparams)
+    bert.initialize()
+    model = SeqBowVED(bert, HyperSphericalDistribution(5, kappa=64.0), bow_vocab_size=len(vocabulary))
+    model.collect_params().initialize()
+    model.latent_dist.post_init(mx.cpu())
+    model(mx.nd.array([[2, 3, 4]]), mx.nd.zeros((1, 3)), mx.nd.array([3]), mx.nd.ones((1, 1, len(vocabulary))))
+    texts = ['w1 w2 w3', 'w4 w5 w6 w7 w8 w9']
+    expected = np.array(SeqVEDInferencer(model, bert_vocab, 64).encode_texts(texts, use_probs=False))
+    model_dir = str(tmp_path)
+    model.save_parameters(str(tmp_path / 'model.params'))
+    config = {'bert_model_name': 'bert_12_768_12', 'bert_data_name': 'unavailable_offline', 'bert_hparams': hparams,
+              'n_latent': 5, 'n_labels': 0, 'classifier_dropout': 0.0,
+              'latent_distribution': {'dist_type': 'vmf', 'kappa': 64.0}}
+    with open(str(tmp_path / 'model.config'), 'w') as fp:
+        json.dump(config, fp)
+    with open(str(tmp_path / 'vocab.json'), 'w') as fp:
+        fp.write(vocabulary.to_json())
+    save_bert_vocab(bert_vocab, model_dir)
+    inferencer = SeqVEDInferencer.from_saved(model_dir=model_dir, max_length=64)
+    assert(np.allclose(np.array(inferencer.encode_texts(texts, use_probs=False)), expected, atol=1e-5))
@@ -0,0 +1,145 @@
+import numpy as np
+import mxnet as mx
+import gluonnlp as nlp
+from mxnet.gluon import nn
+from scipy.sparse import random as sp_random
+from tmnt.modeling import get_decoder_jacobian, get_ordered_term_ids, get_summed_jacobian
+
+vocabulary = nlp.Vocab(nlp.data.Counter(['a'*i for i in range(1, 41)]), unknown_token=None, padding_token=None,
+                       bos_token=None, eos_token=None)
+X = sp_random(40, 40, density=0.2, format='csr', random_state=0, dtype='float32')
+y = (np.arange(X.shape[0]) % 3).astype('float32')
+
+def _fit_estimator(estimator_cls=None, labels=None, **kwargs):
+    from tmnt.estimator import BowEstimator
+    model = (estimator_cls or BowEstimator)(vocabulary=vocabulary, batch_size=10, epochs=1, **kwargs)
+    model.fit(X, labels)
+    return model
+
+def _per_term_jacobian(decoder, n_latent, vocab_size):
+    z = mx.nd.ones(shape=(1, n_latent))
+    jacobian = mx.nd.zeros(shape=(vocab_size, n_latent))
+    z.attach_grad()
+    for i in range(vocab_size):
+        with mx.autograd.record():
+            yi = decoder(z)[0][i]
+        yi.backward()
+        jacobian[i] = z.grad
+    return jacobian.asnumpy()
+
+def test_decoder_jacobian():
+    for activation in [None, 'tanh']:
+        decoder = nn.Dense(in_units=4, units=25, activation=activation)
+        decoder.initialize()
+        jacobian = get_decoder_jacobian(decoder, 4, 25, batch_size=7)
+        assert(np.allclose(jacobian, _per_term_jacobian(decoder, 4, 25), atol=1e-6))
+
+def test_ordered_term_ids():
+    jacobian = np.random.RandomState(0).randn(25, 4)
+    all_ids = get_ordered_term_ids(jacobian)
+    assert(np.all(all_ids == np.argsort(-jacobian, axis=0)))
+    assert(np.all(get_ordered_term_ids(jacobian, 5) == all_ids[:5]))
+
+def test_encoder_ordered_terms():
+    from tmnt.data_loading import DataIterLoader
+    model = _fit_estimator()
+    get_loader = lambda: DataIterLoader(mx.io.NDArrayIter(mx.nd.sparse.csr_matrix(X), None, 10,
+                                                          last_batch_handle='discard', shuffle=False))
+    per_item = model.model.get_ordered_terms_per_item(get_loader(), sample_size=-1)
+    assert(len(per_item[0]) == X.shape[0])
+    summed = np.array([np.sum(jacobians, axis=0) for jacobians in per_item]).T
+    sorted_ids = model.model.get_ordered_terms_encoder(get_loader(), sample_size=-1, k=5)
+    assert(np.all(sorted_ids == get_ordered_term_ids(summed, 5)))
+    assert(len(model.model.get_ordered_terms_per_item(get_loader(), sample_size=20)[0]) == 20)
+
+def test_top_attributions():
+    from tmnt.inference import BowVAEInferencer
+    model = _fit_estimator()
+    inferencer = BowVAEInferencer(model)
+    doc_ids, topic_ids, term_ids, scores = [np.concatenate(a) for a in zip(*inferencer.iter_top_term_attributions(X, m=3))]
+    assert(doc_ids.max() == X.shape[0] - 1)
+    assert(np.all(X[doc_ids, term_ids] > 0))
+    n_present = np.minimum(np.diff(X.indptr), 3) * model.n_latent
+    assert(np.all(np.bincount(doc_ids, minlength=X.shape[0]) == n_present))
+    batched = [np.concatenate(a) for a in zip(*inferencer.iter_top_term_attributions(X, m=3, batch_size=7))]
+    assert(all(np.array_equal(a, b) for a, b in zip(batched[:3], [doc_ids, topic_ids, term_ids])))
+    assert(np.allclose(batched[3], scores, atol=1e-5))
+
+def test_summed_jacobian_blocks():
+    decoder = nn.Dense(in_units=4, units=25, activation='tanh')
+    decoder.initialize()
+    z = mx.nd.random.normal(shape=(9, 4))
+    fn = lambda z_t, _: decoder(z_t)
+    expected = sum(_per_term_jacobian(lambda x: decoder(x + z[i:i+1] - 1.0), 4, 25) for i in range(9))
+    assert(np.allclose(get_summed_jacobian(fn, z, 25), expected, atol=1e-5))
+    assert(np.allclose(get_summed_jacobian(fn, z, 25, max_elements=60), expected, atol=1e-5))
+
+def test_covariate_topic_vectors_cache():
+    from tmnt.estimator import CovariateBowEstimator
+    model = _fit_estimator(CovariateBowEstimator, y, n_covars=3)
+    data, covars = mx.nd.sparse.csr_matrix(X), mx.nd.one_hot(mx.nd.array(y), 3)
+    vectors = model.model.get_topic_vectors(data, covars, cache_key='train').asnumpy()
+    assert(vectors.shape == (40, model.n_latent))
+    assert(np.all(model.model.get_topic_vectors(data[:4], covars[:4], cache_key='train').asnumpy() == vectors)) ## cached by key
+    assert(not np.allclose(model.model.get_topic_vectors(data[:4], covars[:4]).asnumpy(), vectors))
+    model.model.decoder.weight.set_data(model.model.decoder.weight.data() * 2.0)
+    model.model.params_updated()
+    assert(not np.allclose(model.model.get_topic_vectors(data, covars, cache_key='train').asnumpy(), vectors))
+    npmi = model._npmi_per_covariate(X, covars.asnumpy(), k=5, data_key='train')
+    assert(np.isfinite(npmi) and len(model.model._covar_cache) == 4) ## one entry per covariate value
+    assert(model._npmi_per_covariate(X, covars.asnumpy(), k=5, data_key='train') == npmi and model.model._covar_cache.hits >= 3)
+
+def test_covariate_jacobian_analytic():
+    from tmnt.modeling import CovariateBowVAEModel, CovariateModel, ContinuousCovariateModel, get_summed_softmax_jacobian
+    from tmnt.distribution import GaussianDistribution
+    decoder = nn.Dense(in_units=4, units=40)
+    decoder.initialize()
+    z = mx.nd.random.normal(shape=(12, 4))
+    covars = mx.nd.one_hot(mx.nd.array(y[:12]), 3)
+    for cov_decoder, covars in [(CovariateModel(4, 3, 40, interactions=True), covars),
+                                (ContinuousCovariateModel(4, 40, total_layers=2), mx.nd.random.uniform(shape=(12, 1)))]:
+        fn = lambda z_t, covar_t: mx.nd.softmax(decoder(z_t) + cov_decoder(z_t, covar_t), axis=1)
+        tangents = mx.nd.broadcast_add(cov_decoder.get_logit_tangents(z, covars), mx.nd.expand_dims(decoder.weight.data().T, 0))
+        analytic = get_summed_softmax_jacobian(decoder(z) + cov_decoder(z, covars), tangents)
+        assert(np.allclose(analytic, get_summed_jacobian(fn, z, 40, aux=covars), atol=1e-5))
+    data = mx.nd.sparse.csr_matrix(X[:12])
+    covars = mx.nd.one_hot(mx.nd.array(y[:12]), 3)
+    model = CovariateBowVAEModel(1, 20, 16, 1, 0.0, False, vocabulary=vocabulary, n_covars=3,
+                                 latent_distribution=GaussianDistribution(4), batch_size=12)
+    z = model.encode_data_with_covariates(data, covars)
+    fn = lambda z_t, covar_t: mx.nd.softmax(model.decoder(z_t) + model.cov_decoder(z_t, covar_t), axis=1)
+    expected = get_summed_jacobian(fn, z, 40, aux=covars)
+    assert(np.allclose(model._covar_jacobian(data, covars, max_elements=200), expected, atol=1e-5))
+
+def test_sparse_input_dense():
+    from tmnt.modeling import SparseInputDense
+    data = mx.nd.sparse.csr_matrix(X[:8])
+    sparse_layer = SparseInputDense(in_units=40, units=5, activation='tanh')
+    dense_layer = nn.Dense(in_units=40, units=5, activation='tanh')
+    sparse_layer.initialize()
+    dense_layer.initialize()
+    dense_layer.weight.set_data(sparse_layer.weight.data().T)
+    dense_layer.bias.set_data(mx.nd.ones(5))
+    sparse_layer.bias.set_data(mx.nd.ones(5))
+    assert(np.allclose(sparse_layer(data).asnumpy(), dense_layer(data.tostype('default')).asnumpy(), atol=1e-6))
+    with mx.autograd.record():
+        out = sparse_layer(data).sum()
+    out.backward()
+    grad = sparse_layer.weight.grad()
+    assert(grad.stype == 'row_sparse' and set(grad.indices.asnumpy()) == set(data.indices.asnumpy()))
+
+def test_sampled_softmax_loss():
+    from tmnt.modeling import BowVAEModel
+    from tmnt.distribution import GaussianDistribution
+    np.random.seed(0)
+    mx.random.seed(0)
+    counts = X[:16].copy()
+    counts.data = np.ceil(counts.data * 3)
+    data = mx.nd.sparse.csr_matrix(counts)
+    model = BowVAEModel(20, 16, 1, 0.0, False, vocabulary=vocabulary, latent_distribution=GaussianDistribution(5),
+                        n_sampled=20000)
+    model.initialize_bias_terms(mx.nd.array(np.asarray(counts.sum(axis=0)).ravel()))
+    z, KL = model.latent_distribution(model.encoder(model.embedding(data)), 16)
+    exact = model.get_loss_terms(mx.nd, data, mx.nd.softmax(model.decoder(z), axis=1), KL, 16)[1].asnumpy()
+    sampled = model.get_sampled_loss_terms(data, z, KL)[1].asnumpy()
+    assert(np.allclose(sampled, exact, rtol=0.02))
@@ -0,0 +1,71 @@
+import numpy as np
+import mxnet as mx
+from scipy.sparse import csr_matrix
+from tmnt.eval_npmi import EvaluateNPMI
+from tmnt.data_loading import DataIterLoader
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
+from sklearn.datasets import dump_svmlight_file
+
+X_scipy = csr_matrix(np.array([[1, 1, 0, 0, 2],
+                               [1, 0, 1, 0, 0],
+                               [0, 1, 1, 0, 1],
+                               [1, 1, 1, 1, 0],
+                               [0, 0, 0, 1, 3],
+                               [2, 1, 0, 0, 1]], dtype='float32'))
+topics = [[0, 1, 2], [4, 3, 1]]
+
+def _pairwise_npmi(X, topics):
+    mat = X.toarray() > 0
+    n_docs = mat.shape[0]
+    total = 0.0
+    for words in topics:
+        words = sorted(words)
+        vals = []
+        for i in range(len(words)):
+            for j in range(i+1, len(words)):
+                o1, o2 = mat[:, words[i]], mat[:, words[j]]
+                c12 = np.sum(o1 & o2)
+                if c12 < 1:
+                    vals.append(0.0)
+                else:
+                    vals.append((np.log10(n_docs) + np.log10(c12) - np.log10(o1.sum()) - np.log10(o2.sum()))
+                                / (np.log10(n_docs) - np.log10(c12) + 1e-4))
+        total += np.mean(vals)
+    return total / len(topics)
+
+def test_csr_mat_npmi_scipy():
+    npmi = EvaluateNPMI(topics).evaluate_csr_mat(X_scipy)
+    assert(np.isclose(npmi, _pairwise_npmi(X_scipy, topics)))
+
+def test_csr_mat_npmi_mxnet():
+    npmi_sparse = EvaluateNPMI(topics).evaluate_csr_mat(mx.nd.sparse.csr_matrix(X_scipy))
+    npmi_dense = EvaluateNPMI(topics).evaluate_csr_mat(mx.nd.array(X_scipy.toarray()))
+    assert(np.isclose(npmi_sparse, _pairwise_npmi(X_scipy, topics)))
+    assert(np.isclose(npmi_dense, npmi_sparse))
+
+def test_csr_loader_npmi():
+    dataloader = DataIterLoader(mx.io.NDArrayIter(mx.nd.sparse.csr_matrix(X_scipy), None, 2,
+                                                  last_batch_handle='discard', shuffle=False))
+    npmi = EvaluateNPMI(topics).evaluate_csr_loader(dataloader)
+    assert(np.isclose(npmi, _pairwise_npmi(X_scipy, topics)))
+
+def test_cooccurrence_index(tmp_path):
+    vec_file = str(tmp_path / 'test.vec')
+    dump_svmlight_file(X_scipy, np.zeros(X_scipy.shape[0]), vec_file)
+    index = CooccurrenceIndex.from_svmlight_file(vec_file, index_dir=str(tmp_path / 'index'), chunk_size=4)
+    X_bin = (X_scipy > 0).astype('int64')
+    cooc = (X_bin.T @ X_bin).toarray()
+    ids = [4, 0, 2]
+    unigram_cnts, bigram_cnts = index.get_counts(ids)
+    assert(np.all(bigram_cnts == cooc[np.ix_(ids, ids)]))
+    assert(np.all(unigram_cnts == cooc.diagonal()[ids]))
+    assert(index.co_doc_freq(1, 4) == cooc[1, 4])
+    saved = CooccurrenceIndex.from_svmlight_file(vec_file, index_dir=str(tmp_path / 'index'))
+    assert(saved.n_docs == X_scipy.shape[0])
+    assert(np.all(saved.get_counts(ids)[1] == bigram_cnts))
+
+def test_reference_index_npmi(tmp_path):
+    CooccurrenceIndex.from_csr(X_scipy, index_dir=str(tmp_path))
+    index = CooccurrenceIndex.load(str(tmp_path))
+    npmi = EvaluateNPMI(topics).evaluate_index(index)
+    assert(np.isclose(npmi, EvaluateNPMI(topics).evaluate_csr_mat(X_scipy)))
@@ -0,0 +1,28 @@
+import numpy as np
+from scipy.optimize import brentq
+from tmnt.utils.recalibrate import recalibrate_scores, recalibrate_scores_batch, entropy
+
+def _reference_recalibration(x, target_entropy):
+    ## entropy of x ** t (renormalized) decreases monotonically in t, so the target is met by a unique exponent
+    log_x = np.log(x)
+    def rescaled(t):
+        z = np.exp(t * (log_x - log_x.max()))
+        return z / z.sum()
+    def rescaled_entropy(t):
+        p = rescaled(t)
+        return -(p[p > 0] * np.log(p[p > 0])).sum()
+    t = brentq(lambda t: rescaled_entropy(t) - target_entropy, 1e-3, 1e3, xtol=1e-12)
+    return rescaled(t)
+
+def test_recalibrate_batch():
+    z = np.random.RandomState(0).randn(50, 20) * 3.0
+    x = np.exp(z - z.max(axis=1, keepdims=True))
+    x /= x.sum(axis=1, keepdims=True)
+    for target in (1.0, 2.0):
+        recal = recalibrate_scores_batch(x, target_entropy=target)
+        assert(np.allclose(recal.sum(axis=1), 1.0))
+        assert(np.allclose([entropy(r) for r in recal], target, atol=1e-4))
+        expected = np.array([_reference_recalibration(row, target) for row in x])
+        assert(np.allclose(recal, expected, atol=1e-4))
+        for i in (3, 17):
+            assert(np.allclose(recalibrate_scores(x[i], target_entropy=target), expected[i], atol=1e-4))
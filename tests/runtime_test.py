@@ -0,0 +1,25 @@
+import numpy as np
+import gluonnlp as nlp
+from scipy.sparse import random as sp_random
+from tmnt.estimator import BowEstimator
+from tmnt.inference import BowVAEInferencer
+from tmnt.runtime import NumpyBowVAEInferencer
+
+vocabulary = nlp.Vocab(nlp.data.Counter(['a'*i for i in range(2, 42)]), unknown_token=None, padding_token=None,
+                       bos_token=None, eos_token=None)
+X = sp_random(37, 40, density=0.2, format='csr', random_state=0, dtype='float32')
+
+def test_numpy_runtime(tmp_path):
+    model = BowEstimator(vocabulary, batch_size=10, epochs=1)
+    model.fit(X)
+    inferencer = BowVAEInferencer(model)
+    bundle_file = str(tmp_path / 'model.npz')
+    inferencer.export_bundle(bundle_file)
+    runtime = NumpyBowVAEInferencer.from_bundle(bundle_file)
+    texts = ['aa AAAA aaaaa the', 'aaaaaaaaa aaaa aa and aa', 'nothing in vocabulary']
+    assert((runtime.vectorize(texts) != inferencer.vectorizer.transform(texts)[0]).nnz == 0)
+    for use_probs in [True, False]:
+        for include_bn in [True, False]:
+            assert(np.allclose(runtime.encode_texts(texts, use_probs=use_probs, include_bn=include_bn),
+                               np.array(inferencer.encode_texts(texts, use_probs=use_probs, include_bn=include_bn)),
+                               atol=1e-4))
@@ -0,0 +1,61 @@
+import json
+import asyncio
+import numpy as np
+from tmnt.serving import InferenceServer
+
+class _LengthInferencer(object):
+    def __init__(self):
+        self.batches = []
+
+    def encode_texts(self, texts, use_probs=True):
+        self.batches.append(len(texts))
+        return np.array([[len(t), 1.0] for t in texts])
+
+    def predict_text(self, texts):
+        return [t[0] for t in texts], self.encode_texts(texts)
+
+def test_micro_batching():
+    inferencer = _LengthInferencer()
+    server = InferenceServer(inferencer, max_batch_size=8, max_wait_ms=20.0)
+    texts = ['a' * i for i in range(1, 21)]
+    async def run():
+        results = await asyncio.gather(*[server.encode(t) for t in texts])
+        await server.close()
+        return results
+    results = asyncio.run(run())
+    assert([r[0] for r in results] == list(range(1, 21)))
+    assert(max(inferencer.batches) == 8 and sum(inferencer.batches) == 20)
+    metrics = server.get_metrics()['encode']
+    assert(metrics['requests'] == 20 and metrics['batches'] == len(inferencer.batches))
+    assert(server.encode_batcher._executor._shutdown and server.predict_batcher._executor._shutdown)
+
+def test_http_serving():
+    server = InferenceServer(_LengthInferencer(), max_batch_size=4, max_wait_ms=5.0)
+    async def post(port, path, body):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        payload = json.dumps(body).encode('utf-8')
+        writer.write('POST {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n'.format(path, len(payload)).encode('latin-1') + payload)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.split(b'\r\n\r\n', 1)[1])
+    async def run():
+        http_server = await server.serve_http(port=0)
+        port = http_server.sockets[0].getsockname()[1]
+        results = await asyncio.gather(*[post(port, '/predict', {'text': t}) for t in ['xy', 'abc', 'z']])
+        http_server.close()
+        await server.close()
+        return results
+    results = asyncio.run(run())
+    assert([r['label'] for r in results] == ['x', 'a', 'z'])
+    assert([r['encoding'][0] for r in results] == [2, 3, 1])
+
+def test_short_batch_results():
+    from tmnt.serving import MicroBatcher
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=20.0)
+    async def run():
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(4)], return_exceptions=True)
+        await batcher.close()
+        return results
+    results = asyncio.run(asyncio.wait_for(run(), 5.0))
+    assert(all(isinstance(r, Exception) for r in results)) ## no request is left waiting
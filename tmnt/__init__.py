@@ -1,12 +1,21 @@
 # coding: utf-8
 
 import os
-from .distribution import *
-from .preprocess import *
-from .embeddings import *
-#from .models import *
-from .utils import *
+import importlib
 
 os.environ["MXNET_STORAGE_FALLBACK_LOG_VERBOSE"] = "0"
 
-__all__ = distribution.__all__ + preprocess.__all__ + embeddings.__all__ + utils.__all__
+## Submodules are imported on first attribute access so that lightweight modules
+## (e.g. tmnt.runtime) can be imported without importing MXNet
+_submodules = ['distribution', 'preprocess', 'embeddings', 'utils']
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    modules = [importlib.import_module('.' + m, __name__) for m in _submodules]
+    if name == '__all__':
+        return [n for m in modules for n in m.__all__]
+    for m in modules:
+        if name in m.__all__:
+            return getattr(m, name)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
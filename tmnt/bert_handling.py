@@ -11,13 +11,13 @@ import mxnet as mx
 from mxnet import gluon
 from mxnet.gluon import Block, nn
 import gluonnlp as nlp
-from gluonnlp.model import get_model
 from gluonnlp.data import BERTTokenizer
 from gluonnlp.data.dataset import SimpleDataset, Dataset
 import json
 import collections
 from tmnt.preprocess.vectorizer import TMNTVectorizer
 from tmnt.data_loading import to_label_matrix
+from tmnt.bert_store import get_pretrained_bert_model
 from typing import Dict
 from gluonnlp.data import BERTSentenceTransform
 
@@ -305,14 +305,7 @@ def get_bert_datasets(class_labels,
                       ctx=mx.cpu()):
     if class_labels is None and num_classes is None:
         raise Exception("Must provide class_labels or num_classes")
-    bert, bert_vocabulary = get_model(
-        name=bert_model_name,
-        dataset_name=bert_dataset,
-        pretrained=True,
-        ctx=ctx,
-        use_pooler=True,
-        use_decoder=False,
-        use_classifier=False)
+    bert, bert_vocabulary = get_pretrained_bert_model(bert_model_name, bert_dataset, ctx=ctx)
     do_lower_case = 'uncased' in bert_dataset    
     bert_tokenizer = BERTTokenizer(bert_vocabulary, lower=do_lower_case)
     trans = BERTDatasetTransform(bert_tokenizer, max_len,
@@ -459,14 +452,7 @@ def get_dual_bert_datasets(class_labels,
                            shuffle=True,
                            aux_dataset = None,
                            ctx=mx.cpu()):
-    bert, bert_vocabulary = get_model(
-        name=model_name,
-        dataset_name=dataset,
-        pretrained=True,
-        ctx=ctx,
-        use_pooler=True,
-        use_decoder=False,
-        use_classifier=False)
+    bert, bert_vocabulary = get_pretrained_bert_model(model_name, dataset, ctx=ctx)
     do_lower_case = 'uncased' in dataset    
     bert_tokenizer = BERTTokenizer(bert_vocabulary, lower=do_lower_case)
 
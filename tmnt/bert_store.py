@@ -0,0 +1,78 @@
+# coding: utf-8
+# Copyright (c) 2021. The MITRE Corporation.
+"""
+Local storage of BERT vocabularies and architecture settings with saved sequence models, allowing saved
+models to be reloaded (offline) without fetching or loading pretrained BERT weights.
+"""
+
+import io
+import os
+import mxnet as mx
+import gluonnlp as nlp
+from gluonnlp.base import get_home_dir
+from gluonnlp.data.utils import _load_pretrained_vocab
+from gluonnlp.model.bert import bert_hparams
+
+__all__ = ['BERT_VOCAB_FILE', 'save_bert_vocab', 'load_bert_vocab', 'get_bert_hparams', 'get_bert_model',
+           'get_pretrained_bert_model']
+
+BERT_VOCAB_FILE = 'bert_vocab.json'
+MODEL_ROOT = os.path.join(get_home_dir(), 'models')
+
+
+def save_bert_vocab(bert_vocab, model_dir, suffix=''):
+    """Write a BERT vocabulary to a model directory"""
+    with io.open(os.path.join(model_dir, BERT_VOCAB_FILE + suffix), 'w', encoding='utf-8') as fp:
+        fp.write(bert_vocab.to_json())
+
+
+def load_bert_vocab(bert_data_name=None, model_dir=None, root=MODEL_ROOT):
+    """Load a BERT vocabulary, from `model_dir` if it holds a saved vocabulary and otherwise as the
+    pretrained vocabulary for `bert_data_name`. Only the vocabulary file is read (and downloaded
+    to `root` if not already present); no network is constructed.
+
+    Parameters:
+        bert_data_name (str): Name of the dataset the BERT model was pretrained on
+        model_dir (str): Saved model directory
+        root (str): Directory holding downloaded GluonNLP vocabularies and models
+
+    Returns:
+        (:class:`gluonnlp.vocab.BERTVocab`): BERT vocabulary
+    """
+    vocab_file = os.path.join(model_dir, BERT_VOCAB_FILE) if model_dir is not None else None
+    if vocab_file is not None and os.path.exists(vocab_file):
+        with io.open(vocab_file, 'r', encoding='utf-8') as fp:
+            return nlp.vocab.BERTVocab.from_json(fp.read())
+    if bert_data_name is None:
+        raise Exception("No saved BERT vocabulary found and no BERT dataset name provided")
+    return _load_pretrained_vocab(bert_data_name, root, cls=nlp.vocab.BERTVocab)
+
+
+def get_bert_hparams(bert_model_name):
+    """Architecture settings for a named GluonNLP BERT model"""
+    return dict(bert_hparams[bert_model_name])
+
+
+def get_bert_model(bert_model_name, bert_vocab, hparams=None, ctx=mx.cpu()):
+    """Construct a BERT network without initializing (or loading) its parameters, for use when all
+    parameters are subsequently loaded from a saved model.
+
+    Parameters:
+        bert_model_name (str): GluonNLP BERT model name (e.g. 'bert_12_768_12')
+        bert_vocab (:class:`gluonnlp.vocab.BERTVocab`): BERT vocabulary
+        hparams (dict): Architecture settings saved with the model (default None uses those for `bert_model_name`)
+        ctx (:class:`mxnet.context.Context`): MXNet context
+
+    Returns:
+        (:class:`gluonnlp.model.BERTModel`): Uninitialized BERT network
+    """
+    bert, _ = nlp.model.get_model(bert_model_name, dataset_name=None, vocab=bert_vocab, pretrained=False, ctx=ctx,
+                                  use_pooler=True, use_decoder=False, use_classifier=False,
+                                  hparam_allow_override=(hparams is not None), **(hparams or {}))
+    return bert
+
+
+def get_pretrained_bert_model(bert_model_name, bert_data_name, ctx=mx.cpu()):
+    """Pretrained BERT network and vocabulary (e.g. to initialize a model for training)"""
+    return nlp.model.get_model(bert_model_name, dataset_name=bert_data_name, pretrained=True, ctx=ctx,
+                               use_pooler=True, use_decoder=False, use_classifier=False)
@@ -26,5 +26,7 @@ def get_base_argparser():
     parser.add_argument('--use_gpu', action='store_true', help='Use GPU for fitting models', default=False)
     parser.add_argument('--trace_file', type=str, default=None, help='Trace: (epoch, perplexity, NPMI) on validation data into a separate file')
     parser.add_argument('--pretrained_param_file', type=str, help='File with pre-trained model parameters to be fine-tuned')    
+    parser.add_argument('--reference_index', type=str, default=None,
+                        help='Directory with a co-occurrence index over a reference corpus (see bin/build_cooccurrence_index.py) used to compute coherence')
     return parser
 
@@ -9,6 +9,8 @@ for efficient neural variational model training.
 import io
 import itertools
 import os
+import glob
+import shutil
 import logging
 import scipy
 import gluonnlp as nlp
@@ -17,13 +19,19 @@ import numpy as np
 import string
 import re
 import json
+import time
+import queue
+import threading
 from mxnet import gluon
 from gluonnlp.data import BERTTokenizer, BERTSentenceTransform
 from collections import OrderedDict
 from mxnet.io import DataDesc, DataIter, DataBatch
 from sklearn.datasets import load_svmlight_file
-from sklearn.utils import shuffle as sk_shuffle
 from tmnt.preprocess.vectorizer import TMNTVectorizer
+from tmnt.bert_store import load_bert_vocab, get_pretrained_bert_model
+
+BERT_MODEL_NAME = 'bert_12_768_12'
+BERT_DATA_NAME = 'book_corpus_wiki_en_uncased'
 
 
 def to_label_matrix(yvs, num_labels=0):
@@ -46,29 +54,39 @@ def to_label_matrix(yvs, num_labels=0):
 
 
 class SparseMatrixDataIter(DataIter):
+    """Mini-batch iterator over a scipy CSR matrix (and optional labels).
+
+    The matrix is never copied or reordered: when shuffling, a new permutation of row indices is drawn at the
+    start of each epoch and batches are gathered by indexing rows with it. With `shuffle_block_size`, contiguous
+    blocks of rows are permuted instead of individual rows. Block sizes are rounded up to a whole number of batches
+    (and a final partial block is kept last), so batches fall within a single block and are taken as contiguous
+    row slices rather than gathered (improving memory locality for very large, e.g. memory-mapped, matrices).
+
+    Parameters:
+        data (:class:`scipy.sparse.csr_matrix`): Document-term matrix
+        label (array-like): Optional labels
+        batch_size (int): Batch size
+        shuffle (bool): Shuffle rows each epoch
+        last_batch_handle (str): 'pad', 'discard' or 'roll_over'
+        shuffle_block_size (int): Optional number of contiguous rows permuted together when shuffling (rounded up
+            to a multiple of `batch_size`)
+    """
     def __init__(self, data, label=None, batch_size=1, shuffle=False,
                  last_batch_handle='pad', data_name='data',
-                 label_name='softmax_label'):
+                 label_name='softmax_label', shuffle_block_size=None):
         super(SparseMatrixDataIter, self).__init__(batch_size)
 
         assert(isinstance(data, scipy.sparse.csr.csr_matrix))
         
+        if label is not None and len(label) > 0:
+            label = np.asarray(label)
         self.data = _init_data(data, allow_empty=False, default_name=data_name)
         self.label = _init_data(label, allow_empty=True, default_name=label_name)
         self.num_data = self.data[0][1].shape[0]
-
-        # shuffle data
-        if shuffle:
-            sh_data = []
-            d = self.data[0][1]
-            if len(self.label[0][1]) > 0:
-                l = self.label[0][1]
-                ds, dl = sk_shuffle(d, l)
-                self.data = _init_data(ds, allow_empty=False, default_name=data_name)
-                self.label = _init_data(dl, allow_empty=True, default_name=label_name)
-            else:
-                ds = sk_shuffle(d)
-                self.data = _init_data(ds, allow_empty=False, default_name=data_name)
+        self.shuffle = shuffle
+        if shuffle_block_size:
+            shuffle_block_size = -(-shuffle_block_size // batch_size) * batch_size ## whole batches per block
+        self.shuffle_block_size = shuffle_block_size
 
         # batching
         if last_batch_handle == 'discard':
@@ -80,7 +98,52 @@ class SparseMatrixDataIter(DataIter):
         self.cursor = -batch_size
         self.batch_size = batch_size
         self.last_batch_handle = last_batch_handle
-
+        self.order = None
+        self.block_starts = None
+        self._shuffle_order()
+
+    def _draw_order(self):
+        """New row order and, when shuffling blocks, the corresponding permuted block starts"""
+        n = self.data[0][1].shape[0]
+        if self.shuffle_block_size:
+            n_full = n - n % self.shuffle_block_size
+            block_starts = np.random.permutation(np.arange(0, n_full, self.shuffle_block_size))
+            if n_full < n:
+                block_starts = np.append(block_starts, n_full) ## partial block last, keeping batches block-aligned
+            order = np.concatenate([np.arange(b, min(b + self.shuffle_block_size, n)) for b in block_starts])
+            return order, block_starts
+        return np.random.permutation(n), None
+
+    def _shuffle_order(self):
+        """Draw a new row order for the next epoch (the data itself is left untouched)"""
+        self._next_order = None
+        if self.shuffle:
+            self.order, self.block_starts = self._draw_order()
+
+    def _batch_rows(self):
+        """Row selector for the current batch: a slice when rows are in order (or the batch lies within one shuffled
+        block) and no padding is needed, otherwise an index array (padding the final batch with rows from the
+        start of the epoch's order or, with 'roll_over', from the start of the next epoch's order)"""
+        end = self.cursor + self.batch_size
+        if end <= self.num_data:
+            if self.order is None:
+                return slice(self.cursor, end)
+            if self.block_starts is not None:
+                block, offset = divmod(self.cursor, self.shuffle_block_size)
+                start = self.block_starts[block] + offset
+                if offset + self.batch_size <= self.shuffle_block_size and start + self.batch_size <= self.order.shape[0]:
+                    return slice(start, start + self.batch_size)
+            return self.order[self.cursor:end]
+        pad = self.batch_size - self.num_data + self.cursor
+        order = self.order if self.order is not None else np.arange(self.data[0][1].shape[0])
+        if self.last_batch_handle == 'roll_over' and self.shuffle:
+            ## rows carried over are the first rows of the next epoch's order, which then resumes after them
+            if self._next_order is None:
+                self._next_order = self._draw_order()
+            wrap = self._next_order[0][:pad]
+        else:
+            wrap = order[:pad]
+        return np.concatenate([order[self.cursor:self.num_data], wrap])
 
     @property
     def provide_data(self):
@@ -101,13 +164,19 @@ class SparseMatrixDataIter(DataIter):
     def hard_reset(self):
         """Ignore roll over data and set to start."""
         self.cursor = -self.batch_size
+        self._shuffle_order()
 
 
     def reset(self):
         if self.last_batch_handle == 'roll_over' and self.cursor > self.num_data:
             self.cursor = -self.batch_size + (self.cursor%self.num_data)%self.batch_size
+            if self._next_order is not None:
+                self.order, self.block_starts = self._next_order
+                self._next_order = None
+                return
         else:
             self.cursor = -self.batch_size
+        self._shuffle_order()
 
     def iter_next(self):
         self.cursor += self.batch_size
@@ -122,19 +191,13 @@ class SparseMatrixDataIter(DataIter):
 
     def getdata(self):
         assert(self.cursor < self.num_data), "DataIter needs reset."
-        if self.cursor + self.batch_size <= self.num_data:
-            return [ x[1][self.cursor:self.cursor + self.batch_size] for x in self.data ]
-        else:
-            pad = self.batch_size - self.num_data + self.cursor
-            return [ scipy.sparse.vstack([x[1][self.cursor:], x[1][:pad]]) for x in self.data ]
+        rows = self._batch_rows()
+        return [ x[1][rows] for x in self.data ]
 
     def getlabel(self):
         assert(self.cursor < self.num_data), "DataIter needs reset."
-        if self.cursor + self.batch_size <= self.num_data:
-            return [ x[1][self.cursor:self.cursor + self.batch_size] for x in self.label ]
-        else:
-            pad = self.batch_size - self.num_data + self.cursor
-            return [ np.concatenate([x[1][self.cursor:], x[1][:pad]]) for x in self.label ]
+        rows = self._batch_rows()
+        return [ x[1][rows] if len(x[1]) > 0 else x[1] for x in self.label ]
 
     def getpad(self):
         if self.last_batch_handle == 'pad' and self.cursor + self.batch_size > self.num_data:
@@ -187,6 +250,97 @@ class DataIterLoader():
         return self.__next__()
 
 
+class PrefetchingLoader(object):
+    """Wrap a loader (e.g. :class:`DataIterLoader`) so that batches are prepared in a background thread.
+
+    Up to `depth` batches are prepared ahead of the consumer: row selection, conversion to MXNet sparse
+    arrays, default (zero) labels and the copy to the target context all happen off the training thread.
+    Time the consumer spends waiting for batches is accumulated in `stall_time`. Other attributes
+    (e.g. `num_batches`, `last_batch_size`) are those of the wrapped loader.
+
+    Parameters:
+        loader: Iterable over (data, labels) batches
+        depth (int): Maximum number of batches prepared ahead
+        ctx (:class:`mxnet.context.Context`): Context to copy batches to (default None leaves them in place)
+    """
+    _END = object()
+
+    def __init__(self, loader, depth=2, ctx=None):
+        self.loader = loader
+        self.depth = depth
+        self.ctx = ctx
+        self.stall_time = 0.0
+        self.n_batches = 0
+        self._queue = None
+        self._stop = None
+        self._thread = None
+
+    def __getattr__(self, name):
+        if name == 'loader':
+            raise AttributeError(name)
+        return getattr(self.loader, name)
+
+    def _prepare(self, data, labels):
+        if labels is None:
+            labels = mx.nd.expand_dims(mx.nd.zeros(data.shape[0]), 1)
+        if self.ctx is not None:
+            data, labels = data.as_in_context(self.ctx), labels.as_in_context(self.ctx)
+        data.wait_to_read()
+        labels.wait_to_read()
+        return data, labels
+
+    def _produce(self, q, stop):
+        try:
+            for data, labels in self.loader:
+                if stop.is_set():
+                    return
+                q.put(self._prepare(data, labels))
+            q.put(self._END)
+        except Exception as e:
+            q.put(e)
+
+    def _shutdown(self):
+        ## stop a producer left running by an abandoned iteration before the wrapped loader is reset
+        if self._stop is not None:
+            self._stop.set()
+            while self._thread.is_alive():
+                try: ## unblock the producer if it is waiting on a full queue
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._stop = None
+
+    def __iter__(self):
+        self._shutdown()
+        self._queue = queue.Queue(maxsize=max(1, self.depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(self._queue, self._stop), daemon=True)
+        self._thread.start()
+        return self
+
+    def __next__(self):
+        if self._stop is None:
+            raise StopIteration
+        ts = time.time()
+        item = self._queue.get()
+        self.stall_time += time.time() - ts
+        if item is self._END:
+            self._stop = None
+            raise StopIteration
+        if isinstance(item, Exception):
+            self._stop = None
+            raise item
+        self.n_batches += 1
+        return item
+
+    def next(self):
+        return self.__next__()
+
+    def get_stats(self):
+        """Number of batches consumed and total time (seconds) spent waiting for them"""
+        return {'batches': self.n_batches, 'stall_time': self.stall_time}
+
+
 def _init_data(data, allow_empty, default_name):
     """Convert data into canonical form."""
     assert (data is not None) or allow_empty
@@ -215,18 +369,330 @@ def load_vocab(vocab_file, encoding='utf-8'):
 
 
 def file_to_data(sp_file, voc_size, batch_size=1000):
-    with open(sp_file) as f:
-        for i, l in enumerate(f):
-            pass
-    data_size = i+1
-    num_batches = data_size // batch_size
-    last_batch_size = data_size % batch_size
+    """Load a document-term matrix, labels, word frequencies and total word count from a sparse vector
+    (svmlight) file or a binary corpus directory (see :func:`write_binary_corpus`)."""
+    if is_binary_corpus(sp_file):
+        X, y, wd_freqs, _, meta = load_binary_corpus(sp_file)
+        if meta['vocab_size'] != voc_size:
+            raise Exception("Binary corpus {} has vocabulary size {}, expected {}".format(sp_file, meta['vocab_size'], voc_size))
+        return X, y, mx.nd.array(wd_freqs), meta['total_words']
     X, y = load_svmlight_file(sp_file, n_features=voc_size, dtype='int32', zero_based=True)
     wd_freqs = mx.nd.array(np.array(X.sum(axis=0)).squeeze())
     total_words = X.sum()
     return X, y, wd_freqs, total_words
+
+
+## Binary corpus format: a directory of .npy arrays holding a CSR document-term matrix (indptr, indices, data),
+## labels, word frequencies and document lengths, along with a JSON metadata file. Arrays are opened memory-mapped.
+CORPUS_META_FILE = 'corpus.json'
+_CORPUS_ARRAYS = ['indptr', 'indices', 'data', 'labels', 'doc_lengths']
+
+
+def is_binary_corpus(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, CORPUS_META_FILE))
+
+
+class BinaryCorpusWriter(object):
+    """Incrementally write a binary corpus directory from chunks of a document-term matrix.
+
+    Parameters:
+        corpus_dir (str): Output directory
+        vocab_size (int): Number of columns (terms) of the document-term matrix
+        vocabulary (list): Optional list of terms (in column order) stored with the corpus
+    """
+    def __init__(self, corpus_dir, vocab_size, vocabulary=None):
+        if not os.path.exists(corpus_dir):
+            os.makedirs(corpus_dir)
+        self.corpus_dir = corpus_dir
+        self.vocab_size = vocab_size
+        self.vocabulary = list(vocabulary) if vocabulary is not None else None
+        self.n_docs = 0
+        self.nnz = 0
+        self.label_shape = None
+        self.word_freqs = np.zeros(vocab_size, dtype='float64')
+        self._dtypes = {'indptr': np.int64, 'indices': np.int32, 'data': np.float32, 'labels': np.float64,
+                        'doc_lengths': np.float32}
+        self._raw = {k: io.open(self._raw_file(k), 'wb') for k in _CORPUS_ARRAYS}
+        self._raw['indptr'].write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def _raw_file(self, name):
+        return os.path.join(self.corpus_dir, name + '.raw')
+
+    def add(self, X, y=None):
+        """Append documents (rows of sparse matrix `X`) with optional labels `y`"""
+        X = scipy.sparse.csr_matrix(X)
+        if X.shape[1] != self.vocab_size:
+            raise Exception("Expected {} columns but matrix has {}".format(self.vocab_size, X.shape[1]))
+        X.sum_duplicates()
+        y = np.zeros(X.shape[0]) if y is None else np.asarray(y, dtype=np.float64)
+        if self.label_shape is None:
+            self.label_shape = y.shape[1:]
+        elif y.shape[1:] != self.label_shape:
+            raise Exception("Inconsistent label shapes {} and {}".format(self.label_shape, y.shape[1:]))
+        self._raw['indptr'].write((X.indptr[1:].astype(np.int64) + self.nnz).tobytes())
+        self._raw['indices'].write(X.indices.astype(np.int32).tobytes())
+        self._raw['data'].write(X.data.astype(np.float32).tobytes())
+        self._raw['labels'].write(y.tobytes())
+        self._raw['doc_lengths'].write(np.asarray(X.sum(axis=1), dtype=np.float32).ravel().tobytes())
+        self.word_freqs += np.bincount(X.indices, weights=X.data, minlength=self.vocab_size)
+        self.n_docs += X.shape[0]
+        self.nnz += X.nnz
+
+    def _write_npy(self, name, dtype, shape):
+        raw_file = self._raw_file(name)
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': shape}
+        with io.open(os.path.join(self.corpus_dir, name + '.npy'), 'wb') as out:
+            np.lib.format.write_array_header_1_0(out, header)
+            if np.dtype(dtype) == np.dtype(self._dtypes[name]):
+                with io.open(raw_file, 'rb') as fp:
+                    shutil.copyfileobj(fp, out, 1 << 24)
+            else:
+                raw = np.memmap(raw_file, dtype=self._dtypes[name], mode='r')
+                for i in range(0, raw.shape[0], 1 << 22):
+                    out.write(raw[i:i + (1 << 22)].astype(dtype).tobytes())
+                del raw
+        os.remove(raw_file)
+
+    def close(self):
+        """Finalize the corpus files and metadata"""
+        for fp in self._raw.values():
+            fp.close()
+        ## 32-bit row offsets when possible so that the memory-mapped arrays can be used by scipy without copying
+        indptr_dtype = np.int32 if self.nnz < 2**31 else np.int64
+        self._write_npy('indptr', indptr_dtype, (self.n_docs + 1,))
+        self._write_npy('indices', np.int32, (self.nnz,))
+        self._write_npy('data', np.float32, (self.nnz,))
+        self._write_npy('labels', np.float64, (self.n_docs,) + tuple(self.label_shape or ()))
+        self._write_npy('doc_lengths', np.float32, (self.n_docs,))
+        np.save(os.path.join(self.corpus_dir, 'word_freqs.npy'), self.word_freqs)
+        meta = {'n_docs': self.n_docs, 'vocab_size': self.vocab_size, 'nnz': self.nnz,
+                'total_words': float(self.word_freqs.sum()), 'vocabulary': self.vocabulary}
+        with io.open(os.path.join(self.corpus_dir, CORPUS_META_FILE), 'w') as fp:
+            json.dump(meta, fp)
+
+
+def write_binary_corpus(X, y, corpus_dir, vocabulary=None):
+    """Write a document-term matrix and labels as a binary corpus directory
+
+    Parameters:
+        X (sparse matrix): Document-term matrix of shape (n_docs, vocab_size)
+        y (array-like): Optional labels for each document
+        corpus_dir (str): Output directory
+        vocabulary (list): Optional list of terms (in column order) stored with the corpus
+    """
+    writer = BinaryCorpusWriter(corpus_dir, X.shape[1], vocabulary=vocabulary)
+    writer.add(X, y)
+    writer.close()
+
+
+def svmlight_to_binary_corpus(sp_file, corpus_dir, voc_size, vocabulary=None, chunk_size=100000):
+    """Convert a sparse vector (svmlight) file to a binary corpus directory, reading `chunk_size` lines at a time"""
+    writer = BinaryCorpusWriter(corpus_dir, voc_size, vocabulary=vocabulary)
+    with io.open(sp_file, 'rb') as fp:
+        while True:
+            chunk = list(itertools.islice(fp, chunk_size))
+            if len(chunk) == 0:
+                break
+            X, y = load_svmlight_file(io.BytesIO(b''.join(chunk)), n_features=voc_size, zero_based=True)
+            writer.add(X, y)
+    writer.close()
+
+
+def load_binary_corpus(corpus_dir, mmap_mode='r'):
+    """Open a binary corpus directory with memory-mapped arrays
+
+    Parameters:
+        corpus_dir (str): Corpus directory written by :func:`write_binary_corpus` or :class:`BinaryCorpusWriter`
+        mmap_mode (str): Memory-map mode passed to :func:`numpy.load` (None reads arrays into memory)
+
+    Returns:
+        (tuple): CSR document-term matrix, labels, word frequencies, document lengths and corpus metadata (dict)
+    """
+    with io.open(os.path.join(corpus_dir, CORPUS_META_FILE)) as fp:
+        meta = json.load(fp)
+    arrays = {k: np.load(os.path.join(corpus_dir, k + '.npy'), mmap_mode=mmap_mode) for k in _CORPUS_ARRAYS}
+    X = scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                shape=(meta['n_docs'], meta['vocab_size']), copy=False)
+    word_freqs = np.load(os.path.join(corpus_dir, 'word_freqs.npy'))
+    return X, arrays['labels'], word_freqs, arrays['doc_lengths'], meta
     
 
+
+def is_sharded_corpus(path):
+    """True if `path` is a directory of corpus shards (rather than a single binary corpus directory)"""
+    return os.path.isdir(path) and not is_binary_corpus(path)
+
+
+class ShardedCorpus(object):
+    """A corpus that is streamed from disk in shards rather than loaded into memory.
+
+    The corpus may be a directory of shards - sparse vector (svmlight) files and/or binary corpus directories - or a
+    single sparse vector file or binary corpus. Each file or binary corpus is further divided into shards of at most
+    `rows_per_shard` documents. Shard boundaries, word frequencies and corpus totals are computed with a single
+    streaming pass over the data when the corpus is constructed.
+
+    Parameters:
+        path (str): Directory of shards, sparse vector file or binary corpus directory
+        voc_size (int): Vocabulary size
+        file_pat (str): Pattern selecting the sparse vector files within a directory of shards
+        rows_per_shard (int): Maximum number of documents in a shard
+    """
+    def __init__(self, path, voc_size, file_pat='*.vec', rows_per_shard=100000):
+        self.path = path
+        self.voc_size = voc_size
+        self.rows_per_shard = rows_per_shard
+        if is_sharded_corpus(path):
+            sources = sorted(glob.glob(os.path.join(path, file_pat)) +
+                             [p for p in glob.glob(os.path.join(path, '*')) if is_binary_corpus(p)])
+            if len(sources) == 0:
+                raise Exception("No corpus shards matching {} found in {}".format(file_pat, path))
+        else:
+            sources = [path]
+        self.shards = []
+        self._binary_corpora = {} ## memory-mapped binary corpora opened once per source
+        self.word_freqs = np.zeros(voc_size, dtype='float64')
+        self.n_docs = 0
+        self.max_label = 0.0
+        for source in sources:
+            if is_binary_corpus(source):
+                self._scan_binary_corpus(source)
+            else:
+                self._scan_vec_file(source)
+        self.total_words = float(self.word_freqs.sum())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_binary_corpora'] = {} ## re-opened on demand rather than pickling memory-mapped data
+        return state
+
+    def _open_binary_corpus(self, corpus_dir):
+        if corpus_dir not in self._binary_corpora:
+            X, labels, word_freqs, _, meta = load_binary_corpus(corpus_dir)
+            self._binary_corpora[corpus_dir] = (X, labels, word_freqs, meta)
+        return self._binary_corpora[corpus_dir]
+
+    def _scan_binary_corpus(self, corpus_dir):
+        _, labels, word_freqs, meta = self._open_binary_corpus(corpus_dir)
+        if meta['vocab_size'] != self.voc_size:
+            raise Exception("Binary corpus {} has vocabulary size {}, expected {}".format(corpus_dir, meta['vocab_size'], self.voc_size))
+        for start in range(0, meta['n_docs'], self.rows_per_shard):
+            self.shards.append((corpus_dir, start, min(start + self.rows_per_shard, meta['n_docs'])))
+        self.word_freqs += word_freqs
+        self.n_docs += meta['n_docs']
+        if meta['n_docs'] > 0:
+            self.max_label = max(self.max_label, float(labels.max()))
+
+    def _scan_vec_file(self, sp_file):
+        offset = 0
+        with io.open(sp_file, 'rb') as fp:
+            while True:
+                chunk = b''.join(itertools.islice(fp, self.rows_per_shard))
+                if len(chunk) == 0:
+                    break
+                X, y = load_svmlight_file(io.BytesIO(chunk), n_features=self.voc_size, zero_based=True)
+                self.shards.append((sp_file, offset, offset + len(chunk)))
+                offset += len(chunk)
+                self.word_freqs += np.asarray(X.sum(axis=0)).ravel()
+                self.n_docs += X.shape[0]
+                self.max_label = max(self.max_label, float(y.max()))
+
+    def load_shard(self, shard):
+        """Document-term matrix and labels for a shard (an element of `shards`)"""
+        source, start, end = shard
+        if source in self._binary_corpora or is_binary_corpus(source):
+            X, y, _, _ = self._open_binary_corpus(source)
+            return X[start:end], np.array(y[start:end])
+        with io.open(source, 'rb') as fp:
+            fp.seek(start)
+            X, y = load_svmlight_file(io.BytesIO(fp.read(end - start)), n_features=self.voc_size, dtype='float32', zero_based=True)
+        return X, y
+
+    def iter_shards(self, shuffle=False):
+        """Generator over (document-term matrix, labels) for each shard, in random order if `shuffle`"""
+        order = np.random.permutation(len(self.shards)) if shuffle else range(len(self.shards))
+        for i in order:
+            yield self.load_shard(self.shards[i])
+
+    def head(self, n):
+        """Document-term matrix and labels for (at most) the first `n` documents"""
+        Xs, ys, total = [], [], 0
+        for X, y in self.iter_shards():
+            if total >= n:
+                break
+            Xs.append(X[:n - total])
+            ys.append(y[:n - total])
+            total += Xs[-1].shape[0]
+        return scipy.sparse.vstack(Xs, format='csr'), np.concatenate(ys)
+
+    def get_dataloader(self, batch_size, shuffle=False, shuffle_buffer=100000, last_batch_handle='discard'):
+        """:class:`DataIterLoader` streaming mini-batches over the corpus (see :class:`StreamingCorpusDataIter`)"""
+        return DataIterLoader(StreamingCorpusDataIter(self, batch_size, shuffle=shuffle, shuffle_buffer=shuffle_buffer,
+                                                      last_batch_handle=last_batch_handle))
+
+
+class StreamingCorpusDataIter(DataIter):
+    """Mini-batch iterator over a :class:`ShardedCorpus` holding only a bounded number of documents in memory.
+
+    When shuffling, shards are visited in a new random order each epoch and documents are drawn through a shuffle
+    buffer: shards are accumulated until the buffer holds at least `shuffle_buffer` documents, which are then
+    permuted and emitted as batches (documents left over from a partial batch remain in the buffer).
+
+    Parameters:
+        corpus (:class:`ShardedCorpus`): Corpus to iterate over
+        batch_size (int): Batch size
+        shuffle (bool): Shuffle shard order and documents within the shuffle buffer each epoch
+        shuffle_buffer (int): Number of documents to accumulate before shuffling and emitting batches
+        last_batch_handle (str): 'discard' to drop a final partial batch or 'keep' to emit it as a smaller batch
+    """
+    def __init__(self, corpus, batch_size, shuffle=False, shuffle_buffer=100000, last_batch_handle='discard'):
+        super(StreamingCorpusDataIter, self).__init__(batch_size)
+        self.corpus = corpus
+        self.shuffle = shuffle
+        self.shuffle_buffer = max(shuffle_buffer, batch_size) if shuffle else batch_size
+        self.last_batch_handle = last_batch_handle
+        self._batches = None
+
+    def _emit(self, Xs, ys, final):
+        X = scipy.sparse.vstack(Xs, format='csr')
+        y = np.concatenate(ys)
+        if self.shuffle:
+            perm = np.random.permutation(X.shape[0])
+            X, y = X[perm], y[perm]
+        n_full = X.shape[0] - X.shape[0] % self.batch_size
+        for i in range(0, n_full, self.batch_size):
+            yield X[i:i + self.batch_size], y[i:i + self.batch_size]
+        if n_full < X.shape[0]:
+            if not final:
+                Xs[:], ys[:] = [X[n_full:]], [y[n_full:]]
+                return
+            if self.last_batch_handle == 'keep':
+                yield X[n_full:], y[n_full:]
+        Xs[:], ys[:] = [], []
+
+    def _generate(self):
+        Xs, ys, n = [], [], 0
+        for X, y in self.corpus.iter_shards(shuffle=self.shuffle):
+            Xs.append(X)
+            ys.append(y)
+            n += X.shape[0]
+            if n >= self.shuffle_buffer:
+                for batch in self._emit(Xs, ys, False):
+                    yield batch
+                n = sum(X.shape[0] for X in Xs)
+        if n > 0:
+            for batch in self._emit(Xs, ys, True):
+                yield batch
+
+    def reset(self):
+        self._batches = self._generate()
+
+    def next(self):
+        if self._batches is None:
+            self.reset()
+        X, y = next(self._batches)
+        return DataBatch(data=[X], label=[y], pad=0, index=None)
+
+
 def get_single_vec(els_sp):
     pairs = sorted( [ (int(el[0]), float(el[1]) ) for el in els_sp ] )
     inds, vs = zip(*pairs)
@@ -240,14 +706,7 @@ def _load_dataset_bert(line_gen, voc_size, max_len=64, ctx=mx.cpu()):
     cumulative = 0
     total_num_words = 0
     ndocs = 0
-    bert_model = 'bert_12_768_12'
-    dname = 'book_corpus_wiki_en_uncased'
-    ## This is really only needed here to get the vocab
-    ## GluonNLP API doesn't enable that
-    bert_base, vocab = nlp.model.get_model(bert_model,  
-                                             dataset_name=dname,
-                                             pretrained=True, ctx=ctx, use_pooler=True,
-                                             use_decoder=False, use_classifier=False)
+    vocab = load_bert_vocab(BERT_DATA_NAME) ## only the vocabulary is needed here
     tokenizer = BERTTokenizer(vocab)
     transform = BERTSentenceTransform(tokenizer, max_len, pair=False) 
     x_ids = []
@@ -277,7 +736,7 @@ def _load_dataset_bert(line_gen, voc_size, max_len=64, ctx=mx.cpu()):
         csr_mat = mx.nd.sparse.csr_matrix((values, indices, indptrs), shape=(ndocs, voc_size)).tostype('default')
     else:
         csr_mat = None
-    return x_ids, x_val_lens, x_segs, bert_base, vocab, csr_mat
+    return x_ids, x_val_lens, x_segs, vocab, csr_mat
 
 
 def prepare_bert(content, max_len, bow_vocab_size=1000, vectorizer=None, ctx=mx.cpu()):
@@ -287,7 +746,8 @@ def prepare_bert(content, max_len, bow_vocab_size=1000, vectorizer=None, ctx=mx.
     by a SeqBowEstimator object for the call to fit_with_validation. Also returns
     the BOW matrix as a SciPy sparse matrix along with the BOW vocabulary.
     """
-    x_ids, x_val_lens, x_segs, bert_base, bert_vocab, _ = _load_dataset_bert(content, 0, max_len, ctx)
+    x_ids, x_val_lens, x_segs, bert_vocab, _ = _load_dataset_bert(content, 0, max_len, ctx)
+    bert_base, _ = get_pretrained_bert_model(BERT_MODEL_NAME, BERT_DATA_NAME, ctx=ctx)
     tf_vectorizer = vectorizer or TMNTVectorizer(vocab_size = bow_vocab_size)
     X, _ = tf_vectorizer.transform(content) if vectorizer else tf_vectorizer.fit_transform(content)
     data_train = gluon.data.ArrayDataset(
@@ -301,7 +761,8 @@ def prepare_bert(content, max_len, bow_vocab_size=1000, vectorizer=None, ctx=mx.
 def prepare_bert_via_json(json_file, max_len, bow_vocab_size=1000, vectorizer=None, json_text_key="text", json_label_key=None, ctx=mx.cpu()):
     with io.open(json_file, 'r', encoding='utf-8') as fp:
         content = [json.loads(line)[json_text_key] for line in fp]
-        x_ids, x_val_lens, x_segs, bert_base, bert_vocab, _ = _load_dataset_bert(content, 0, max_len, ctx)
+        x_ids, x_val_lens, x_segs, bert_vocab, _ = _load_dataset_bert(content, 0, max_len, ctx)
+        bert_base, _ = get_pretrained_bert_model(BERT_MODEL_NAME, BERT_DATA_NAME, ctx=ctx)
         tf_vectorizer = vectorizer or TMNTVectorizer(text_key=json_text_key, label_key=json_label_key, vocab_size = bow_vocab_size)
         X, y = tf_vectorizer.transform_json(json_file) if vectorizer else tf_vectorizer.fit_transform_json(json_file)
         data_train = gluon.data.ArrayDataset(
@@ -316,7 +777,8 @@ def prepare_bert_via_json(json_file, max_len, bow_vocab_size=1000, vectorizer=No
 def load_dataset_bert(json_file, voc_size, json_text_key="text", json_sp_key="sp_vec", max_len=64, ctx=mx.cpu()):
     with io.open(json_file, 'r', encoding='utf-8') as fp:
         line_gen = ((json.loads(line)[json_text_key],json.loads(line)[json_sp_key]) for line in fp)
-        x_ids, x_val_lens, x_segs, bert_base, vocab, csr_mat =  _load_dataset_bert(line_gen, voc_size, max_len, ctx)
+        x_ids, x_val_lens, x_segs, vocab, csr_mat = _load_dataset_bert(line_gen, voc_size, max_len, ctx)
+        bert_base, _ = get_pretrained_bert_model(BERT_MODEL_NAME, BERT_DATA_NAME, ctx=ctx)
         data_train = gluon.data.ArrayDataset(
             mx.nd.array(x_ids, dtype='int32'),
             mx.nd.array(x_val_lens, dtype='int32'),
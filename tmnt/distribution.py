@@ -22,9 +22,11 @@ class BaseDistribution(nn.HybridBlock):
         super(BaseDistribution, self).__init__()
         self.n_latent = n_latent
         self.model_ctx = ctx
+        self.mu_bn_epsilon = 0.0001
+        self.mu_bn_scale = True ## learn gamma for the latent batch normalization
         with self.name_scope():
             self.mu_encoder = gluon.nn.Dense(units = n_latent)
-            self.mu_bn = gluon.nn.BatchNorm(momentum = 0.8, epsilon=0.0001)
+            self.mu_bn = gluon.nn.BatchNorm(momentum = 0.8, epsilon=self.mu_bn_epsilon, scale=self.mu_bn_scale)
         #self.mu_bn.collect_params().setattr('grad_req', 'null')
 
     ## perform any postinitialization setup
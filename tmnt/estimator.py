@@ -25,16 +25,19 @@ import umap
 import matplotlib.pyplot as plt
 
 from sklearn.metrics import average_precision_score, top_k_accuracy_score, roc_auc_score, ndcg_score, f1_score, precision_recall_fscore_support
-from tmnt.data_loading import DataIterLoader, SparseMatrixDataIter
+from tmnt.data_loading import DataIterLoader, SparseMatrixDataIter, ShardedCorpus, PrefetchingLoader
 from tmnt.modeling import BowVAEModel, CovariateBowVAEModel, SeqBowVED
 from tmnt.modeling import GeneralizedSDMLLoss, MetricSeqBowVED
 from tmnt.eval_npmi import EvaluateNPMI
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
+from tmnt.bert_store import get_bert_hparams, save_bert_vocab
 from tmnt.distribution import HyperSphericalDistribution, LogisticGaussianDistribution, BaseDistribution, GaussianDistribution
 import autogluon.core as ag
 from itertools import cycle
 from typing import List, Tuple, Dict, Optional, Union, NoReturn
 
 MAX_DESIGN_MATRIX = 250000000
+MAX_NPMI_DOCS = 50000 ## documents used to compute NPMI when not using the encoder or a reference index
 
 def multilabel_pr_fn(cutoff, recall=False):
 
@@ -83,6 +86,8 @@ class BaseEstimator(object):
         coherence_via_encoder: Flag to use encoder to derive coherence scores (via gradient attribution)
         pretrained_param_file: Path to pre-trained parameter file to initialize weights
         warm_start: Subsequent calls to `fit` will use existing model weights rather than reinitializing
+        reference_index: Co-occurrence index over a reference corpus; when provided, coherence (NPMI) is
+            computed against its precomputed statistics rather than against the validation data
     """
     def __init__(self,
                  log_method: str = 'log',
@@ -99,7 +104,8 @@ class BaseEstimator(object):
                  epochs: int = 40,
                  coherence_via_encoder: bool = False,
                  pretrained_param_file: Optional[str] = None,
-                 warm_start: bool = False):
+                 warm_start: bool = False,
+                 reference_index: Optional[CooccurrenceIndex] = None):
         self.log_method = log_method
         self.quiet = quiet
         self.model = None
@@ -117,6 +123,7 @@ class BaseEstimator(object):
         self.coherence_via_encoder = coherence_via_encoder
         self.pretrained_param_file = pretrained_param_file
         self.warm_start = warm_start
+        self.reference_index = reference_index
         self.num_val_words = -1 ## will be set later for computing Perplexity on validation dataset
         self.latent_distribution.ctx = self.ctx
 
@@ -156,11 +163,11 @@ class BaseEstimator(object):
         Returns:
             npmi (float): NPMI score.
         """
-        sorted_ids = self.model.get_ordered_terms()
+        sorted_ids = self.model.get_ordered_terms(k)
         num_topics = min(self.n_latent, sorted_ids.shape[-1])
         top_k_words_per_topic = [[int(i) for i in list(sorted_ids[:k, t])] for t in range(self.n_latent)]
         npmi_eval = EvaluateNPMI(top_k_words_per_topic)
-        npmi = npmi_eval.evaluate_csr_mat(X)
+        npmi = self._evaluate_npmi(npmi_eval, X)
         unique_term_ids = set()
         unique_limit = 5  ## only consider the top 5 terms for each topic when looking at degree of redundancy
         for i in range(num_topics):
@@ -171,6 +178,18 @@ class BaseEstimator(object):
         return npmi, redundancy
 
 
+    def _evaluate_npmi(self, npmi_eval, X=None, dataloader=None):
+        """
+        Score topics against the reference corpus statistics if available, otherwise against data X
+        (or the CSR batches of `dataloader` when provided)
+        """
+        if self.reference_index is not None:
+            return npmi_eval.evaluate_index(self.reference_index)
+        if dataloader is not None:
+            return npmi_eval.evaluate_csr_loader(dataloader)
+        return npmi_eval.evaluate_csr_mat(X)
+
+
     def _get_objective_from_validation_result(self, val_result):
         """
         Get the final objective value from the various validation metrics.
@@ -225,6 +244,13 @@ class BaseBowEstimator(BaseEstimator):
         validate_each_epoch: Perform validation of model against heldout validation 
             data after each training epoch
         multilabel: Assume labels are vectors denoting label sets associated with each document
+        prefetch_batches: Number of training batches prepared ahead in a background thread (0 disables prefetching)
+        sparse_input: Use a first (embedding) layer computed as a sparse dot product with row-sparse weight gradients, so
+            its cost scales with the number of non-zero terms in each batch rather than the vocabulary size. Note that
+            the embedding weight is then saved with shape (vocab_size, embedding_size) rather than the dense layer's
+            (embedding_size, vocab_size), so parameter files are only compatible with models using the same setting
+        n_sampled: Number of shared negative terms per batch for a sampled-softmax training objective (0 uses the exact
+            softmax; only used by models without covariates). Validation always uses the exact softmax
     """
     def __init__(self,
                  vocabulary: nlp.Vocab,
@@ -239,9 +265,15 @@ class BaseBowEstimator(BaseEstimator):
                  num_enc_layers: int = 1,
                  enc_dr: float = 0.1,
                  classifier_dropout: float = 0.1,
+                 prefetch_batches: int = 2,
+                 sparse_input: bool = False,
+                 n_sampled: int = 0,
                  *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.sparse_input = sparse_input
+        self.n_sampled = n_sampled
         self.enc_hidden_dim = enc_hidden_dim
+        self.prefetch_batches = prefetch_batches
         self.fixed_embedding = fixed_embedding
         self.n_encoding_layers = num_enc_layers
         self.enc_dr = enc_dr
@@ -278,7 +310,8 @@ class BaseBowEstimator(BaseEstimator):
                     validate_each_epoch: bool = False,
                     pretrained_param_file: Optional[str] = None,
                     reporter: Optional[object] = None,
-                    ctx: mx.context.Context = mx.cpu()) -> 'BaseBowEstimator':
+                    ctx: mx.context.Context = mx.cpu(),
+                    reference_index: Optional[CooccurrenceIndex] = None) -> 'BaseBowEstimator':
         """
         Create an estimator from a configuration file/object rather than by keyword arguments
         
@@ -288,6 +321,7 @@ class BaseBowEstimator(BaseEstimator):
             pretrained_param_file: Path to pretrained parameter file if using pretrained model
             reporter: Callback reporter to include information for model selection via AutoGluon
             ctx: MXNet context for the estimator
+            reference_index: Co-occurrence index over a reference corpus used to compute coherence
 
         Returns:
             An estimator for training and evaluation of a single model
@@ -332,6 +366,9 @@ class BaseBowEstimator(BaseEstimator):
         n_encoding_layers = config.num_enc_layers
         enc_dr = config.enc_dr
         epochs = int(config.epochs)
+        ## models saved without this setting were trained with a dense first layer
+        sparse_input = config.get('sparse_input', False)
+        n_sampled = int(config.get('n_sampled', 0))
         ldist_def = config.latent_distribution
         kappa = 0.0
         alpha = 1.0
@@ -360,7 +397,10 @@ class BaseBowEstimator(BaseEstimator):
                     num_enc_layers=n_encoding_layers, enc_dr=enc_dr, 
                     epochs=epochs, log_method='log', coherence_via_encoder=coherence_via_encoder,
                     pretrained_param_file = pretrained_param_file,
-                    warm_start = (pretrained_param_file is not None))
+                    warm_start = (pretrained_param_file is not None),
+                    sparse_input = sparse_input,
+                    n_sampled = n_sampled,
+                    reference_index = reference_index)
         return model
 
 
@@ -378,6 +418,8 @@ class BaseBowEstimator(BaseEstimator):
         config['redundancy_loss_wt'] = self.redundancy_reg_penalty
         config['n_labels']           = self.n_labels
         config['covar_net_layers']   = 1
+        config['sparse_input']       = self.sparse_input
+        config['n_sampled']          = self.n_sampled
         if isinstance(self.latent_distribution, HyperSphericalDistribution):
             config['latent_distribution'] = {'dist_type':'vmf', 'kappa': self.latent_distribution.kappa}
         elif isinstance(self.latent_distribution, LogisticGaussianDistribution):
@@ -417,11 +459,11 @@ class BaseBowEstimator(BaseEstimator):
         raise NotImplementedError()
 
     def _npmi_with_dataloader(self, dataloader, k=10):
-        sorted_ids = self.model.get_ordered_terms_encoder(dataloader) if self.coherence_via_encoder else self.model.get_ordered_terms()
+        sorted_ids = self.model.get_ordered_terms_encoder(dataloader, k=k) if self.coherence_via_encoder else self.model.get_ordered_terms(k)
         num_topics = min(self.n_latent, sorted_ids.shape[-1])
         top_k_words_per_topic = [[int(i) for i in list(sorted_ids[:k, t])] for t in range(self.n_latent)]
         npmi_eval = EvaluateNPMI(top_k_words_per_topic)
-        npmi = npmi_eval.evaluate_csr_loader(dataloader)
+        npmi = self._evaluate_npmi(npmi_eval, dataloader=dataloader)
         unique_term_ids = set()
         unique_limit = 5  ## only consider the top 5 terms for each topic when looking at degree of redundancy
         for i in range(num_topics):
@@ -431,23 +473,23 @@ class BaseBowEstimator(BaseEstimator):
         redundancy = (1.0 - (float(len(unique_term_ids)) / num_topics / unique_limit)) ** 2
         return npmi, redundancy
     
+    def _iter_unpadded(self, dataloader):
+        """Iterate over (data, labels) batches, removing the padding from the final batch of a padded dataloader"""
+        for i, (data, labels) in enumerate(dataloader):
+            if labels is None:
+                labels = mx.nd.expand_dims(mx.nd.zeros(data.shape[0]), 1)
+            if i == dataloader.num_batches - 1 and dataloader.last_batch_size > 0:
+                data = data[:dataloader.last_batch_size]
+                labels = labels[:dataloader.last_batch_size]
+            yield data.as_in_context(self.ctx), labels.as_in_context(self.ctx)
+
     def _perplexity(self, dataloader, total_words):
         total_rec_loss = 0
         total_kl_loss  = 0
-        last_batch_size = dataloader.last_batch_size
-        num_batches = dataloader.num_batches
-        for i, (data,labels) in enumerate(dataloader):
-            if labels is None:            
-                labels = mx.nd.expand_dims(mx.nd.zeros(data.shape[0]), 1)
-            data = data.as_in_context(self.ctx)
-            labels = labels.as_in_context(self.ctx)
+        for data, labels in self._iter_unpadded(dataloader):
             _, kl_loss, rec_loss, _, _, _ = self._forward(self.model, data, labels)
-            if i == num_batches - 1 and last_batch_size > 0:
-                total_rec_loss += rec_loss[:last_batch_size].sum().asscalar()
-                total_kl_loss  += kl_loss[:last_batch_size].sum().asscalar()
-            else:
-                total_rec_loss += rec_loss.sum().asscalar()
-                total_kl_loss += kl_loss.sum().asscalar()
+            total_rec_loss += rec_loss.sum().asscalar()
+            total_kl_loss += kl_loss.sum().asscalar()
         if ((total_rec_loss + total_kl_loss) / total_words) < 709.0:
             perplexity = math.exp((total_rec_loss + total_kl_loss) / total_words)
         else:
@@ -466,7 +508,7 @@ class BaseBowEstimator(BaseEstimator):
         num_val_batches = val_X.shape[0] // test_batch_size
         if last_batch_size > 0 and last_batch_size < test_batch_size:
             num_val_batches += 1
-        if test_size < MAX_DESIGN_MATRIX:
+        if test_size < MAX_DESIGN_MATRIX and not self.sparse_input:
             val_X = mx.nd.sparse.csr_matrix(val_X).tostype('default')
             val_y = mx.nd.array(val_y) if val_y is not None else None
             val_dataloader = DataIterLoader(mx.io.NDArrayIter(val_X, val_y, test_batch_size,
@@ -475,37 +517,49 @@ class BaseBowEstimator(BaseEstimator):
         else:
             val_dataloader = DataIterLoader(SparseMatrixDataIter(val_X, val_y, batch_size = test_batch_size,
                                                                  last_batch_handle='pad', shuffle=False),
-                                            )
+                                            num_batches=num_val_batches, last_batch_size = last_batch_size)
         return val_dataloader
 
     def validate(self, val_X, val_y):
         val_dataloader = self._get_val_dataloader(val_X, val_y)
-        total_val_words = val_X.sum()
+        npmi_X = val_X if self.reference_index is not None else val_X[:min(val_X.shape[0], MAX_NPMI_DOCS)]
+        return self._validate(val_dataloader, val_X.sum(), npmi_X)
+
+    def validate_streaming(self, val_corpus: ShardedCorpus) -> dict:
+        """
+        Validate the model against a corpus streamed from disk (see :meth:`fit_with_validation_streaming`)
+
+        Parameters:
+            val_corpus: Validation corpus
+
+        Returns:
+            Dictionary of validation metrics
+        """
+        val_dataloader = val_corpus.get_dataloader(self.batch_size, last_batch_handle='keep')
+        npmi_X = None
+        if not self.coherence_via_encoder and self.reference_index is None:
+            npmi_X, _ = val_corpus.head(MAX_NPMI_DOCS)
+        return self._validate(val_dataloader, val_corpus.total_words, npmi_X)
+
+    def _validate(self, val_dataloader, total_val_words, npmi_X):
         if self.num_val_words < 0:
             self.num_val_words = total_val_words
         ppl = self._perplexity(val_dataloader, total_val_words)
         if self.coherence_via_encoder:
             npmi, redundancy = self._npmi_with_dataloader(val_dataloader)
         else:
-            n = min(val_X.shape[0], 50000)
-            npmi, redundancy = self._npmi(val_X[:n])
+            npmi, redundancy = self._npmi(npmi_X)
         v_res = {'ppl': ppl, 'npmi': npmi, 'redundancy': redundancy}
         prediction_arrays = []
+        label_arrays = []
         if self.has_classifier:
             tot_correct = 0
             tot = 0
-            bs = min(val_X.shape[0], self.batch_size)
-            num_std_batches = val_X.shape[0] // bs
-            last_batch_size = val_X.shape[0] % bs
-            for i, (data, labels) in enumerate(val_dataloader):
-                data = data.as_in_context(self.ctx)
-                labels = labels.as_in_context(self.ctx)
-                if i == num_std_batches - 1 and last_batch_size > 0:
-                    data = data[:last_batch_size]
-                    labels = labels[:last_batch_size]
+            for data, labels in self._iter_unpadded(val_dataloader):
                 predictions = self.model.predict(data)    
                 predictions_lists = [ p.asnumpy() for p in list(predictions) ]
                 prediction_arrays.extend(predictions_lists)
+                label_arrays.append(labels.asnumpy())
                 if len(labels.shape) == 1:  ## standard single-label classification
                     correct = mx.nd.argmax(predictions, axis=1) == labels
                     tot_correct += mx.nd.sum(correct).asscalar()
@@ -513,6 +567,7 @@ class BaseBowEstimator(BaseEstimator):
             acc = float(tot_correct) / float(tot)
             v_res['accuracy'] = acc
             prediction_mat = np.array(prediction_arrays)
+            val_y = np.concatenate(label_arrays)
             ap_scores = []
             if len(val_y.shape) == 1:
                 val_y = self._np_one_hot(val_y, self.n_labels)
@@ -524,7 +579,6 @@ class BaseBowEstimator(BaseEstimator):
                 else:
                     ap_c = 0.0
                 ap_scores.append((ap_c, int(y_vec.sum())))
-            prediction_np_mat = np.array(prediction_arrays)
             v_res['ap_scores_and_support'] = ap_scores
         return v_res
 
@@ -575,7 +629,7 @@ class BaseBowEstimator(BaseEstimator):
                 DataIterLoader(SparseMatrixDataIter(X, y, batch_size = self.batch_size, last_batch_handle='discard', shuffle=True))
         else:
             y = mx.nd.array(y) if y is not None else None
-            X = mx.nd.sparse.csr_matrix(X)
+            X = mx.nd.sparse.csr_matrix(X, dtype='float32')
             train_dataloader = DataIterLoader(mx.io.NDArrayIter(X, y, self.batch_size, last_batch_handle='discard', shuffle=True))
         if aux_X is not None:
             aux_dataloader = \
@@ -602,6 +656,7 @@ class BaseBowEstimator(BaseEstimator):
                     elbo_mean = elbo_ls.mean()
                 total_ls.backward()
                 trainer.step(1)
+                self.model.params_updated()
                 if not self.quiet:
                     elbo_losses.append(float(elbo_mean.asscalar()))
                     if lab_loss is not None:
@@ -656,9 +711,36 @@ class BaseBowEstimator(BaseEstimator):
                 DataIterLoader(SparseMatrixDataIter(X, y, batch_size = self.batch_size, last_batch_handle='discard', shuffle=True))
         else:
             y = mx.nd.array(y) if y is not None else None
-            X = mx.nd.sparse.csr_matrix(X)
+            X = mx.nd.sparse.csr_matrix(X, dtype='float32')
             train_dataloader = DataIterLoader(mx.io.NDArrayIter(X, y, self.batch_size, last_batch_handle='discard', shuffle=True))
 
+        validate_fn = (lambda: self.validate(val_X, val_y)) if val_X is not None else None
+        return self._fit_with_dataloader(train_dataloader, wd_freqs, validate_fn)
+
+    def fit_with_validation_streaming(self,
+                                      tr_corpus: ShardedCorpus,
+                                      val_corpus: Optional[ShardedCorpus] = None,
+                                      shuffle_buffer: int = 100000) -> Tuple[float, dict]:
+        """
+        Fit a model with training (and optional validation) data streamed from disk, for corpora too large to
+        hold in memory. Shards are visited in a random order each epoch and documents are shuffled within a
+        buffer of `shuffle_buffer` documents; memory use is bounded by the buffer rather than the corpus size.
+
+        Parameters:
+            tr_corpus: Training corpus
+            val_corpus: Validation corpus
+            shuffle_buffer: Number of documents held in memory and shuffled together
+
+        Returns:
+            sc_obj, v_res
+        """
+        train_dataloader = tr_corpus.get_dataloader(self.batch_size, shuffle=True, shuffle_buffer=shuffle_buffer)
+        validate_fn = (lambda: self.validate_streaming(val_corpus)) if val_corpus is not None else None
+        return self._fit_with_dataloader(train_dataloader, tr_corpus.word_freqs, validate_fn)
+
+    def _fit_with_dataloader(self, train_dataloader, wd_freqs, validate_fn):
+        if self.prefetch_batches > 0:
+            train_dataloader = PrefetchingLoader(train_dataloader, depth=self.prefetch_batches, ctx=self.ctx)
         if self.model is None or not self.warm_start:
             self.model = self._get_model()
             self.model.initialize_bias_terms(mx.nd.array(wd_freqs).squeeze())  ## initialize bias weights to log frequencies
@@ -668,6 +750,7 @@ class BaseBowEstimator(BaseEstimator):
         v_res = None
         for epoch in range(self.epochs):
             ts_epoch = time.time()
+            stall_start = getattr(train_dataloader, 'stall_time', 0.0)
             elbo_losses = []
             lab_losses  = []
             for i, (data, labels) in enumerate(train_dataloader):
@@ -680,6 +763,7 @@ class BaseBowEstimator(BaseEstimator):
                     elbo_mean = elbo_ls.mean()
                 total_ls.backward()
                 trainer.step(1)
+                self.model.params_updated()
                 if not self.quiet:
                     elbo_losses.append(float(elbo_mean.asscalar()))
                     if lab_loss is not None:
@@ -687,12 +771,13 @@ class BaseBowEstimator(BaseEstimator):
             if not self.quiet and not self.validate_each_epoch:
                 elbo_mean = np.mean(elbo_losses) if len(elbo_losses) > 0 else 0.0
                 lab_mean  = np.mean(lab_losses) if len(lab_losses) > 0 else 0.0
-                self._output_status("Epoch [{}] finished in {} seconds. [elbo = {}, label loss = {}]"
-                                    .format(epoch+1, (time.time()-ts_epoch), elbo_mean, lab_mean))
+                self._output_status("Epoch [{}] finished in {} seconds. [elbo = {}, label loss = {}, data stall = {} seconds]"
+                                    .format(epoch+1, (time.time()-ts_epoch), elbo_mean, lab_mean,
+                                            getattr(train_dataloader, 'stall_time', 0.0) - stall_start))
             mx.nd.waitall()
-            if val_X is not None and (self.validate_each_epoch or epoch == self.epochs-1):
+            if validate_fn is not None and (self.validate_each_epoch or epoch == self.epochs-1):
                 logging.info('Performing validation ....')
-                v_res = self.validate(val_X, val_y)
+                v_res = validate_fn()
                 sc_obj = self._get_objective_from_validation_result(v_res)
                 if self.has_classifier:
                     self._output_status("Epoch [{}]. Objective = {} ==> PPL = {}. NPMI ={}. Redundancy = {}. Accuracy = {}."
@@ -801,7 +886,7 @@ class BowEstimator(BaseBowEstimator):
                             vocabulary=self.vocabulary, 
                             latent_distribution=self.latent_distribution, 
                             coherence_reg_penalty=self.coherence_reg_penalty, redundancy_reg_penalty=self.redundancy_reg_penalty,
-                            batch_size=self.batch_size, 
+                            batch_size=self.batch_size, sparse_input=self.sparse_input, n_sampled=self.n_sampled,
                             n_covars=0, ctx=self.ctx)
         if self.pretrained_param_file is not None:
             model.load_parameters(self.pretrained_param_file, allow_missing=False)
@@ -869,6 +954,7 @@ class CovariateBowEstimator(BaseBowEstimator):
                                  fixed_embedding=self.fixed_embedding, latent_distribution=self.latent_distribution,
                                  coherence_reg_penalty=self.coherence_reg_penalty, redundancy_reg_penalty=self.redundancy_reg_penalty,
                                  batch_size=self.batch_size, n_encoding_layers=self.n_encoding_layers, enc_dr=self.enc_dr,
+                                 sparse_input=self.sparse_input,
                                  ctx=self.ctx)
         return model
 
@@ -897,7 +983,7 @@ class CovariateBowEstimator(BaseBowEstimator):
         return model(data, labels)
 
 
-    def _npmi_per_covariate(self, X, y, k=10):
+    def _npmi_per_covariate(self, X, y, k=10, data_key=None):
         """
         Calculate NPMI(Normalized Pointwise Mutual Information) for each covariate for data X
 
@@ -905,20 +991,28 @@ class CovariateBowEstimator(BaseBowEstimator):
             X (array-like or sparse matrix): Document word matrix. shape [n_samples, vocab_size]
             y (array-like or sparse matrix): Covariate matrix. shape [n_samples, n_covars]
             k (int): Threshold at which to compute npmi. optional (default=10)
+            data_key (hashable): Optional key identifying X; term sensitivities for each covariate value are then
+                cached under (data_key, covariate value) until the model parameters change
 
         Returns:
             (dict): Dictionary of npmi scores for each covariate.
         """
-        X_train = X.toarray()
-        y_train = y
-        covars = np.unique(y_train, axis=0)
+        X = sp.csr_matrix(X, dtype='float32')
+        y = np.asarray(y, dtype='float32')
+        covars, covar_ids = np.unique(y, axis=0, return_inverse=True)
+        ## group rows by covariate value with a single row permutation of the sparse matrix
+        order = np.argsort(covar_ids, kind='stable')
+        bounds = np.searchsorted(covar_ids[order], np.arange(len(covars) + 1))
+        X_grouped, y_grouped = X[order], y[order]
         covar_npmi = {}
         npmi_total = 0
-        for covar in covars:
-            mask = (y_train == covar).all(axis=1)
-            X_covar, y_covar = mx.nd.array(X_train[mask], dtype=np.float32), mx.nd.array(y_train[mask], dtype=np.float32)
-            sorted_ids = self.model.get_ordered_terms_with_covar_at_data(X_covar,k, y_covar)
-            top_k_words_per_topic = [[int(i) for i in list(sorted_ids[:k, t].asnumpy())] for t in range(self.n_latent)]
+        for j, covar in enumerate(covars):
+            X_covar = X_grouped[bounds[j]:bounds[j+1]]
+            y_covar = mx.nd.array(y_grouped[bounds[j]:bounds[j+1]], dtype=np.float32)
+            cache_key = (data_key, tuple(covar)) if data_key is not None else None
+            sorted_ids = self.model.get_ordered_terms_with_covar_at_data(mx.nd.sparse.csr_matrix(X_covar), k, y_covar,
+                                                                         cache_key=cache_key)
+            top_k_words_per_topic = [[int(i) for i in list(sorted_ids[:k, t])] for t in range(self.n_latent)]
             npmi_eval = EvaluateNPMI(top_k_words_per_topic)
             npmi = npmi_eval.evaluate_csr_mat(X_covar)
 
@@ -926,7 +1020,7 @@ class CovariateBowEstimator(BaseBowEstimator):
             #    covar_key = covar[0]
             #else:
             #    covar_key = np.where(covar)[0][0]
-            covar_keky = covar[0]
+            covar_key = covar[0]
             covar_npmi[covar_key] = npmi
             npmi_total += npmi
         return npmi_total / len(covars)
@@ -942,6 +1036,10 @@ class CovariateBowEstimator(BaseBowEstimator):
         npmi, redundancy = self._npmi(X)
         return {'npmi': npmi, 'redundancy': redundancy, 'ppl': 0.0}
 
+    def validate_streaming(self, val_corpus):
+        X, y = val_corpus.head(MAX_NPMI_DOCS)
+        return self.validate(X, y)
+
     def get_topic_vectors(self) -> mx.nd.NDArray:
         """
         Get topic vectors of the fitted model.
@@ -974,6 +1072,7 @@ class SeqBowEstimator(BaseEstimator):
                  bert_model_name = 'bert_12_768_12',
                  bert_data_name = 'book_corpus_wiki_en_uncased',
                  bow_vocab = None,
+                 bert_vocab = None,
                  n_labels = 0,
                  log_interval=5,
                  warmup_ratio=0.1,
@@ -1004,6 +1103,7 @@ class SeqBowEstimator(BaseEstimator):
         self.decoder_lr = decoder_lr
         self._bow_matrix = None
         self.bow_vocab = bow_vocab
+        self.bert_vocab = bert_vocab
 
 
     @classmethod
@@ -1015,6 +1115,7 @@ class SeqBowEstimator(BaseEstimator):
                     reporter: Optional[object] = None,
                     log_interval: int = 1,
                     pretrained_param_file: Optional[str] = None,
+                    bert_vocab: Optional[nlp.vocab.BERTVocab] = None,
                     ctx: mx.context.Context = mx.cpu()) -> 'SeqBowEstimator':
         """
         Instantiate an object of this class using the provided `config`
@@ -1027,6 +1128,7 @@ class SeqBowEstimator(BaseEstimator):
             repoter: Autogluon reporter object with callbacks for logging model selection
             log_interval: Logging frequency (default = 1)
             pretrained_param_file: Parameter file
+            bert_vocab: BERT vocabulary, saved with the model so that it may be reloaded without fetching pretrained BERT
             ctx: MXNet context
         
         Returns:
@@ -1057,6 +1159,7 @@ class SeqBowEstimator(BaseEstimator):
                     bert_model_name = config.bert_model_name,
                     bert_data_name  = config.bert_data_name,
                     bow_vocab       = bow_vocab, 
+                    bert_vocab      = bert_vocab,
                     n_labels        = n_labels,
                     latent_distribution = latent_distribution,
                     batch_size      = int(config.batch_size),
@@ -1121,6 +1224,7 @@ class SeqBowEstimator(BaseEstimator):
         config['warmup_ratio'] = self.warmup_ratio
         config['bert_model_name'] = self.bert_model_name
         config['bert_data_name'] = self.bert_data_name
+        config['bert_hparams'] = get_bert_hparams(self.bert_model_name)
         config['classifier_dropout'] = self.classifier_dropout
         return config
 
@@ -1142,6 +1246,8 @@ class SeqBowEstimator(BaseEstimator):
             f.write(specs)
         with open(vocab_file, 'w') as f:
             f.write(self.bow_vocab.to_json())
+        if self.bert_vocab is not None:
+            save_bert_vocab(self.bert_vocab, model_dir, suffix)
 
 
     def log_train(self, batch_id, batch_num, metric, step_loss, rec_loss, red_loss, class_loss,
@@ -1374,7 +1480,7 @@ class SeqBowEstimator(BaseEstimator):
         num_topics = min(num_topics, sorted_ids.shape[-1])
         top_k_words_per_topic = [[ int(i) for i in list(sorted_ids[:k, t])] for t in range(num_topics)]
         npmi_eval = EvaluateNPMI(top_k_words_per_topic)
-        npmi = npmi_eval.evaluate_csr_mat(test_data)
+        npmi = self._evaluate_npmi(npmi_eval, test_data)
         unique_term_ids = set()
         unique_limit = 5  ## only consider the top 5 terms for each topic when looking at degree of redundancy
         for i in range(num_topics):
@@ -1673,6 +1779,7 @@ class DeepAveragingBowEstimator(BaseEstimator):
                     elbo_mean = elbo.mean()
                 elbo_mean.backward()
                 trainer.step(1)
+                self.model.params_updated()
                 if not self.quiet:
                     elbo_losses.append(float(elbo_mean.asscalar()))
                     if lab_loss is not None:
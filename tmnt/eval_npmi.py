@@ -11,23 +11,32 @@ import mxnet as mx
 import scipy
 import scipy.sparse
 
-from tmnt.utils.ngram_helpers import BigramReader
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
 from itertools import combinations
 
 __all__ = ['NPMI', 'EvaluateNPMI']
 
 class NPMI(object):
+    """Pairwise NPMI over document counts.
 
-    def __init__(self, unigram_cnts: Counter, bigram_cnts: Counter, n_docs: int):
+    Counts are taken either from `unigram_cnts`/`bigram_cnts` dictionaries (keyed by term id and
+    by sorted term id pairs) or, when `index` is provided, looked up from a :class:`CooccurrenceIndex`.
+    """
+
+    def __init__(self, unigram_cnts: Counter = None, bigram_cnts: Counter = None, n_docs: int = 0,
+                 index: CooccurrenceIndex = None):
         self.unigram_cnts = unigram_cnts
         self.bigram_cnts = bigram_cnts
-        self.n_docs = n_docs
-        
+        self.index = index
+        self.n_docs = index.n_docs if index is not None else n_docs
+
+    def _get_cnts(self, w1: int, w2: int):
+        if self.index is not None:
+            return self.index.doc_freq(w1), self.index.doc_freq(w2), self.index.co_doc_freq(w1, w2)
+        return self.unigram_cnts.get(w1, 0.0), self.unigram_cnts.get(w2, 0.0), self.bigram_cnts.get((w1, w2), 0.0)
 
     def wd_id_pair_npmi(self, w1: int, w2: int):
-        cw1 = self.unigram_cnts.get(w1, 0.0)
-        cw2 = self.unigram_cnts.get(w2, 0.0)
-        c12 = self.bigram_cnts.get((w1, w2), 0.0)
+        cw1, cw2, c12 = self._get_cnts(w1, w2)
         if cw1 == 0.0 or cw2 == 0.0 or c12 == 0.0:
             return 0.0
         else:
@@ -39,9 +48,19 @@ class EvaluateNPMI(object):
     def __init__(self, top_k_words_per_topic):
         self.top_k_words_per_topic = top_k_words_per_topic
 
-    def evaluate_sp_vec(self, test_sparse_vec):
-        reader = BigramReader(test_sparse_vec)
-        npmi = NPMI(reader.unigrams, reader.bigrams, reader.n_docs)
+    def evaluate_sp_vec(self, test_sparse_vec, index_dir=None):
+        """Evaluate NPMI of the topic terms against a corpus in sparse vector format.
+
+        Parameters:
+            test_sparse_vec (str): Path to corpus in sparse vector format
+            index_dir (str): Directory for saved co-occurrence indices; an index for the corpus
+                is re-used from here if present and saved here otherwise. optional (default = None)
+
+        Returns:
+            (float): NPMI averaged over topics
+        """
+        index = CooccurrenceIndex.from_svmlight_file(test_sparse_vec, index_dir=index_dir)
+        npmi = NPMI(index=index)
         total_npmi = 0
         for i, words_per_topic in enumerate(self.top_k_words_per_topic):
             total_topic_npmi = 0
@@ -53,7 +72,63 @@ class EvaluateNPMI(object):
             total_npmi += total_topic_npmi
         return total_npmi / len(self.top_k_words_per_topic)
 
+    def _get_unique_word_ids(self):
+        """Union of the term ids across all topics, along with each topic's term ids
+        remapped to positions within that union.
+        """
+        unique_ids = np.array(sorted(set(int(w) for words in self.top_k_words_per_topic for w in words)), dtype='int64')
+        id_to_pos = {w: i for i, w in enumerate(unique_ids)}
+        topic_positions = [[id_to_pos[int(w)] for w in sorted(words)] for words in self.top_k_words_per_topic]
+        return unique_ids, topic_positions
+
+    def _npmi_from_counts(self, unigram_cnts, bigram_cnts, n_docs, topic_positions):
+        """Compute the average per-topic NPMI from document frequencies over the unique topic terms.
+
+        Parameters:
+            unigram_cnts (:class:`numpy.ndarray`): Document frequency for each unique term, shape (U,)
+            bigram_cnts (:class:`numpy.ndarray`): Co-document frequencies for term pairs, shape (U, U)
+            n_docs (int): Number of documents
+            topic_positions (list): Per-topic lists of positions into the unique term arrays
+
+        Returns:
+            (float): NPMI averaged over topics
+        """
+        unigram_cnts = np.asarray(unigram_cnts, dtype='float64')
+        bigram_cnts = np.asarray(bigram_cnts, dtype='float64')
+        log_n = log10(n_docs) if n_docs > 0 else 0.0
+        lengths = set(len(p) for p in topic_positions)
+        if len(lengths) == 1:
+            groups = [np.array(topic_positions, dtype='int64')]
+        else:
+            groups = [np.array([p], dtype='int64') for p in topic_positions]
+        total_npmi = 0.0
+        for pos in groups:
+            n = pos.shape[1]
+            i1, i2 = np.triu_indices(n, k=1)
+            w1, w2 = pos[:, i1], pos[:, i2]  ## shape (n_topics, n_pairs)
+            c12 = bigram_cnts[w1, w2]
+            c1 = unigram_cnts[w1]
+            c2 = unigram_cnts[w2]
+            valid = c12 >= 1
+            npmi = np.zeros(c12.shape)
+            l12 = np.log10(c12[valid])
+            npmi[valid] = (log_n + l12 - np.log10(c1[valid]) - np.log10(c2[valid])) / (log_n - l12 + 1e-4)
+            total_npmi += (npmi.sum(axis=1) * (2 / (n * (n-1)))).sum()
+        return total_npmi / len(self.top_k_words_per_topic)
+
     def evaluate_csr_mat(self, csr_mat):
+        """Evaluate NPMI of the topic terms against a document-term matrix.
+
+        Document and co-document frequencies are computed at once for the union
+        of all topic terms using a single product over the binarized
+        document-term submatrix restricted to those terms.
+
+        Parameters:
+            csr_mat: Document-term matrix as a SciPy CSR matrix, an MXNet CSRNDArray or a dense NDArray
+
+        Returns:
+            (float): NPMI averaged over topics
+        """
         if isinstance(csr_mat, scipy.sparse.csr.csr_matrix):
             is_sparse = True
             mat = csr_mat
@@ -64,65 +139,54 @@ class EvaluateNPMI(object):
             else:
                 mat = csr_mat.asnumpy()
         n_docs = mat.shape[0]
-        total_npmi = 0
-        for i, words_per_topic in enumerate(self.top_k_words_per_topic):
-            total_topic_npmi = 0
-            n_topics = len(words_per_topic)
-            for (w1, w2) in combinations(sorted(words_per_topic), 2):
-                o_1 = mat[:, w1] > 0
-                o_2 = mat[:, w2] > 0
-                if is_sparse:
-                    o_1 = o_1.toarray().squeeze()
-                    o_2 = o_2.toarray().squeeze()
-                occur_1 = np.array(o_1, dtype='int')
-                occur_2 = np.array(o_2, dtype='int')
-                unigram_1 = occur_1.sum()
-                unigram_2 = occur_2.sum()
-                bigram_cnt = np.sum(occur_1 * occur_2)
-                if bigram_cnt < 1:
-                    npmi = 0.0
-                else:
-                    npmi = (log10(n_docs) + log10(bigram_cnt) - log10(unigram_1) - log10(unigram_2)) / (log10(n_docs) - log10(bigram_cnt) + 1e-4)
-                total_topic_npmi += npmi
-            total_topic_npmi *= (2 / (n_topics * (n_topics-1)))
-            total_npmi += total_topic_npmi
-        return total_npmi / len(self.top_k_words_per_topic)
+        unique_ids, topic_positions = self._get_unique_word_ids()
+        occur = (mat[:, unique_ids] > 0).astype('int64')
+        bigram_cnts = occur.T @ occur
+        if is_sparse:
+            bigram_cnts = bigram_cnts.toarray()
+        unigram_cnts = np.diag(bigram_cnts)
+        return self._npmi_from_counts(unigram_cnts, bigram_cnts, n_docs, topic_positions)
+
+    def evaluate_index(self, index):
+        """Evaluate NPMI of the topic terms against precomputed statistics of a reference corpus.
+
+        Parameters:
+            index (:class:`tmnt.utils.ngram_helpers.CooccurrenceIndex`): Co-occurrence index over the reference corpus
+
+        Returns:
+            (float): NPMI averaged over topics
+        """
+        unique_ids, topic_positions = self._get_unique_word_ids()
+        unigram_cnts, bigram_cnts = index.get_counts(unique_ids)
+        return self._npmi_from_counts(unigram_cnts, bigram_cnts, index.n_docs, topic_positions)
 
     def evaluate_csr_loader(self, dataloader):
-        ndocs = 0
-        total_npmi = 0
-        for i, words_per_topic in enumerate(self.top_k_words_per_topic):
-            n_topics = len(words_per_topic)
-            total_topic_npmi = 0
-            for (w1, w2) in combinations(sorted(words_per_topic), 2):
-                npmi = 0.0
-                unigram1 = 0.0
-                unigram2 = 0.0
-                bigram_cnt = 0.0
-                n_docs = 0
-                for _, (csr,_) in enumerate(dataloader):
-                    is_sparse = isinstance(csr, mx.nd.sparse.CSRNDArray)
-                    if is_sparse:
-                        mat = csr.asscipy()
-                    else:
-                        mat = csr.asnumpy()
-                    n_docs += mat.shape[0]
-                    o1 = mat[:, w1] > 0
-                    o2 = mat[:, w2] > 0
-                    if is_sparse:
-                        o1 = o1.toarray().squeeze()
-                        o2 = o2.toarray().squeeze()
-                    occur1 = np.array(o1, dtype='int')
-                    occur2 = np.array(o2, dtype='int')
-                    unigram1 += occur1.sum()
-                    unigram2 += occur2.sum()
-                    bigram_cnt += np.sum(occur1 * occur2)
-                if bigram_cnt >= 1:
-                    npmi += (log10(n_docs) + log10(bigram_cnt) - log10(unigram1) - log10(unigram2)) / (log10(n_docs) - log10(bigram_cnt) + 1e-4)
-                total_topic_npmi += npmi
-            total_topic_npmi *= (2 / (n_topics * (n_topics-1)))
-            total_npmi += total_topic_npmi
-        return total_npmi / len(self.top_k_words_per_topic)
-                        
-        
+        """Evaluate NPMI of the topic terms against data provided by a dataloader.
+
+        The data is read in a single pass; document and co-document frequencies for
+        the union of topic terms are accumulated batch by batch so that memory is
+        bounded by the batch size and the number of unique topic terms.
 
+        Parameters:
+            dataloader: Iterable of (data, label) batches, with data as an MXNet CSRNDArray or dense NDArray
+
+        Returns:
+            (float): NPMI averaged over topics
+        """
+        unique_ids, topic_positions = self._get_unique_word_ids()
+        bigram_cnts = np.zeros((len(unique_ids), len(unique_ids)), dtype='int64')
+        n_docs = 0
+        for _, (csr,_) in enumerate(dataloader):
+            is_sparse = isinstance(csr, mx.nd.sparse.CSRNDArray)
+            if is_sparse:
+                mat = csr.asscipy()
+            else:
+                mat = csr.asnumpy()
+            n_docs += mat.shape[0]
+            occur = (mat[:, unique_ids] > 0).astype('int64')
+            batch_cnts = occur.T @ occur
+            if is_sparse:
+                batch_cnts = batch_cnts.toarray()
+            bigram_cnts += batch_cnts
+        unigram_cnts = np.diag(bigram_cnts)
+        return self._npmi_from_counts(unigram_cnts, bigram_cnts, n_docs, topic_positions)
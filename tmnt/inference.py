@@ -14,26 +14,76 @@ import scipy
 import umap
 import logging
 import pickle
+import tempfile
+import hashlib
+import copy
+import weakref
+import multiprocessing
 from tmnt.modeling import BowVAEModel, CovariateBowVAEModel, SeqBowVED, MetricSeqBowVED
 from tmnt.estimator import BowEstimator
-from tmnt.data_loading import DataIterLoader, file_to_data, SparseMatrixDataIter
+from tmnt.data_loading import DataIterLoader, file_to_data, SparseMatrixDataIter, is_binary_corpus, load_binary_corpus
 from tmnt.preprocess.vectorizer import TMNTVectorizer
 from tmnt.distribution import HyperSphericalDistribution
-from tmnt.utils.recalibrate import recalibrate_scores
-from multiprocessing import Pool
+from tmnt.utils.recalibrate import recalibrate_scores_batch
+from tmnt.utils.cache import EncodingCache
+from tmnt.bert_store import load_bert_vocab, get_bert_model
 from gluonnlp.data import BERTTokenizer, BERTSentenceTransform
 from sklearn.datasets import load_svmlight_file
-from functools import partial
+from itertools import islice
 
 
 MAX_DESIGN_MATRIX = 250000000 
+ENCODE_BATCH_ELEMENTS = 1 << 24 ## bound on (dense equivalent) input elements per batch when auto-sizing encoding batches
+
+
+def _get_params_digest(model):
+    md5 = hashlib.md5()
+    for name, p in sorted(model.collect_params().items()):
+        md5.update(name.encode('utf-8'))
+        try:
+            md5.update(p.data().asnumpy().tobytes())
+        except mx.gluon.parameter.DeferredInitializationError:
+            pass ## not yet used (e.g. a batch-norm layer only applied during training)
+    return md5.hexdigest()
+
 
 class BaseInferencer(object):
     """Base inference object for text encoding with a trained topic model.
 
     """
-    def __init__(self, ctx):
+    def __init__(self, ctx, cache=None):
         self.ctx = ctx
+        self.cache = cache
+        self._cache_model = None
+        self._cache_state = None
+
+    def _bind_cache(self, model):
+        ## entries computed with different model parameters (e.g. before the model was reloaded) are discarded
+        self._cache_model = model
+        self._cache_state = None
+        if self.cache is not None:
+            self._refresh_cache_binding()
+
+    def _refresh_cache_binding(self):
+        ## the parameter digest is only recomputed when the cache or the model's parameter version (bumped by
+        ## training steps and load_parameters, e.g. on a warm start) has changed since the cache was last bound
+        state = (id(self.cache), getattr(self._cache_model, 'params_version', None))
+        if state != self._cache_state:
+            self.cache.bind(_get_params_digest(self._cache_model))
+            self._cache_state = state
+
+    def _cached_map(self, texts, fn, *params):
+        ## apply fn (mapping a list of texts to a list of results) to the texts not found in the cache;
+        ## callers receive copies so that modifying a result cannot corrupt the cached value
+        self._refresh_cache_binding()
+        keys = [self.cache.text_key(t, *params) for t in texts]
+        results = [self.cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if len(missing) > 0:
+            for i, r in zip(missing, fn([texts[i] for i in missing])):
+                results[i] = r
+                self.cache.put(keys[i], r)
+        return [copy.deepcopy(r) for r in results]
 
     def save(self, model_dir):
         raise NotImplementedError
@@ -50,10 +100,16 @@ class BaseInferencer(object):
 
 class BowVAEInferencer(BaseInferencer):
     """
+    Parameters:
+        estimator (:class:`tmnt.estimator.BowEstimator`): Estimator holding a trained model
+        pre_vectorizer (:class:`tmnt.preprocess.vectorizer.TMNTVectorizer`): Vectorizer used to map texts to document vectors
+        batch_size (int): Number of documents per encoding batch (default None auto-sizes batches)
+        cache (:class:`tmnt.utils.cache.EncodingCache`): Optional cache of text encodings and predictions
     """
-    def __init__(self, estimator, pre_vectorizer=None):
-        super().__init__(estimator.model.model_ctx)
+    def __init__(self, estimator, pre_vectorizer=None, batch_size=None, cache=None):
+        super().__init__(estimator.model.model_ctx, cache)
         self.max_batch_size = 16
+        self.batch_size = batch_size
         self.vocab = estimator.model.vocabulary
         self.vectorizer = pre_vectorizer or TMNTVectorizer(initial_vocabulary=estimator.model.vocabulary)
         self.n_latent = estimator.model.n_latent
@@ -65,9 +121,10 @@ class BowVAEInferencer(BaseInferencer):
             self.covar_net_layers = estimator.model.covar_net_layers
         else:
             self.covar_model = False
+        self._bind_cache(self.model)
 
     @classmethod
-    def from_saved(cls, param_file=None, config_file=None, vocab_file=None, model_dir=None, ctx=mx.cpu()):
+    def from_saved(cls, param_file=None, config_file=None, vocab_file=None, model_dir=None, ctx=mx.cpu(), cache=None):
         serialized_vectorizer_file = None
         if model_dir is not None:
             estimator = BowEstimator.from_saved(model_dir)
@@ -84,7 +141,7 @@ class BowVAEInferencer(BaseInferencer):
         else:
             vectorizer = None
         #model.load_parameters(str(param_file), allow_missing=False)
-        return cls(estimator, pre_vectorizer=vectorizer)
+        return cls(estimator, pre_vectorizer=vectorizer, cache=cache)
 
     def save(self, model_dir: str) -> None:
         """
@@ -100,9 +157,66 @@ class BowVAEInferencer(BaseInferencer):
                 pickle.dump(self.vectorizer, fp)
 
 
+    def export_bundle(self, bundle_file: str) -> None:
+        """
+        Export encoder (and classifier) weights, vocabulary and vectorizer settings to a compact NumPy bundle
+        that can be loaded with :class:`tmnt.runtime.NumpyBowVAEInferencer` without MXNet.
+
+        Parameters:
+            bundle_file: Output file path (`.npz`)
+        """
+        if self.covar_model:
+            raise Exception("Export of covariate models is not supported")
+        cv = self.vectorizer.vectorizer
+        cv_params = cv.get_params()
+        if cv_params['analyzer'] != 'word' or cv_params['preprocessor'] is not None or cv_params['tokenizer'] is not None:
+            raise Exception("Export requires a vectorizer using the default word analyzer")
+        cv_vocab = cv.vocabulary_ if hasattr(cv, 'vocabulary_') else cv.vocabulary
+        vocabulary = [None] * len(cv_vocab)
+        for t, i in cv_vocab.items():
+            vocabulary[i] = t
+        stop_words = cv.get_stop_words()
+        _dense = lambda dense: (dense.weight.data().asnumpy().T, dense.bias.data().asnumpy())
+        arrays = {}
+        arrays['embedding.weight'] = self.model._get_embedding_weight_t().asnumpy()
+        arrays['embedding.bias'] = self.model.embedding.bias.data().asnumpy()
+        encoder_acts = []
+        for layer in self.model.encoder:
+            if isinstance(layer, mx.gluon.nn.Dense):
+                i = len(encoder_acts)
+                arrays['encoder.{}.weight'.format(i)], arrays['encoder.{}.bias'.format(i)] = _dense(layer)
+                encoder_acts.append(self.model.encoder_activation)
+            elif not isinstance(layer, mx.gluon.nn.Dropout):
+                raise Exception("Unsupported encoder layer {} for export".format(layer))
+        dist = self.model.latent_distribution
+        arrays['mu_encoder.weight'], arrays['mu_encoder.bias'] = _dense(dist.mu_encoder)
+        for k in ['gamma', 'beta', 'running_mean', 'running_var']:
+            arrays['mu_bn.' + k] = getattr(dist.mu_bn, k).data().asnumpy()
+        if not dist.mu_bn_scale:
+            arrays['mu_bn.gamma'] = np.ones_like(arrays['mu_bn.gamma'])
+        if self.model.has_classifier:
+            arrays['classifier.weight'], arrays['classifier.bias'] = _dense(self.model.classifier)
+        config = {'n_latent': self.n_latent, 'vocabulary': vocabulary,
+                  'embedding_act': self.model.embedding_activation, 'encoder_acts': encoder_acts,
+                  'mu_bn_eps': dist.mu_bn_epsilon,
+                  'analyzer': {'token_pattern': cv_params['token_pattern'], 'lowercase': cv_params['lowercase'],
+                               'strip_accents': cv_params['strip_accents'], 'ngram_range': list(cv_params['ngram_range']),
+                               'stop_words': sorted(stop_words) if stop_words else None},
+                  'binary': cv_params['binary'], 'label_map': self.vectorizer.label_map,
+                  'multilabel': self.model.multilabel}
+        np.savez_compressed(bundle_file, config=np.array(json.dumps(config)),
+                            **{k: v.astype('float32') for k, v in arrays.items()})
+
+    def _load_vec_file(self, sp_vec_file):
+        ## sparse vector (svmlight) file or binary corpus directory
+        if is_binary_corpus(sp_vec_file):
+            data_mat, labels, _, _, _ = load_binary_corpus(sp_vec_file)
+            return data_mat, labels
+        return load_svmlight_file(sp_vec_file, n_features=len(self.vocab), zero_based=True)
+
     def get_model_details(self, sp_vec_file_or_X, y=None):
         if isinstance(sp_vec_file_or_X, str):
-            data_csr, labels = load_svmlight_file(sp_vec_file, n_features=len(self.vocab))
+            data_csr, labels = self._load_vec_file(sp_vec_file_or_X)
         else:
             data_csr = sp_vec_file_or_X
             labels = y
@@ -152,14 +266,122 @@ class BowVAEInferencer(BaseInferencer):
             json.dump(d, fp, sort_keys=True, indent=4)        
 
     def encode_vec_file(self, sp_vec_file, use_probs=False):
-        data_mat, labels = load_svmlight_file(sp_vec_file, n_features=len(self.vocab), zero_based=True)
+        data_mat, labels = self._load_vec_file(sp_vec_file)
         return self.encode_data(data_mat, labels, use_probs=use_probs), labels
 
     def encode_texts(self, texts, use_probs=True, include_bn=False):
+        if self.cache is not None:
+            encode_fn = lambda txts: [e.copy() for e in self._encode_texts(txts, use_probs, include_bn)]
+            return self._cached_map(texts, encode_fn, 'encode', use_probs, include_bn)
+        return self._encode_texts(texts, use_probs, include_bn)
+
+    def _encode_texts(self, texts, use_probs=True, include_bn=False):
         X, _ = self.vectorizer.transform(texts)
         encodings = self.encode_data(X, None, use_probs=use_probs, include_bn=include_bn)
         return encodings
 
+    def iter_encode_vec_file(self, sp_vec_file, chunk_size=10000, use_probs=False, include_bn=False):
+        """Generator over encodings of a sparse vector (svmlight) file or binary corpus, reading and encoding `chunk_size`
+        documents at a time.
+
+        Parameters:
+            sp_vec_file (str): Path to input file in sparse vector format (or binary corpus directory)
+            chunk_size (int): Number of documents read and encoded at a time
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            include_bn (bool): Apply the latent batch normalization to encodings
+
+        Yields:
+            (tuple): Encodings of shape (n, n_latent) and labels of shape (n,) for each chunk
+        """
+        if is_binary_corpus(sp_vec_file):
+            for encodings, labels in self._iter_encode_corpus_rows(sp_vec_file, 0, None, chunk_size, use_probs, include_bn):
+                yield encodings, labels
+        else:
+            with io.open(sp_vec_file, 'rb') as fp:
+                for encodings, labels in self._iter_encode_vec_lines(fp, chunk_size, use_probs, include_bn):
+                    yield encodings, labels
+
+    def _iter_encode_corpus_rows(self, corpus_dir, start, end, chunk_size, use_probs, include_bn):
+        data_mat, labels, _, _, _ = load_binary_corpus(corpus_dir)
+        end = data_mat.shape[0] if end is None else end
+        for i in range(start, end, chunk_size):
+            j = min(i + chunk_size, end)
+            chunk_labels = np.array(labels[i:j])
+            yield self.encode_array(data_mat[i:j], chunk_labels, use_probs=use_probs, include_bn=include_bn), chunk_labels
+
+    def _iter_encode_vec_lines(self, lines, chunk_size, use_probs, include_bn):
+        lines = iter(lines)
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if len(chunk) == 0:
+                break
+            data_mat, labels = load_svmlight_file(io.BytesIO(b''.join(chunk)), n_features=len(self.vocab), zero_based=True)
+            yield self.encode_array(data_mat, labels, use_probs=use_probs, include_bn=include_bn), labels
+
+    def iter_encode_texts(self, texts, chunk_size=10000, use_probs=True, include_bn=False):
+        """Generator over encodings of an iterable of texts, vectorizing and encoding `chunk_size` texts at a time.
+
+        Parameters:
+            texts (iterable): Document strings (may be a generator)
+            chunk_size (int): Number of texts vectorized and encoded at a time
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            include_bn (bool): Apply the latent batch normalization to encodings
+
+        Yields:
+            (:class:`numpy.ndarray`): Encodings of shape (n, n_latent) for each chunk
+        """
+        texts = iter(texts)
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if len(chunk) == 0:
+                break
+            X, _ = self.vectorizer.transform(chunk)
+            yield self.encode_array(X, None, use_probs=use_probs, include_bn=include_bn)
+
+    def iter_encode_json_file(self, json_file, chunk_size=10000, use_probs=True, include_bn=False):
+        """Generator over encodings of a JSON list file (one document per line, text under the vectorizer's
+        text key), reading and encoding `chunk_size` documents at a time.
+
+        Parameters:
+            json_file (str): Path to input file with one JSON document per line
+            chunk_size (int): Number of documents read and encoded at a time
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            include_bn (bool): Apply the latent batch normalization to encodings
+
+        Yields:
+            (:class:`numpy.ndarray`): Encodings of shape (n, n_latent) for each chunk
+        """
+        with io.open(json_file, 'r', encoding=self.vectorizer.encoding) as fp:
+            texts = (json.loads(l)[self.vectorizer.text_key] for l in fp)
+            for encodings in self.iter_encode_texts(texts, chunk_size, use_probs=use_probs, include_bn=include_bn):
+                yield encodings
+
+    def write_encodings(self, encodings_iter, out_file, n_docs):
+        """Write a stream of encoding chunks to a memory-mapped `.npy` file of shape (n_docs, n_latent).
+
+        Parameters:
+            encodings_iter (iterable): Encoding chunks, e.g. from :meth:`iter_encode_vec_file` (the first element
+                of each tuple is used when chunks are tuples)
+            out_file (str): Output `.npy` file path
+            n_docs (int): Total number of documents (e.g. the number of lines of the input file)
+
+        Returns:
+            (:class:`numpy.memmap`): Memory-mapped encodings
+        """
+        out = np.lib.format.open_memmap(out_file, mode='w+', dtype='float32', shape=(n_docs, self.n_latent))
+        start = 0
+        for encodings in encodings_iter:
+            if isinstance(encodings, tuple):
+                encodings = encodings[0]
+            if start + encodings.shape[0] > n_docs:
+                raise Exception("More than {} encodings provided to write_encodings".format(n_docs))
+            out[start:start + encodings.shape[0]] = encodings
+            start += encodings.shape[0]
+        if start != n_docs:
+            raise Exception("Expected {} encodings but {} were provided to write_encodings".format(n_docs, start))
+        out.flush()
+        return out
+
     def _get_data_iterator(self, data_mat, labels):
         x_size = data_mat.shape[0] * data_mat.shape[1]
         if x_size <= MAX_DESIGN_MATRIX and isinstance(data_mat, scipy.sparse.csr.csr_matrix):
@@ -185,63 +407,115 @@ class BowVAEInferencer(BaseInferencer):
                                                       batch_size, last_batch_handle='discard', shuffle=False))
         return infer_iter, last_batch_size
 
-    def encode_data(self, data_mat, labels=None, use_probs=True, include_bn=False, target_entropy=1.0):
-        infer_iter, last_batch_size = self._get_data_iterator(data_mat, labels)
-        encodings = []
-        for _, (data,labels) in enumerate(infer_iter):
-            data = data.as_in_context(self.ctx)
-            if self.covar_model and labels is not None:
-                labels = labels.as_in_context(self.ctx)
-                encs = self.model.encode_data_with_covariates(data, labels, include_bn=include_bn)
+    def _get_encode_batch_size(self, n_docs, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        if batch_size is None:
+            ## auto-size batches so that a dense batch of inputs stays within a fixed budget
+            batch_size = max(self.max_batch_size, ENCODE_BATCH_ELEMENTS // self.model.vocab_size)
+        return max(1, min(n_docs, batch_size))
+
+    def _get_encode_batch(self, data_mat, labels, start, end):
+        if isinstance(data_mat, mx.nd.NDArray):
+            data = data_mat[start:end]
+            if data.dtype != np.float32:
+                data = data.astype('float32')
+        elif scipy.sparse.issparse(data_mat):
+            data = mx.nd.sparse.csr_matrix(data_mat[start:end], dtype='float32')
+        else:
+            data = mx.nd.array(data_mat[start:end], dtype='float32')
+        covars = None
+        if self.covar_model and labels is not None:
+            covars = mx.nd.array(labels[start:end])
+            covars = mx.nd.one_hot(covars, self.n_covars) if self.n_covars > 0 else covars.reshape((-1, 1))
+            covars = covars.as_in_context(self.ctx)
+        return data.as_in_context(self.ctx), covars
+
+    def encode_array(self, data_mat, labels=None, use_probs=True, include_bn=False, target_entropy=1.0,
+                     batch_size=None, out=None):
+        """Encode documents into a contiguous (n_docs, n_latent) float32 array filled in place, batch by batch.
+
+        Parameters:
+            data_mat (array-like or sparse matrix): Document-term matrix (scipy sparse, numpy or MXNet NDArray)
+            labels (array-like): Covariate values for each document (covariate models only)
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            include_bn (bool): Apply the latent batch normalization to encodings
+            target_entropy (float): Target entropy for recalibrated topic probabilities
+            batch_size (int): Number of documents per batch (default None uses the inferencer batch size or auto-sizes)
+            out (:class:`numpy.ndarray`): Optional preallocated output array (e.g. memory-mapped) of shape (n_docs, n_latent)
+
+        Returns:
+            (:class:`numpy.ndarray`): Encodings of shape (n_docs, n_latent)
+        """
+        if scipy.sparse.issparse(data_mat) and not isinstance(data_mat, scipy.sparse.csr_matrix):
+            data_mat = data_mat.tocsr()
+        n_docs = data_mat.shape[0]
+        if out is None:
+            out = np.empty((n_docs, self.n_latent), dtype='float32')
+        batch_size = self._get_encode_batch_size(n_docs, batch_size)
+        for start in range(0, n_docs, batch_size):
+            end = min(start + batch_size, n_docs)
+            data, covars = self._get_encode_batch(data_mat, labels, start, end)
+            if covars is not None:
+                encs = self.model.encode_data_with_covariates(data, covars, include_bn=include_bn)
             else:
                 encs = self.model.encode_data(data, include_bn=include_bn)
             if use_probs:
                 e1 = (encs - mx.nd.min(encs, axis=1).expand_dims(1)).astype('float64')
-                encs = list(mx.nd.softmax(e1).asnumpy())
-                encs = list(map(partial(recalibrate_scores, target_entropy=target_entropy), encs))
+                out[start:end] = recalibrate_scores_batch(mx.nd.softmax(e1).asnumpy(), target_entropy=target_entropy)
             else:
-                encs = list(encs.astype('float64').asnumpy())
-            encodings.extend(encs)
-        ## handle the last batch explicitly as NDArrayIter doesn't do that for us
-        if last_batch_size > 0:
-            last_data = mx.nd.sparse.csr_matrix(data_mat[-last_batch_size:], dtype='float32')
-            data = last_data.as_in_context(self.ctx)
-            if self.covar_model and labels is not None:
-                labels = mx.nd.one_hot(mx.nd.array(labels[-last_batch_size:], dtype='int'),
-                                       self.n_covars).as_in_context(self.ctx)
-                encs = self.model.encode_data_with_covariates(data, labels)
-            else:
-                encs = self.model.encode_data(data)
-            if use_probs:
-                e1 = (encs - mx.nd.min(encs, axis=1).expand_dims(1)).astype('float64')
-                encs = list(mx.nd.softmax(e1).asnumpy())
-                encs = list(map(partial(recalibrate_scores, target_entropy=target_entropy), encs))
-            else:
-                encs = list(encs.astype('float64').asnumpy())
-            encodings.extend(encs)
-        return encodings
+                out[start:end] = encs.asnumpy()
+        return out
 
-    def get_likelihood_stats(self, data_mat, n_samples=50):
+    def encode_data(self, data_mat, labels=None, use_probs=True, include_bn=False, target_entropy=1.0):
+        return list(self.encode_array(data_mat, labels, use_probs=use_probs, include_bn=include_bn,
+                                      target_entropy=target_entropy))
+
+    def get_likelihood_scores(self, data_mat, labels=None, n_samples=50, batch_size=None):
+        """Mean and variance of Monte Carlo estimates of the (length-normalized) loss, or negative ELBO, for each
+        document, e.g. for out-of-distribution detection. Each batch is encoded once and all latent samples are
+        decoded together.
+
+        Parameters:
+            data_mat (array-like or sparse matrix): Document-term matrix (scipy sparse, numpy or MXNet NDArray)
+            labels (array-like): Covariate values for each document (covariate models only)
+            n_samples (int): Number of latent samples per document
+            batch_size (int): Number of documents per batch (default None auto-sizes batches so that the decoded
+                samples of a batch stay within a fixed budget)
+
+        Returns:
+            (tuple): Arrays of loss means and variances, each of shape (n_docs,)
+        """
         ## Notes:
         ## Following ideas in the paper:
         ## Bayesian Autoencoders: Analysing and Fixing the Bernoulli likelihood for Out-of-Distribution Detection
-        data_iter, last_batch_size = self._get_data_iterator(data_mat, None)
-        all_stats = []
-        for _, (data, labels) in enumerate(data_iter):
-            elbos = []
-            for s in range(0,n_samples):
-                elbo, _,_,_,_,_,_ = self.model(data.as_in_context(self.ctx), labels)
-                elbos.append(list(elbo.asnumpy()))
-            wd_cnts = data.sum(axis=1).asnumpy()
-            elbos_np = np.array(elbos) / (wd_cnts + 1)
-            elbos_means = list(elbos_np.mean(axis=0))
-            elbos_var   = list(elbos_np.var(axis=0))
-            all_stats.extend(list(zip(elbos_means, elbos_var)))
-        return all_stats
+        if self.covar_model and labels is None:
+            raise Exception("Covariate values are required to compute likelihood scores with a covariate model")
+        if scipy.sparse.issparse(data_mat) and not isinstance(data_mat, scipy.sparse.csr_matrix):
+            data_mat = data_mat.tocsr()
+        n_docs = data_mat.shape[0]
+        means = np.empty(n_docs, dtype='float32')
+        variances = np.empty(n_docs, dtype='float32')
+        batch_size = batch_size or self.batch_size or ENCODE_BATCH_ELEMENTS // (n_samples * self.model.vocab_size)
+        batch_size = max(1, min(n_docs, batch_size))
+        for start in range(0, n_docs, batch_size):
+            end = min(start + batch_size, n_docs)
+            data, covars = self._get_encode_batch(data_mat, labels, start, end)
+            if covars is not None:
+                elbos = self.model.get_elbo_samples(data, n_samples, covars)
+            else:
+                elbos = self.model.get_elbo_samples(data, n_samples)
+            elbos_np = elbos.asnumpy() / (data.sum(axis=1).asnumpy() + 1)
+            means[start:end] = elbos_np.mean(axis=0)
+            variances[start:end] = elbos_np.var(axis=0)
+        return means, variances
+
+    def get_likelihood_stats(self, data_mat, n_samples=50):
+        means, variances = self.get_likelihood_scores(data_mat, n_samples=n_samples)
+        return list(zip(means, variances))
 
 
     def get_top_k_words_per_topic(self, k):
-        sorted_ids = self.model.get_ordered_terms()
+        sorted_ids = self.model.get_ordered_terms(k)
         topic_terms = []
         for t in range(self.n_latent):
             top_k = [ self.vocab.idx_to_token[int(i)] for i in list(sorted_ids[:k, t]) ]
@@ -249,7 +523,7 @@ class BowVAEInferencer(BaseInferencer):
         return topic_terms
 
     def get_top_k_words_per_topic_encoder(self, k, dataloader, sample_size=-1):
-        sorted_ids = self.model.get_ordered_terms_encoder(dataloader, sample_size=sample_size)
+        sorted_ids = self.model.get_ordered_terms_encoder(dataloader, sample_size=sample_size, k=k)
         topic_terms = []
         for t in range(self.n_latent):
             top_k = [ self.vocab.idx_to_token[int(i)] for i in list(sorted_ids[:k, t]) ]
@@ -257,6 +531,42 @@ class BowVAEInferencer(BaseInferencer):
         return topic_terms
 
 
+    def iter_top_term_attributions(self, data_mat, m=10, present_only=True, batch_size=None):
+        """Generator over the top `m` encoder-attributed terms for each document and topic.
+
+        Parameters:
+            data_mat (:class:`scipy.sparse.csr_matrix`): Document-term matrix
+            m (int): Number of terms to keep for each document and topic
+            present_only (bool): Only attribute to terms that occur in the document
+            batch_size (int): Documents per batch (default None uses the inferencer's batch size or, if unset,
+                sizes batches to a fixed budget of vocabulary-sized rows as for encoding)
+
+        Yields:
+            (tuple): For each batch, arrays `(doc_ids, topic_ids, term_ids, scores)`
+        """
+        data_mat = scipy.sparse.csr_matrix(data_mat, dtype='float32')
+        batch_size = self._get_encode_batch_size(data_mat.shape[0], batch_size)
+        dataloader = DataIterLoader(SparseMatrixDataIter(data_mat, None, batch_size=batch_size, last_batch_handle='pad',
+                                                         shuffle=False))
+        return self.model.get_top_attributions(dataloader, m=m, sample_size=data_mat.shape[0], present_only=present_only)
+
+    def write_top_term_attributions(self, data_mat, out_file, m=10, present_only=True, batch_size=None):
+        """Stream the top `m` encoder-attributed terms for each document and topic to a tab-separated file
+        with columns: document index, topic, term, score.
+
+        Parameters:
+            data_mat (:class:`scipy.sparse.csr_matrix`): Document-term matrix
+            out_file (str): Output file path
+            m (int): Number of terms to keep for each document and topic
+            present_only (bool): Only attribute to terms that occur in the document
+            batch_size (int): Documents per batch (see :meth:`iter_top_term_attributions`)
+        """
+        with io.open(out_file, 'w') as fp:
+            for doc_ids, topic_ids, term_ids, scores in self.iter_top_term_attributions(data_mat, m, present_only,
+                                                                                        batch_size):
+                for d, t, w, s in zip(doc_ids, topic_ids, term_ids, scores):
+                    fp.write('{}\t{}\t{}\t{}\n'.format(d, t, self.vocab.idx_to_token[w], s))
+
     def get_top_k_words_per_topic_per_covariate(self, k):
         n_topics = self.n_latent
         w = self.model.cov_decoder.cov_inter_decoder.collect_params().get('weight').data()
@@ -275,11 +585,53 @@ class BowVAEInferencer(BaseInferencer):
     def get_top_k_words_per_topic_over_scalar_covariate(self, k, min_v=0.0, max_v=1.0, step=0.1):
         raise NotImplemented
 
+    def predict_scores(self, texts, use_probs=True, target_entropy=1.0, batch_size=None):
+        """Class scores and topic encodings for a batch of texts, computed from a single encoder pass per batch.
+
+        Parameters:
+            texts (list): Document strings
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            target_entropy (float): Target entropy for recalibrated topic probabilities
+            batch_size (int): Number of documents per batch (default None uses the inferencer batch size or auto-sizes)
+
+        Returns:
+            (tuple): Unnormalized class scores of shape (n_docs, n_labels) and encodings of shape (n_docs, n_latent)
+        """
+        X, _ = self.vectorizer.transform(texts)
+        n_docs = X.shape[0]
+        scores = np.empty((n_docs, self.model.n_labels), dtype='float32')
+        encodings = np.empty((n_docs, self.n_latent), dtype='float32')
+        batch_size = self._get_encode_batch_size(n_docs, batch_size)
+        for start in range(0, n_docs, batch_size):
+            end = min(start + batch_size, n_docs)
+            data, _ = self._get_encode_batch(X, None, start, end)
+            preds, encs = self.model.predict_with_encoding(data)
+            scores[start:end] = preds.asnumpy()
+            if use_probs:
+                e1 = (encs - mx.nd.min(encs, axis=1).expand_dims(1)).astype('float64')
+                encodings[start:end] = recalibrate_scores_batch(mx.nd.softmax(e1).asnumpy(), target_entropy=target_entropy)
+            else:
+                encodings[start:end] = encs.asnumpy()
+        return scores, encodings
+
     def predict_text(self, txt, pred_threshold=0.5):
-        X_csr, _      = self.vectorizer.transform(txt)
-        X = mx.nd.sparse.csr_matrix(X_csr, dtype='float32')
-        encodings = self.encode_data(X, None, use_probs=True, include_bn=False)
-        preds     = self.model.predict(X).asnumpy()
+        """Predicted label(s) and topic probabilities for a batch of texts
+
+        Parameters:
+            txt (list): Document strings
+            pred_threshold (float): Score threshold for multilabel predictions
+
+        Returns:
+            (tuple): Predicted label (or list of labels for multilabel models) for each text and list of encodings
+        """
+        if self.cache is not None:
+            predict_fn = lambda txts: [(l, e.copy()) for l, e in zip(*self._predict_text(txts, pred_threshold))]
+            results = self._cached_map(txt, predict_fn, 'predict', pred_threshold)
+            return [l for l, _ in results], [e for _, e in results]
+        return self._predict_text(txt, pred_threshold)
+
+    def _predict_text(self, txt, pred_threshold):
+        preds, encodings = self.predict_scores(txt)
         inv_map = [0] * len(self.vectorizer.label_map)
         for k in self.vectorizer.label_map:
             inv_map[self.vectorizer.label_map[k]] = k
@@ -287,26 +639,172 @@ class BowVAEInferencer(BaseInferencer):
             bests = np.argmax(preds, axis=1)
             best_strs = [ inv_map[best] for best in bests ]
         else:
-            best_strs = [ inv_map[i] for i in list(np.where(preds > pred_threshold)[0]) ]
-        return best_strs, encodings
+            best_strs = [ [ inv_map[i] for i in np.where(p > pred_threshold)[0] ] for p in preds ]
+        return best_strs, list(encodings)
     
 
 
+def _get_shard_offsets(path, n_shards):
+    """Split a file into (at most) `n_shards` byte ranges, each starting and ending on a line boundary"""
+    size = os.path.getsize(path)
+    offsets = [0]
+    with io.open(path, 'rb') as fp:
+        for i in range(1, n_shards):
+            pos = max(size * i // n_shards, offsets[-1])
+            if pos > 0:
+                fp.seek(pos - 1)
+                fp.readline() ## move to the start of the next line
+                pos = fp.tell()
+            if pos > offsets[-1] and pos < size:
+                offsets.append(pos)
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def _iter_byte_range_lines(path, start, end):
+    with io.open(path, 'rb') as fp:
+        fp.seek(start)
+        pos = start
+        while pos < end:
+            line = fp.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+
+_worker_inferencer = None
+
+def _init_encode_worker(model_dir):
+    global _worker_inferencer
+    _worker_inferencer = BowVAEInferencer.from_saved(model_dir=model_dir)
+
+
+def _encode_shard(args):
+    shard_file, in_file, start, end, file_format, chunk_size, use_probs, include_bn = args
+    inferencer = _worker_inferencer
+    labels = None
+    if is_binary_corpus(in_file):
+        chunks = list(inferencer._iter_encode_corpus_rows(in_file, start, end, chunk_size, use_probs, include_bn))
+        encodings = [encs for encs, _ in chunks]
+        labels = np.concatenate([lbls for _, lbls in chunks]) if len(chunks) > 0 else np.zeros(0)
+    elif file_format == 'vec':
+        lines = _iter_byte_range_lines(in_file, start, end)
+        chunks = list(inferencer._iter_encode_vec_lines(lines, chunk_size, use_probs, include_bn))
+        encodings = [encs for encs, _ in chunks]
+        labels = np.concatenate([lbls for _, lbls in chunks]) if len(chunks) > 0 else np.zeros(0)
+    else:
+        lines = _iter_byte_range_lines(in_file, start, end)
+        texts = (json.loads(l)[inferencer.vectorizer.text_key] for l in lines)
+        encodings = list(inferencer.iter_encode_texts(texts, chunk_size, use_probs=use_probs, include_bn=include_bn))
+    encodings = np.concatenate(encodings) if len(encodings) > 0 else np.zeros((0, inferencer.n_latent), dtype='float32')
+    np.save(shard_file, encodings)
+    return shard_file, encodings.shape[0], labels
+
+
+def encode_file_parallel(model_dir, in_file, out_file=None, file_format='vec', n_workers=None, n_shards=None,
+                         chunk_size=10000, use_probs=False, include_bn=False, threads_per_worker=1):
+    """Encode a corpus file with multiple worker processes.
+
+    The input is split into byte-range shards on line boundaries (or row ranges for a binary corpus directory,
+    see :func:`tmnt.data_loading.write_binary_corpus`); each worker process loads the saved model
+    once and encodes whole shards, writing its encodings to a temporary file. Shard encodings are merged in
+    input order into a single array (or memory-mapped `.npy` file).
+
+    Parameters:
+        model_dir (str): Directory with saved model files
+        in_file (str): Input corpus in sparse vector (svmlight) format, JSON list format (one document per line)
+            or a binary corpus directory
+        out_file (str): Optional `.npy` output path; encodings are returned in memory when not provided
+        file_format (str): Input format, 'vec' or 'json'
+        n_workers (int): Number of worker processes (default is the number of CPUs)
+        n_shards (int): Number of shards (default is four per worker)
+        chunk_size (int): Number of documents encoded at a time within a worker
+        use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+        include_bn (bool): Apply the latent batch normalization to encodings
+        threads_per_worker (int): Number of compute threads for each worker process
+
+    Returns:
+        (tuple): Encodings of shape (n_docs, n_latent) and labels (for 'vec' inputs, otherwise None)
+    """
+    if file_format not in ('vec', 'json'):
+        raise Exception("Unsupported file format {}, expected 'vec' or 'json'".format(file_format))
+    n_workers = n_workers or multiprocessing.cpu_count()
+    n_shards = n_shards or 4 * n_workers
+    if is_binary_corpus(in_file):
+        if file_format != 'vec':
+            raise Exception("Binary corpus {} requires file_format 'vec'".format(in_file))
+        n_rows = load_binary_corpus(in_file)[0].shape[0]
+        bounds = np.unique(np.linspace(0, n_rows, n_shards + 1).astype('int64'))
+        shards = list(zip(bounds[:-1], bounds[1:]))
+    else:
+        shards = _get_shard_offsets(in_file, n_shards)
+    with tempfile.TemporaryDirectory() as work_dir:
+        tasks = [(os.path.join(work_dir, 'shard_{}.npy'.format(i)), in_file, start, end, file_format, chunk_size,
+                  use_probs, include_bn) for i, (start, end) in enumerate(shards)]
+        ## worker processes are spawned (MXNet is not fork-safe) and inherit the environment at start-up
+        thread_vars = {'OMP_NUM_THREADS': str(threads_per_worker), 'MXNET_CPU_WORKER_NTHREADS': str(threads_per_worker)}
+        saved_env = {k: os.environ.get(k) for k in thread_vars}
+        os.environ.update(thread_vars)
+        try:
+            pool = multiprocessing.get_context('spawn').Pool(min(n_workers, len(tasks)), initializer=_init_encode_worker,
+                                                             initargs=(model_dir,))
+        finally:
+            for k, v in saved_env.items():
+                if v is None:
+                    os.environ.pop(k)
+                else:
+                    os.environ[k] = v
+        with pool:
+            results = pool.map(_encode_shard, tasks, chunksize=1)
+        n_docs = sum(n for _, n, _ in results)
+        n_latent = np.load(results[0][0], mmap_mode='r').shape[1]
+        if out_file is not None:
+            out = np.lib.format.open_memmap(out_file, mode='w+', dtype='float32', shape=(n_docs, n_latent))
+        else:
+            out = np.empty((n_docs, n_latent), dtype='float32')
+        start = 0
+        for shard_file, n, _ in results:
+            out[start:start + n] = np.load(shard_file)
+            start += n
+            os.remove(shard_file)
+    if out_file is not None:
+        out.flush()
+    labels = np.concatenate([lbls for _, _, lbls in results]) if file_format == 'vec' else None
+    return out, labels
+
+
+_worker_transform = None
+
+def _init_tokenize_worker(transform):
+    global _worker_transform
+    _worker_transform = transform
+
+
+def _tokenize_text(txt):
+    return _worker_transform((txt,))
+
+
 class SeqVEDInferencer(BaseInferencer):
     """Inferencer for sequence variational encoder-decoder models using BERT
     """
-    def __init__(self, model, bert_vocab, max_length, bow_vocab=None, pre_vectorizer=None, ctx=mx.cpu()):
-        super().__init__(ctx)
+    def __init__(self, model, bert_vocab, max_length, bow_vocab=None, pre_vectorizer=None, ctx=mx.cpu(), cache=None):
+        super().__init__(ctx, cache)
         self.model     = model
         self.bert_base = model.bert
         self.tokenizer = BERTTokenizer(bert_vocab)
         self.transform = BERTSentenceTransform(self.tokenizer, max_length, pair=False)
         self.bow_vocab = bow_vocab
         self.vectorizer = pre_vectorizer or TMNTVectorizer(initial_vocabulary=bow_vocab)
+        self._tokenize_pool = None
+        self._tokenize_pool_size = 0
+        self._tokenize_pool_finalizer = None
+        self._bind_cache(self.model)
 
 
     @classmethod
-    def from_saved(cls, param_file=None, config_file=None, vocab_file=None, model_dir=None, max_length=128, ctx=mx.cpu()):
+    def from_saved(cls, param_file=None, config_file=None, vocab_file=None, model_dir=None, max_length=128, ctx=mx.cpu(),
+                   cache=None):
         if model_dir is not None:
             param_file = os.path.join(model_dir, 'model.params')
             vocab_file = os.path.join(model_dir, 'vocab.json')
@@ -322,10 +820,9 @@ class SeqVEDInferencer(BaseInferencer):
         else:
             vectorizer = None
         bow_vocab = nlp.Vocab.from_json(voc_js)
-        bert_base, vocab = nlp.model.get_model(config['bert_model_name'],  
-                                               dataset_name=config['bert_data_name'],
-                                               pretrained=True, ctx=ctx, use_pooler=True,
-                                               use_decoder=False, use_classifier=False)
+        ## BERT parameters are loaded from the saved model, so only the (uninitialized) network is constructed
+        vocab = load_bert_vocab(config['bert_data_name'], model_dir)
+        bert_base = get_bert_model(config['bert_model_name'], vocab, config.get('bert_hparams'), ctx=ctx)
         latent_dist_t = config['latent_distribution']['dist_type']       
         n_latent    = config['n_latent']
         kappa       = config['latent_distribution']['kappa']
@@ -335,9 +832,9 @@ class SeqVEDInferencer(BaseInferencer):
         latent_dist = HyperSphericalDistribution(n_latent, kappa=kappa, ctx=ctx)
         model = SeqBowVED(bert_base, latent_dist=latent_dist, bow_vocab_size = len(bow_vocab), num_classes=num_classes,
                           dropout=classifier_dropout)
-        model.load_parameters(str(param_file), allow_missing=False, ignore_extra=True)
+        model.load_parameters(str(param_file), ctx=ctx, allow_missing=False, ignore_extra=True)
         model.latent_dist.post_init(ctx) # need to call this after loading parameters now
-        return cls(model, vocab, max_length, bow_vocab, pre_vectorizer=vectorizer, ctx=ctx)
+        return cls(model, vocab, max_length, bow_vocab, pre_vectorizer=vectorizer, ctx=ctx, cache=cache)
 
 
     def _embed_sequence(self, ids, segs):
@@ -362,7 +859,12 @@ class SeqVEDInferencer(BaseInferencer):
                  mx.nd.array([segs], dtype='int32') )
     
 
-    def encode_text(self, txt):                   
+    def encode_text(self, txt):
+        if self.cache is not None:
+            return self._cached_map([txt], lambda txts: [self._encode_text(txts[0])], 'encode')[0]
+        return self._encode_text(txt)
+
+    def _encode_text(self, txt):
         tokens, ids, lens, segs = self.prep_text(txt)
         _, enc = self.model.bert(ids.as_in_context(self.ctx),
                                               segs.as_in_context(self.ctx), lens.as_in_context(self.ctx))
@@ -373,15 +875,84 @@ class SeqVEDInferencer(BaseInferencer):
         encoding, _ = self.encode_text(txt)
         return self.model.classifier(encoding)
 
+    def encode_texts(self, texts, use_probs=True, batch_size=32, n_workers=1):
+        """Encode a batch of texts. Texts are tokenized (optionally in parallel) and sorted by length; buckets are
+        consecutive fixed-size slices (of `batch_size` texts) of this length-sorted order, each padded only to its
+        longest sequence, so that BERT is run once per bucket with little padding. Encodings are returned in the
+        original order.
+
+        Parameters:
+            texts (list): Document strings
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            batch_size (int): Number of texts per BERT batch (bucket)
+            n_workers (int): Number of processes used for tokenization; the worker pool is created on first use
+                and kept until :meth:`close` is called (on leaving a ``with`` block, or when the inferencer is
+                garbage collected)
+
+        Returns:
+            (list): Encodings for each text
+        """
+        if self.cache is not None:
+            encode_fn = lambda txts: [e.copy() for e in self._encode_texts(txts, use_probs, batch_size, n_workers)]
+            return self._cached_map(texts, encode_fn, 'encode_texts', use_probs)
+        return self._encode_texts(texts, use_probs, batch_size, n_workers)
+
+    def _get_tokenize_pool(self, n_workers):
+        ## workers are spawned (MXNet is not fork-safe) and receive the transform once, at start-up
+        if self._tokenize_pool is None or self._tokenize_pool_size != n_workers:
+            self.close()
+            self._tokenize_pool = multiprocessing.get_context('spawn').Pool(n_workers, initializer=_init_tokenize_worker,
+                                                                            initargs=(self.transform,))
+            self._tokenize_pool_size = n_workers
+            ## workers are terminated if the inferencer is garbage collected (or at exit) without being closed
+            self._tokenize_pool_finalizer = weakref.finalize(self, self._tokenize_pool.terminate)
+        return self._tokenize_pool
+
+    def close(self):
+        """Shut down the tokenization worker pool (if any)"""
+        if self._tokenize_pool is not None:
+            self._tokenize_pool_finalizer.detach()
+            self._tokenize_pool.close()
+            self._tokenize_pool.join()
+            self._tokenize_pool = None
+            self._tokenize_pool_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _encode_texts(self, texts, use_probs, batch_size, n_workers):
+        if n_workers > 1 and len(texts) > 1:
+            pool = self._get_tokenize_pool(n_workers)
+            seqs = pool.map(_tokenize_text, texts, chunksize=max(1, len(texts) // (4 * n_workers)))
+        else:
+            seqs = [self.transform((txt,)) for txt in texts]
+        lens = np.array([int(l) for _, l, _ in seqs], dtype='int64')
+        order = np.argsort(lens, kind='stable')
+        encodings = np.empty((len(texts), self.model.n_latent), dtype='float32')
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            max_len = lens[batch].max()
+            ids = mx.nd.array(np.stack([seqs[i][0][:max_len] for i in batch]), dtype='int32', ctx=self.ctx)
+            segs = mx.nd.array(np.stack([seqs[i][2][:max_len] for i in batch]), dtype='int32', ctx=self.ctx)
+            _, enc = self.model.bert(ids, segs, mx.nd.array(lens[batch], dtype='float32', ctx=self.ctx))
+            encs = self.model.latent_dist.get_mu_encoding(enc)
+            if use_probs:
+                e1 = (encs - mx.nd.min(encs, axis=1).expand_dims(1)).astype('float64')
+                encodings[batch] = recalibrate_scores_batch(mx.nd.softmax(e1).asnumpy())
+            else:
+                encodings[batch] = encs.asnumpy()
+        return list(encodings)
+
     def get_likelihood_stats(self, txt, n_samples=50):
-        tokens, ids, lens, segs = self.prep_text(txt)
-        bow_vector = mx.nd.array(self.vectorizer.vectorizer.transform([txt]), dtype='float32').expand_dims(0)
-        elbos = []
-        for s in range(n_samples):
-            elbo, _, _, _, _ = self.model(ids, segs, lens, bow_vector)
-            elbos.append(list(elbo.asnumpy()))
+        _, ids, lens, segs = self.prep_text(txt)
+        bow_vector = mx.nd.array(self.vectorizer.vectorizer.transform([txt]).toarray(), dtype='float32', ctx=self.ctx)
+        elbos = self.model.get_elbo_samples(ids.as_in_context(self.ctx), segs.as_in_context(self.ctx),
+                                            lens.as_in_context(self.ctx), bow_vector, n_samples)
         wd_cnts = bow_vector.sum().asnumpy()
-        elbos_np = np.array(elbos) / (wd_cnts + 1)
+        elbos_np = elbos.asnumpy() / (wd_cnts + 1)
         elbos_means = list(elbos_np.mean(axis=0))
         elbos_var   = list(elbos_np.var(axis=0))
         return elbos_means, elbos_var
@@ -396,8 +967,7 @@ class SeqVEDInferencer(BaseInferencer):
             encs = self.model.latent_dist.get_mu_encoding(encs)
             if use_probs:
                 e1 = (encs - mx.nd.min(encs, axis=1).expand_dims(1)).astype('float64')
-                encs = list(mx.nd.softmax(e1).asnumpy())
-                topic_encodings = map(recalibrate, encs)
+                topic_encodings = list(recalibrate_scores_batch(mx.nd.softmax(e1).asnumpy()))
             else:
                 topic_encodings = list(encs.astype('float64').asnumpy())
             encodings.extend(topic_encodings)
@@ -432,10 +1002,9 @@ class MetricSeqVEDInferencer(SeqVEDInferencer):
         with open(vocab_file) as f:
             voc_js = f.read()
         bow_vocab = nlp.Vocab.from_json(voc_js)
-        bert_base, vocab = nlp.model.get_model(config['bert_model_name'],  
-                                               dataset_name=config['bert_data_name'],
-                                               pretrained=True, ctx=ctx, use_pooler=True,
-                                               use_decoder=False, use_classifier=False) #, output_attention=True)
+        ## BERT parameters are loaded from the saved model, so only the (uninitialized) network is constructed
+        vocab = load_bert_vocab(config['bert_data_name'], model_dir)
+        bert_base = get_bert_model(config['bert_model_name'], vocab, config.get('bert_hparams'), ctx=ctx)
         latent_dist_t = config['latent_distribution']['dist_type']       
         n_latent    = config['n_latent']
         kappa       = config['latent_distribution']['kappa']
@@ -445,7 +1014,7 @@ class MetricSeqVEDInferencer(SeqVEDInferencer):
         latent_dist = HyperSphericalDistribution(n_latent, kappa=kappa, ctx=ctx)
         model = MetricSeqBowVED(bert_base, latent_dist=latent_dist, bow_vocab_size = len(bow_vocab), n_latent=n_latent,
                                 dropout=classifier_dropout)
-        model.load_parameters(str(param_file), allow_missing=False, ignore_extra=True)
+        model.load_parameters(str(param_file), ctx=ctx, allow_missing=False, ignore_extra=True)
         return cls(model, vocab, max_length, bow_vocab, ctx)
 
 
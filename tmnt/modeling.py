@@ -19,6 +19,111 @@ from tmnt.distribution import GaussianDistribution
 from tmnt.distribution import HyperSphericalDistribution
 from tmnt.distribution import GaussianUnitVarDistribution
 from mxnet.gluon.loss import Loss, KLDivLoss
+from tmnt.utils.cache import EncodingCache
+
+
+COVAR_CACHE_ENTRIES = 64 ## covariate-conditioned Jacobians retained per model (each is vocab_size x n_latent)
+PROPOSAL_POWER = 0.75 ## sampled-softmax negatives are drawn with probability proportional to term frequency ** 0.75
+
+
+def get_decoder_jacobian(decoder, n_latent, n_outputs, ctx=mx.cpu(), batch_size=1024):
+    """
+    Jacobian of decoder outputs with respect to a latent input of all ones. For a linear
+    decoder this is simply the decoder weight matrix; otherwise, Jacobian rows are computed
+    in batches using a batch of one-hot output cotangents for each backward pass.
+
+    Parameters:
+        decoder (:class:`mxnet.gluon.Block`): Decoder mapping latent codes to vocabulary scores
+        n_latent (int): Dimensionality of the latent space
+        n_outputs (int): Number of decoder outputs (i.e. vocabulary size)
+        ctx (:class:`mxnet.context.Context`): MXNet context
+        batch_size (int): Number of Jacobian rows computed per backward pass (non-linear decoders only)
+
+    Returns:
+        (:class:`numpy.ndarray`): Jacobian of shape (n_outputs, n_latent)
+    """
+    if isinstance(decoder, nn.Dense) and decoder.act is None:
+        return decoder.weight.data().asnumpy()
+    z = mx.nd.ones(shape=(1, n_latent), ctx=ctx)
+    return get_summed_jacobian(lambda z_t, _: decoder(z_t), z, n_outputs, batch_size=batch_size)
+
+
+def get_summed_jacobian(fn, z, n_outputs, aux=None, batch_size=None, max_elements=1 << 24):
+    """
+    Jacobian of the outputs of `fn` with respect to its inputs, summed over the rows of `z`. Rows of `z`
+    are tiled once for each output in a batch of outputs so that a single backward pass with one-hot
+    cotangents provides gradients for the whole batch of outputs.
+
+    Parameters:
+        fn (function): Function taking a batch of inputs and the corresponding rows of `aux` to outputs of shape (batch, n_outputs)
+        z (:class:`mxnet.ndarray.NDArray`): Inputs of shape (N, n_inputs)
+        n_outputs (int): Number of outputs of `fn`
+        aux (:class:`mxnet.ndarray.NDArray`): Additional (constant) inputs with N rows passed to `fn` (default None)
+        batch_size (int): Number of outputs per backward pass (default None derives it from `max_elements`)
+        max_elements (int): Bound on the number of output elements computed per backward pass
+
+    Returns:
+        (:class:`numpy.ndarray`): Summed Jacobian of shape (n_outputs, n_inputs)
+    """
+    n_rows, n_inputs = z.shape
+    jacobian = np.zeros((n_outputs, n_inputs), dtype='float32')
+    row_block = max(1, min(n_rows, max_elements // n_outputs))
+    out_block = batch_size or max(1, max_elements // (row_block * n_outputs))
+    for r_start in range(0, n_rows, row_block):
+        r_end = min(r_start + row_block, n_rows)
+        z_rows = z[r_start:r_end]
+        aux_rows = aux[r_start:r_end] if aux is not None else None
+        for start in range(0, n_outputs, out_block):
+            end = min(start + out_block, n_outputs)
+            z_t = mx.nd.tile(z_rows, reps=(end - start, 1))
+            aux_t = mx.nd.tile(aux_rows, reps=(end - start, 1)) if aux_rows is not None else None
+            z_t.attach_grad()
+            with mx.autograd.record(train_mode=False):
+                y = fn(z_t, aux_t)
+            out_ids = mx.nd.arange(start, end, ctx=z.context).repeat(r_end - r_start)
+            y.backward(mx.nd.one_hot(out_ids, n_outputs), train_mode=False)
+            jacobian[start:end] += z_t.grad.reshape((end - start, r_end - r_start, n_inputs)).sum(axis=1).asnumpy()
+    return jacobian
+
+
+
+def get_summed_softmax_jacobian(logits, logit_tangents):
+    """
+    Jacobian of softmax(`logits`) with respect to the latent inputs, summed over rows, computed analytically
+    from the directional derivatives of the logits along each latent dimension (forward-mode). For row n with
+    term probabilities p_n, the Jacobian is (diag(p_n) - p_n p_n^T) T_n where T_n holds the logit tangents,
+    giving a cost of O(N * V * K) without any backward passes over the outputs.
+
+    Parameters:
+        logits (:class:`mxnet.ndarray.NDArray`): Logits of shape (N, n_outputs)
+        logit_tangents (:class:`mxnet.ndarray.NDArray`): Derivatives of the logits with respect to each latent
+            dimension of shape (N, n_inputs, n_outputs)
+
+    Returns:
+        (:class:`numpy.ndarray`): Summed Jacobian of shape (n_outputs, n_inputs)
+    """
+    p = mx.nd.expand_dims(mx.nd.softmax(logits, axis=1), axis=1)
+    pt = mx.nd.broadcast_mul(logit_tangents, p)
+    jacobian = (pt - mx.nd.broadcast_mul(p, pt.sum(axis=2, keepdims=True))).sum(axis=0)
+    return jacobian.T.asnumpy()
+
+def get_ordered_term_ids(jacobian, k=None):
+    """
+    Term ids ordered by decreasing sensitivity for each topic.
+
+    Parameters:
+        jacobian (:class:`numpy.ndarray`): Term-topic sensitivities of shape (vocab_size, n_latent)
+        k (int): Only select and order the top k terms for each topic (default None orders all terms)
+
+    Returns:
+        (:class:`numpy.ndarray`): Term ids of shape (k, n_latent), column t gives the ordered terms for topic t
+    """
+    if k is None or k >= jacobian.shape[0]:
+        return np.argsort(-jacobian, axis=0, kind='stable')
+    top_k = np.argpartition(-jacobian, k-1, axis=0)[:k]
+    order = np.argsort(-np.take_along_axis(jacobian, top_k, axis=0), axis=0, kind='stable')
+    return np.take_along_axis(top_k, order, axis=0)
+
 
 class BaseVAE(HybridBlock):
 
@@ -36,6 +141,8 @@ class BaseVAE(HybridBlock):
         self.n_covars = n_covars
         self.model_ctx = ctx
         self.embedding = None
+        self.sparse_input = False
+        self.params_version = 0
 
         ## common aspects of all(most!) variational topic models
         with self.name_scope():
@@ -52,40 +159,39 @@ class BaseVAE(HybridBlock):
             bias_param.set_data(log_freq)
             bias_param.grad_req = 'null'
             self.out_bias = bias_param.data()            
+            self._proposal = None ## sampled-softmax proposal follows the (smoothed) term frequencies
+            self.params_updated()
 
-    def get_ordered_terms(self):
+    def params_updated(self):
+        """
+        Mark the model parameters as changed, invalidating any results cached for the current parameters.
+        Parameter updates made outside of training or :meth:`load_parameters` (e.g. via `set_data`)
+        should be followed by a call to this method.
+        """
+        self.params_version += 1
+
+    def load_parameters(self, *args, **kwargs):
+        super(BaseVAE, self).load_parameters(*args, **kwargs)
+        self.params_updated()
+
+    def get_ordered_terms(self, k=None):
         """
         Returns the top K terms for each topic based on sensitivity analysis. Terms whose 
         probability increases the most for a unit increase in a given topic score/probability
         are those most associated with the topic.
+
+        Parameters:
+            k (int): Number of terms to return for each topic (default None returns all terms in order)
         """
-        z = mx.nd.ones(shape=(1, self.n_latent), ctx=self.model_ctx)
-        jacobian = mx.nd.zeros(shape=(self.vocab_size, self.n_latent), ctx=self.model_ctx)
-        for i in range(self.vocab_size):
-            z.attach_grad()        
-            with mx.autograd.record():
-                y = self.decoder(z)
-                yi = y[0][i]
-            yi.backward()
-            jacobian[i] = z.grad
-        sorted_j = jacobian.argsort(axis=0, is_ascend=False)
-        return sorted_j.asnumpy()
+        jacobian = get_decoder_jacobian(self.decoder, self.n_latent, self.vocab_size, ctx=self.model_ctx)
+        return get_ordered_term_ids(jacobian, k)
     
 
     def get_topic_vectors(self):
         """
         Returns unnormalized topic vectors
         """
-        z = mx.nd.ones(shape=(1, self.n_latent), ctx=self.model_ctx)
-        jacobian = mx.nd.zeros(shape=(self.vocab_size, self.n_latent), ctx=self.model_ctx)
-        z.attach_grad()
-        for i in range(self.vocab_size):
-            with mx.autograd.record():
-                y = self.decoder(z)
-                yi = y[0][i]
-            yi.backward()
-            jacobian[i] = z.grad
-        return jacobian.asnumpy()        
+        return get_decoder_jacobian(self.decoder, self.n_latent, self.vocab_size, ctx=self.model_ctx)
 
 
     def add_coherence_reg_penalty(self, F, cur_loss):
@@ -96,6 +202,8 @@ class BaseVAE(HybridBlock):
             else:
                 w = self.decoder.params.get('weight').var()
                 emb = self.embedding.params.get('weight').var()
+            if self.sparse_input:
+                emb = F.transpose(emb)
             c, d = self.coherence_regularization(w, emb)
             return (cur_loss + c + d), c, d
         else:
@@ -124,6 +232,10 @@ class BowVAEModel(BaseVAE):
         n_encoding_layers (int): Number of layers used for the encoder. (default = 1)
         enc_dr (float): Dropout after each encoder layer. (default = 0.1)
         n_covars (int): Number of values for categorical co-variate (0 for non-CovariateData BOW model)
+        sparse_input (bool): Use a first layer (:class:`SparseInputDense`) whose cost and weight gradients scale with the
+            number of non-zero input terms (default = False)
+        n_sampled (int): Number of shared negative terms per batch for the sampled-softmax training objective; 0 uses
+            the exact softmax over the vocabulary (default = 0). The exact softmax is always used outside of training.
         ctx (int): context device (default is mx.cpu())
     """
     def __init__(self,
@@ -132,8 +244,13 @@ class BowVAEModel(BaseVAE):
                  gamma=1.0,
                  multilabel=False,
                  classifier_dropout=0.1,
+                 sparse_input=False,
+                 n_sampled=0,
                  *args, **kwargs):
         super(BowVAEModel, self).__init__(*args, **kwargs)
+        self.sparse_input = sparse_input
+        self.n_sampled = n_sampled
+        self._proposal = None
         self.embedding_size = embedding_size
         self.num_enc_layers = n_encoding_layers
         self.enc_dr = enc_dr
@@ -146,9 +263,16 @@ class BowVAEModel(BaseVAE):
         if self.vocabulary.embedding:
             assert self.vocabulary.embedding.idx_to_vec[0].size == self.embedding_size
         self.encoding_dims = [self.embedding_size + self.n_covars] + [enc_dim for _ in range(n_encoding_layers)]
+        self.embedding_activation = 'tanh'
+        self.encoder_activation = 'softrelu'
         
         with self.name_scope():
-            self.embedding = gluon.nn.Dense(in_units=self.vocab_size, units=self.embedding_size, activation='tanh')
+            if self.sparse_input:
+                self.embedding = SparseInputDense(in_units=self.vocab_size, units=self.embedding_size,
+                                                  activation=self.embedding_activation)
+            else:
+                self.embedding = gluon.nn.Dense(in_units=self.vocab_size, units=self.embedding_size,
+                                                activation=self.embedding_activation)
             self.encoder = self._get_encoder(self.encoding_dims, dr=enc_dr)
             if self.has_classifier:
                 self.lab_dr = gluon.nn.Dropout(self.enc_dr*2.0)
@@ -162,64 +286,145 @@ class BowVAEModel(BaseVAE):
             emb = self.vocabulary.embedding.idx_to_vec.transpose()
             emb_norm_val = mx.nd.norm(emb, keepdims=True, axis=0) + 1e-10
             emb_norm = emb / emb_norm_val
-            self.embedding.weight.set_data(emb_norm)
+            self.embedding.weight.set_data(emb_norm.T if self.sparse_input else emb_norm)
             if fixed_embedding:
                 self.embedding.collect_params().setattr('grad_req', 'null')
 
     def _get_encoder(self, dims, dr=0.1):
         encoder = gluon.nn.HybridSequential()
         for i in range(len(dims)-1):
-            encoder.add(gluon.nn.Dense(in_units=dims[i], units=dims[i+1], activation='softrelu'))
+            encoder.add(gluon.nn.Dense(in_units=dims[i], units=dims[i+1], activation=self.encoder_activation))
             if dr > 0.0:
                 encoder.add(gluon.nn.Dropout(dr))
         return encoder
 
-    def get_ordered_terms_encoder(self, dataloader, sample_size=-1):
-        jacobians = np.zeros(shape=(self.n_latent, self.vocab_size))
+    def _get_embedding_weight_t(self):
+        """Embedding weights with shape (vocab_size, embedding_size) regardless of the first layer's storage layout"""
+        weight = self.embedding.weight.data()
+        return weight if self.sparse_input else weight.T
+
+    def _encoder_input_jacobians(self, data, weight_t):
+        """
+        Jacobians of all topic (mu) encodings with respect to the (clipped) input terms, for a batch
+        of documents. The encoder is run once over the embedding pre-activations tiled for each topic and
+        a single backward pass with one-hot cotangents provides the gradients for all topics; the final
+        projection through the embedding weights is left to the caller so it may be applied after reduction.
+
+        Parameters:
+            data (:class:`mxnet.ndarray.NDArray`): Batch of documents (dense or CSR) of shape (batch_size, vocab_size)
+            weight_t (:class:`mxnet.ndarray.NDArray`): Transposed embedding weights of shape (vocab_size, embedding_size)
+
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Gradients w.r.t. embedding pre-activations of shape (n_latent, batch_size, embedding_size)
+        """
+        if data.stype == 'csr':
+            x_data = mx.nd.sparse.csr_matrix((mx.nd.minimum(data.data, 1.0), data.indices, data.indptr), shape=data.shape,
+                                             ctx=self.model_ctx)
+        else:
+            x_data = mx.nd.minimum(data, 1.0)
+        batch_size = x_data.shape[0]
+        pre_act = mx.nd.dot(x_data, weight_t) + self.embedding.bias.data()
+        pre_act = mx.nd.tile(pre_act, reps=(self.n_latent, 1))
+        pre_act.attach_grad()
+        with mx.autograd.record(train_mode=False):
+            emb_out = self.embedding.act(pre_act) if self.embedding.act is not None else pre_act
+            enc_out = self.latent_distribution.get_mu_encoding(self.encoder(emb_out), include_bn=True)
+        out_grad = mx.nd.one_hot(mx.nd.arange(self.n_latent, ctx=self.model_ctx).repeat(batch_size), self.n_latent)
+        enc_out.backward(out_grad, train_mode=False)
+        return pre_act.grad.reshape((self.n_latent, batch_size, -1))
+
+    def get_ordered_terms_encoder(self, dataloader, sample_size=10000, k=None):
+        """
+        Returns terms ordered for each topic by the gradient of the topic encoding with respect to the input terms,
+        summed over documents.
+
+        Parameters:
+            dataloader: Data loader over documents used for attribution
+            sample_size (int): Stop after (at least) this many documents have been processed; a non-positive value
+                uses all documents (default = 10000)
+            k (int): Number of terms to return for each topic (default None returns all terms in order)
+        """
+        weight_t = self._get_embedding_weight_t()
+        weight = weight_t.T
+        jacobians = mx.nd.zeros(shape=(self.n_latent, self.embedding_size), ctx=self.model_ctx)
         samples = 0
         for bi, (data, _) in enumerate(dataloader):
             if sample_size > 0 and samples >= sample_size:
-                print("Sample processed, exiting..")
                 break
             samples += data.shape[0]
-            x_data = data.tostype('default')
-            x_data = x_data.as_in_context(self.model_ctx)
-            x_data = mx.nd.minimum(x_data, 1.0)
-            for i in range(self.n_latent):
-                x_data.attach_grad()
-                with mx.autograd.record():
-                    emb_out = self.embedding(x_data)
-                    enc_out = self.latent_distribution.get_mu_encoding(self.encoder(emb_out), include_bn=True)
-                    yi = enc_out[:, i] ## for the ith topic, over batch
-                dx = mx.autograd.grad(yi, x_data, train_mode=False)
-                ss = dx[0].sum(axis=0).asnumpy()
-                jacobians[i] += ss
-        sorted_j = (- jacobians).argsort(axis=1).transpose()
-        return sorted_j
-
-    def get_ordered_terms_per_item(self, dataloader, sample_size=-1):
+            data = data.as_in_context(self.model_ctx)
+            jacobians += self._encoder_input_jacobians(data, weight_t).sum(axis=1)
+        ## sum over documents before projecting through embedding weights: (n_latent, embedding_size) x (embedding_size, vocab_size)
+        jacobians = mx.nd.dot(jacobians, weight).asnumpy()
+        return get_ordered_term_ids(jacobians.T, k)
+
+    def get_ordered_terms_per_item(self, dataloader, sample_size=10000):
+        """
+        Returns, for each topic, the list of per-document gradients of the topic encoding with respect to the input terms.
+
+        Parameters:
+            dataloader: Data loader over documents used for attribution
+            sample_size (int): Stop after (at least) this many documents have been processed; a non-positive value
+                uses all documents (default = 10000)
+        """
+        weight_t = self._get_embedding_weight_t()
+        weight = weight_t.T
         jacobian_list = [[] for i in range(self.n_latent)]
         samples = 0
         for bi, (data, _) in enumerate(dataloader):
             if sample_size > 0 and samples >= sample_size:
-                print("Sample processed, exiting..")
                 break
             samples += data.shape[0]
-            x_data = data.tostype('default')
-            x_data = x_data.as_in_context(self.model_ctx)
-            x_data = mx.nd.minimum(x_data, 1.0)
+            data = data.as_in_context(self.model_ctx)
+            grads = self._encoder_input_jacobians(data, weight_t)
             for i in range(self.n_latent):
-                x_data.attach_grad()
-                with mx.autograd.record():
-                    emb_out = self.embedding(x_data)
-                    enc_out = self.latent_distribution.get_mu_encoding(self.encoder(emb_out), include_bn=True)
-                    yi = enc_out[:, i] ## for the ith topic, over batch
-                dx = mx.autograd.grad(yi, x_data, train_mode=False)
-                ss = dx[0].asnumpy()
-                jacobian_list[i] += list(ss)
+                jacobian_list[i] += list(mx.nd.dot(grads[i], weight).asnumpy())
         return jacobian_list
 
 
+    def get_top_attributions(self, dataloader, m=10, sample_size=-1, present_only=True):
+        """
+        Generator over the top `m` attributed terms per document per topic, based on the gradient of each
+        topic encoding with respect to the input terms. Only the selected entries are kept so memory use
+        grows with the number of documents times topics times `m` rather than with the vocabulary size.
+
+        Parameters:
+            dataloader: Data loader over documents (documents are numbered in the order provided)
+            m (int): Number of terms to keep for each document and topic (default = 10)
+            sample_size (int): Stop after exactly this many documents; a non-positive value uses all documents
+            present_only (bool): Only attribute to terms that occur in the document (default = True)
+
+        Yields:
+            (tuple): For each batch, arrays `(doc_ids, topic_ids, term_ids, scores)` of equal length with
+            entries ordered by document, then topic, then decreasing score
+        """
+        weight_t = self._get_embedding_weight_t()
+        weight = weight_t.T
+        m = min(m, self.vocab_size)
+        n_docs = 0
+        for bi, (data, _) in enumerate(dataloader):
+            if sample_size > 0 and n_docs >= sample_size:
+                break
+            n = data.shape[0] if sample_size <= 0 else min(data.shape[0], sample_size - n_docs)
+            data = data.as_in_context(self.model_ctx)
+            grads = self._encoder_input_jacobians(data, weight_t)
+            if present_only:
+                present = data[:n].tostype('default').asnumpy() > 0
+            top_ids = np.zeros((n, self.n_latent, m), dtype='int64')
+            top_scores = np.zeros((n, self.n_latent, m), dtype='float32')
+            for i in range(self.n_latent):
+                scores = mx.nd.dot(grads[i][:n], weight).asnumpy()
+                if present_only:
+                    scores[~present] = -np.inf
+                ids = get_ordered_term_ids(scores.T, m).T
+                top_ids[:, i] = ids
+                top_scores[:, i] = np.take_along_axis(scores, ids, axis=1)
+            keep = np.isfinite(top_scores)
+            doc_ids, topic_ids, _ = np.nonzero(keep)
+            yield doc_ids + n_docs, topic_ids, top_ids[keep], top_scores[keep]
+            n_docs += n
+
+
     def encode_data(self, data, include_bn=False):
         """
         Encode data to the mean of the latent distribution defined by the input `data`.
@@ -250,12 +455,104 @@ class BowVAEModel(BaseVAE):
         Returns:
             output vector (tensor): unnormalized outputs over label values
         """
+        return self.predict_with_encoding(data)[0]
+
+    def predict_with_encoding(self, data):
+        """Predict the label given the input data along with the encoding used for the prediction,
+        running the encoder once
+
+        Parameters:
+            data (tensor): input data tensor
+        Returns:
+            (tuple): unnormalized outputs over label values (tensor) and encodings (tensor)
+        """
         emb_out = self.embedding(data)
         enc_out = self.encoder(emb_out)
         mu_out  = self.latent_distribution.get_mu_encoding(enc_out)
-        return self.classifier(mu_out)
+        return self.classifier(mu_out), mu_out
+
+    def _get_sampled_loss(self, data, y, KL, n_samples):
+        ## y and KL hold the decoded term distributions and KL terms for n_samples consecutive copies of the batch
+        if data.stype == 'csr':
+            data = data.tostype('default')
+        log_y = mx.nd.log(y + 1e-12).reshape((n_samples, data.shape[0], -1))
+        recon_loss = -mx.nd.sum(mx.nd.broadcast_mul(log_y, data.expand_dims(0)), axis=2)
+        loss, _, _ = self.add_coherence_reg_penalty(mx.nd, recon_loss + KL.reshape((n_samples, -1)))
+        return loss
+
+    def get_elbo_samples(self, data, n_samples):
+        """
+        Monte Carlo samples of the loss (negative ELBO) for each document in a batch. The encoder is run once;
+        only latent sampling and decoding are repeated, with all samples decoded together.
+
+        Parameters:
+            data (:class:`mxnet.ndarray.NDArray`): Batch of documents (dense or CSR) of shape (batch_size, vocab_size)
+            n_samples (int): Number of latent samples per document
+
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Losses of shape (n_samples, batch_size)
+        """
+        enc_out = self.encoder(self.embedding(data))
+        z, KL = self.latent_distribution(mx.nd.tile(enc_out, reps=(n_samples, 1)), n_samples * data.shape[0])
+        return self._get_sampled_loss(data, mx.nd.softmax(self.decoder(z), axis=1), KL, n_samples)
     
 
+    def _get_proposal(self):
+        if self._proposal is None:
+            q = np.exp(PROPOSAL_POWER * self.decoder.bias.data().asnumpy().astype('float64'))
+            q /= q.sum()
+            self._proposal = (q, np.cumsum(q))
+        return self._proposal
+
+    def get_sampled_loss_terms(self, data, z, KL):
+        """
+        Loss terms using a sampled softmax in place of the full softmax over the vocabulary. Each document's
+        log-partition function is computed exactly over the terms it contains, plus an importance-weighted estimate
+        over `n_sampled` negative terms shared by the batch and drawn from a frequency-based proposal (negatives
+        that occur in a document are excluded for that document). Cost scales with the number of non-zero terms
+        and negatives rather than with the vocabulary size.
+
+        Parameters:
+            data (:class:`mxnet.ndarray.sparse.CSRNDArray`): Batch of documents of shape (batch_size, vocab_size)
+            z (:class:`mxnet.ndarray.NDArray`): Latent samples of shape (batch_size, n_latent)
+            KL (:class:`mxnet.ndarray.NDArray`): KL terms of shape (batch_size,)
+
+        Returns:
+            (tuple): Loss, reconstruction loss, coherence loss and redundancy loss
+        """
+        ctx = z.context
+        n = data.shape[0]
+        indptr, indices, values = data.indptr.asnumpy(), data.indices.asnumpy().astype('int64'), data.data.asnumpy()
+        counts = np.diff(indptr)
+        rows = np.repeat(np.arange(n), counts)
+        offsets = np.arange(len(indices)) - indptr[rows]
+        width = max(int(counts.max()) if n > 0 else 0, 1)
+        ## document terms padded to a common width: (batch_size, width)
+        pos_ids, pos_vals, pos_mask = np.zeros((n, width), dtype='int64'), np.zeros((n, width)), np.zeros((n, width))
+        pos_ids[rows, offsets] = indices
+        pos_vals[rows, offsets] = values
+        pos_mask[rows, offsets] = 1.0
+        q, q_cdf = self._get_proposal()
+        neg_ids = np.minimum(np.searchsorted(q_cdf, np.random.rand(self.n_sampled) * q_cdf[-1]), self.vocab_size - 1)
+        neg_mask = ~np.isin(np.arange(n)[:, None] * self.vocab_size + neg_ids[None, :], rows * self.vocab_size + indices)
+
+        weight, bias = self.decoder.weight.data(), self.decoder.bias.data()
+        pos_ids_nd = mx.nd.array(pos_ids, ctx=ctx)
+        pos_logits = mx.nd.batch_dot(mx.nd.take(weight, pos_ids_nd), z.expand_dims(2)).reshape((n, width)) + \
+            mx.nd.take(bias, pos_ids_nd)
+        neg_ids_nd = mx.nd.array(neg_ids, ctx=ctx)
+        neg_logits = mx.nd.dot(z, mx.nd.take(weight, neg_ids_nd), transpose_b=True) + mx.nd.take(bias, neg_ids_nd) - \
+            mx.nd.array(np.log(self.n_sampled * q[neg_ids]), ctx=ctx)
+        ## excluded entries (padding and negatives occurring in the document) are given effectively zero weight
+        all_logits = mx.nd.concat(pos_logits + mx.nd.array((pos_mask - 1.0) * 1e30, ctx=ctx),
+                                  neg_logits + mx.nd.array((neg_mask - 1.0) * 1e30, ctx=ctx), dim=1)
+        max_logits = mx.nd.max(all_logits, axis=1, keepdims=True)
+        log_z = mx.nd.log(mx.nd.sum(mx.nd.exp(mx.nd.broadcast_sub(all_logits, max_logits)), axis=1)) + max_logits.reshape((n,))
+        doc_lengths = mx.nd.array(np.bincount(rows, weights=values, minlength=n), ctx=ctx)
+        recon_loss = doc_lengths * log_z - mx.nd.sum(mx.nd.array(pos_vals, ctx=ctx) * pos_logits, axis=1)
+        ii_loss, coherence_loss, redundancy_loss = self.add_coherence_reg_penalty(mx.nd, mx.nd.broadcast_plus(recon_loss, KL))
+        return ii_loss, recon_loss, coherence_loss, redundancy_loss
+
     def hybrid_forward(self, F, data, labels):
         batch_size = data.shape[0] if F is mx.ndarray else self.batch_size
         emb_out = self.embedding(data)
@@ -263,9 +560,12 @@ class BowVAEModel(BaseVAE):
         enc_out = self.encoder(emb_out)
         mu_out  = self.latent_distribution.get_mu_encoding(enc_out)
         z, KL   = self.latent_distribution(enc_out, batch_size)
-        y = F.softmax(self.decoder(z), axis=1)
-        ii_loss, recon_loss, coherence_loss, redundancy_loss = \
-            self.get_loss_terms(F, data, y, KL, batch_size)
+        if self.n_sampled > 0 and F is mx.ndarray and mx.autograd.is_training() and data.stype == 'csr':
+            ii_loss, recon_loss, coherence_loss, redundancy_loss = self.get_sampled_loss_terms(data, z, KL)
+        else:
+            y = F.softmax(self.decoder(z), axis=1)
+            ii_loss, recon_loss, coherence_loss, redundancy_loss = \
+                self.get_loss_terms(F, data, y, KL, batch_size)
         if self.has_classifier:
             classifier_outputs = self.classifier(self.lab_dr(mu_out))
         else:
@@ -280,6 +580,7 @@ class CovariateBowVAEModel(BowVAEModel):
     def __init__(self, covar_net_layers=1, *args, **kwargs):
         super(CovariateBowVAEModel, self).__init__(*args, **kwargs)
         self.covar_net_layers = covar_net_layers
+        self._covar_cache = EncodingCache(max_entries=COVAR_CACHE_ENTRIES)
         with self.name_scope():
             if self.n_covars < 1:  
                 self.cov_decoder = ContinuousCovariateModel(self.n_latent, self.vocab_size,
@@ -297,61 +598,69 @@ class CovariateBowVAEModel(BowVAEModel):
         enc_out = self.encoder(mx.nd.concat(emb_out, covars))
         return self.latent_distribution.get_mu_encoding(enc_out, include_bn=include_bn)
 
+    def get_elbo_samples(self, data, n_samples, covars):
+        """
+        Monte Carlo samples of the loss (negative ELBO) for each document in a batch with covariates `covars`
+        (one-hot or scalar values of shape (batch_size, n_covars)), running the encoder once.
 
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Losses of shape (n_samples, batch_size)
+        """
+        enc_out = self.encoder(mx.nd.concat(self.embedding(data), covars))
+        z, KL = self.latent_distribution(mx.nd.tile(enc_out, reps=(n_samples, 1)), n_samples * data.shape[0])
+        y = mx.nd.softmax(self.decoder(z) + self.cov_decoder(z, mx.nd.tile(covars, reps=(n_samples, 1))), axis=1)
+        return self._get_sampled_loss(data, y, KL, n_samples)
 
-    def get_ordered_terms_with_covar_at_data(self, data, k, covar):
+
+    def _covar_jacobian(self, data, covar, cache_key=None, max_elements=1 << 24):
         """
-        Uses test/training data-point as the input points around which term sensitivity is computed
+        Jacobian of the term probabilities with respect to the topic encodings of `data` (summed over
+        documents) with covariates `covar`. When a `cache_key` identifying the inputs (e.g. a dataset name
+        together with a covariate value) is provided, the result is cached (LRU) under that key until the
+        model parameters change; the inputs themselves are never hashed.
         """
-        data = data.as_in_context(self.model_ctx)
-        covar = covar.as_in_context(self.model_ctx)
-        jacobian = mx.nd.zeros(shape=(self.vocab_size, self.n_latent), ctx=self.model_ctx)
+        jacobian = None
+        if cache_key is not None:
+            self._covar_cache.bind(self.params_version)
+            jacobian = self._covar_cache.get(cache_key)
+        if jacobian is None:
+            data = data.as_in_context(self.model_ctx).astype('float32')
+            covar = covar.as_in_context(self.model_ctx).astype('float32')
+            z = self.encode_data_with_covariates(data, covar)
+            dec_tangent = mx.nd.expand_dims(self.decoder.weight.data().T, axis=0)
+            jacobian = np.zeros((self.vocab_size, self.n_latent), dtype='float32')
+            row_block = max(1, max_elements // (self.n_latent * self.vocab_size))
+            for start in range(0, z.shape[0], row_block):
+                z_rows, covar_rows = z[start:start+row_block], covar[start:start+row_block]
+                logits = self.decoder(z_rows) + self.cov_decoder(z_rows, covar_rows)
+                tangents = mx.nd.broadcast_add(self.cov_decoder.get_logit_tangents(z_rows, covar_rows), dec_tangent)
+                jacobian += get_summed_softmax_jacobian(logits, tangents)
+            jacobian.setflags(write=False) ## shared between callers through the cache
+            if cache_key is not None:
+                self._covar_cache.put(cache_key, jacobian)
+        return jacobian
 
-        batch_size = data.shape[0]
-        emb_out = self.embedding(data)
+    def get_ordered_terms_with_covar_at_data(self, data, k, covar, cache_key=None):
+        """
+        Uses test/training data-point as the input points around which term sensitivity is computed
 
-        co_emb = mx.nd.concat(emb_out, covar)
-        z = self.latent_distribution.get_mu_encoding(self.encoder(co_emb))
+        Parameters:
+            data (:class:`mxnet.ndarray.NDArray`): Documents (dense or CSR) of shape (N, vocab_size)
+            k (int): Number of terms to return for each topic
+            covar (:class:`mxnet.ndarray.NDArray`): Covariates for each document of shape (N, n_covars)
+            cache_key (hashable): Optional key identifying `data` and `covar` under which the term sensitivities
+                are cached until the model parameters change
 
-        z.attach_grad()
-        outputs = []
-        with mx.autograd.record():
-            dec_out = self.decoder(z)
-            cov_dec_out = self.cov_decoder(z, covar)
-            y = mx.nd.softmax(cov_dec_out + dec_out, axis=1)
-            for i in range(self.vocab_size):
-                outputs.append(y[:,i])
-        for i, output in enumerate(outputs):
-            output.backward(retain_graph=True)
-            jacobian[i] += z.grad.sum(axis=0)
-        sorted_j = jacobian.argsort(axis=0, is_ascend=False)
-        return sorted_j
+        Returns:
+            (:class:`numpy.ndarray`): Term ids of shape (k, n_latent)
+        """
+        return get_ordered_term_ids(self._covar_jacobian(data, covar, cache_key=cache_key), k)
 
-    def get_topic_vectors(self, data, covar):
+    def get_topic_vectors(self, data, covar, cache_key=None):
         """
-        Returns unnormalized topic vectors based on the input data
+        Returns unnormalized topic vectors based on the input data (cached under `cache_key` if provided)
         """
-        data = data.as_in_context(self.model_ctx)
-        covar = covar.as_in_context(self.model_ctx)
-        jacobian = mx.nd.zeros(shape=(self.vocab_size, self.n_latent), ctx=self.model_ctx)
-
-        batch_size = data.shape[0]
-        emb_out = self.embedding(data)
-
-        co_emb = mx.nd.concat(emb_out, covar)
-        z = self.latent_distribution.get_mu_encoding(self.encoder(co_emb))
-        z.attach_grad()
-        outputs = []
-        with mx.autograd.record():
-            dec_out = self.decoder(z)
-            cov_dec_out = self.cov_decoder(z, covar)
-            y = mx.nd.softmax(cov_dec_out + dec_out, axis=1)
-            for i in range(self.vocab_size):
-                outputs.append(y[:,i])
-        for i, output in enumerate(outputs):
-            output.backward(retain_graph=True)
-            jacobian[i] += z.grad.sum(axis=0)
-        return jacobian
+        return mx.nd.array(self._covar_jacobian(data, covar, cache_key=cache_key), ctx=self.model_ctx)
         
 
     def hybrid_forward(self, F, data, covars):
@@ -399,6 +708,25 @@ class CovariateModel(HybridBlock):
             return score_CI + score_C
         else:
             return score_C
+
+    def get_logit_tangents(self, topic_distrib, covars):
+        """
+        Derivatives of the covariate scores with respect to each topic dimension.
+
+        Parameters:
+            topic_distrib (:class:`mxnet.ndarray.NDArray`): Topic encodings of shape (N, n_topics)
+            covars (:class:`mxnet.ndarray.NDArray`): Covariates of shape (N, n_covars)
+
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Tangents of shape (N, n_topics, vocab_size)
+        """
+        n = topic_distrib.shape[0]
+        if not self.interactions:
+            return mx.nd.zeros((n, self.n_topics, self.vocab_size), ctx=topic_distrib.context)
+        ## interaction weights have shape (V, C * K) with input index c * K + k
+        w = self.cov_inter_decoder.weight.data().reshape((self.vocab_size, self.n_covars, self.n_topics))
+        w = w.transpose((1, 2, 0)).reshape((self.n_covars, -1))
+        return mx.nd.dot(covars, w).reshape((n, self.n_topics, self.vocab_size))
             
 
 class ContinuousCovariateModel(HybridBlock):
@@ -426,8 +754,61 @@ class ContinuousCovariateModel(HybridBlock):
         inputs = F.concat(topic_distrib, scalars)
         sc_transform = self.cov_decoder(inputs)
         return sc_transform
+
+    def get_logit_tangents(self, topic_distrib, scalars):
+        """
+        Derivatives of the covariate scores with respect to each topic dimension, propagated forward
+        through the (ReLU) hidden layers alongside the activations.
+
+        Parameters:
+            topic_distrib (:class:`mxnet.ndarray.NDArray`): Topic encodings of shape (N, n_topics)
+            scalars (:class:`mxnet.ndarray.NDArray`): Continuous covariates of shape (N, n_scalars)
+
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Tangents of shape (N, n_topics, vocab_size)
+        """
+        n = topic_distrib.shape[0]
+        h = mx.nd.concat(topic_distrib, scalars)
+        layers = list(self.cov_decoder)
+        first_w = layers[0].weight.data()
+        tangents = mx.nd.tile(mx.nd.expand_dims(first_w[:, :self.n_topics].T, axis=0), reps=(n, 1, 1))
+        for i, layer in enumerate(layers[:-1]):
+            w = layer.weight.data()
+            if i > 0:
+                tangents = mx.nd.dot(tangents.reshape((-1, w.shape[1])), w.T).reshape((n, self.n_topics, -1))
+            pre = mx.nd.dot(h, w.T)
+            if layer.bias is not None:
+                pre = mx.nd.broadcast_add(pre, mx.nd.expand_dims(layer.bias.data(), axis=0))
+            tangents = mx.nd.broadcast_mul(tangents, mx.nd.expand_dims(pre > 0, axis=1))
+            h = mx.nd.relu(pre)
+        w_out = layers[-1].weight.data()
+        return mx.nd.dot(tangents.reshape((-1, w_out.shape[1])), w_out.T).reshape((n, self.n_topics, -1))
         
 
+class SparseInputDense(HybridBlock):
+    """
+    Fully connected layer for (typically CSR) bag-of-words inputs. Weights are stored with shape (in_units, units)
+    so that the layer is computed as a sparse dot product and the weight gradient is row-sparse, touching only the
+    rows for terms present in the batch. The cost of the layer (and, with a lazy-update optimizer, of its update)
+    then scales with the number of non-zero inputs rather than with the vocabulary size.
+
+    Parameters:
+        in_units (int): Input dimension (vocabulary size)
+        units (int): Output dimension
+        activation (str): Activation function (default None)
+    """
+    def __init__(self, in_units, units, activation=None, **kwargs):
+        super(SparseInputDense, self).__init__(**kwargs)
+        with self.name_scope():
+            self.weight = self.params.get('weight', shape=(in_units, units), grad_stype='row_sparse')
+            self.bias = self.params.get('bias', shape=(units,), init='zeros')
+            self.act = nn.Activation(activation, prefix=activation+'_') if activation is not None else None
+
+    def hybrid_forward(self, F, x, weight, bias):
+        out = F.broadcast_add(F.sparse.dot(x, weight), F.expand_dims(bias, axis=0))
+        return self.act(out) if self.act is not None else out
+
+
 class CoherenceRegularizer(HybridBlock):
 
     ## Follows paper to add coherence loss: http://aclweb.org/anthology/D18-1096
@@ -484,6 +865,7 @@ class BaseSeqBowVED(Block):
         self.bow_vocab_size = bow_vocab_size
         self.redundancy_reg_penalty = redundancy_reg_penalty
         self.vocabulary = None ### XXX - add this as option to be passed in
+        self.params_version = 0
         with self.name_scope():
             self.embedding = None
             self.decoder = nn.Dense(in_units=self.n_latent, units=bow_vocab_size, use_bias=True)
@@ -516,6 +898,17 @@ class BaseSeqBowVED(Block):
             bias_param.set_data(log_freq)
             bias_param.grad_req = 'null'
             self.out_bias = bias_param.data()
+            self.params_updated()
+
+    def params_updated(self):
+        """
+        Mark the model parameters as changed, invalidating any results cached for the current parameters.
+        """
+        self.params_version += 1
+
+    def load_parameters(self, *args, **kwargs):
+        super(BaseSeqBowVED, self).load_parameters(*args, **kwargs)
+        self.params_updated()
 
     def get_top_k_terms(self, k, ctx=mx.cpu()):
         """
@@ -524,17 +917,8 @@ class BaseSeqBowVED(Block):
         are those most associated with the topic. This is just the topic-term weights for a 
         linear decoder - but code here will work with arbitrary decoder.
         """
-        z = mx.nd.ones(shape=(1, self.n_latent), ctx=ctx)
-        jacobian = mx.nd.zeros(shape=(self.bow_vocab_size, self.n_latent), ctx=ctx)
-        z.attach_grad()        
-        for i in range(self.bow_vocab_size):
-            with mx.autograd.record():
-                y = self.decoder(z)
-                yi = y[0][i]
-            yi.backward()
-            jacobian[i] = z.grad
-        sorted_j = jacobian.argsort(axis=0, is_ascend=False)
-        return sorted_j.asnumpy()
+        jacobian = get_decoder_jacobian(self.decoder, self.n_latent, self.bow_vocab_size, ctx=ctx)
+        return get_ordered_term_ids(jacobian, k)
             
 
 class SeqBowVED(BaseSeqBowVED):
@@ -566,6 +950,25 @@ class SeqBowVED(BaseSeqBowVED):
         elbo = elbo + redundancy_loss
         return elbo, rec_loss, KL_loss, redundancy_loss, classifier_outputs
 
+    def get_elbo_samples(self, inputs, token_types, valid_length, bow, n_samples):
+        """
+        Monte Carlo samples of the ELBO loss for each sequence in a batch. BERT is run once; only latent sampling
+        and bag-of-words decoding are repeated, with all samples decoded together.
+
+        Parameters:
+            bow (:class:`mxnet.ndarray.NDArray`): Dense bag-of-words vectors of shape (batch_size, bow_vocab_size)
+            n_samples (int): Number of latent samples per sequence
+
+        Returns:
+            (:class:`mxnet.ndarray.NDArray`): Losses of shape (n_samples, batch_size)
+        """
+        _, enc = self.bert(inputs, token_types, valid_length)
+        batch_size = inputs.shape[0]
+        z, KL = self.latent_dist(mx.nd.tile(enc, reps=(n_samples, 1)), n_samples * batch_size)
+        log_y = mx.nd.log(mx.nd.softmax(self.decoder(z), axis=1) + 1e-12).reshape((n_samples, batch_size, -1))
+        rec_loss = -mx.nd.sum(mx.nd.broadcast_mul(log_y, bow.expand_dims(0)), axis=2)
+        return rec_loss + KL.reshape((n_samples, -1)) * self.kld_wt + self.get_redundancy_penalty()
+
 
 class MetricSeqBowVED(BaseSeqBowVED):
     def __init__(self, *args, **kwargs):
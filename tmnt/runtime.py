@@ -0,0 +1,161 @@
+# coding: utf-8
+# Copyright (c) 2021. The MITRE Corporation.
+"""
+Lightweight inference runtime for bag-of-words topic model encoders using only NumPy and SciPy.
+
+Models are exported to a bundle with :meth:`tmnt.inference.BowVAEInferencer.export_bundle`; loading
+and running a bundle does not import MXNet or GluonNLP.
+"""
+
+import io
+import re
+import json
+import unicodedata
+import numpy as np
+import scipy.sparse as sp
+from tmnt.utils.recalibrate import recalibrate_scores_batch
+
+__all__ = ['NumpyBowVAEInferencer']
+
+
+def _softrelu(x):
+    return np.logaddexp(0.0, x)
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+_ACTIVATIONS = {None: lambda x: x, 'tanh': np.tanh, 'softrelu': _softrelu, 'relu': lambda x: np.maximum(x, 0.0),
+                'sigmoid': _sigmoid}
+
+
+class _TextAnalyzer(object):
+    """Word n-gram analyzer matching :py:class:`sklearn.feature_extraction.text.CountVectorizer` for a fixed vocabulary"""
+    def __init__(self, token_pattern, lowercase=True, strip_accents=None, ngram_range=(1, 1), stop_words=None):
+        self.token_re = re.compile(token_pattern)
+        self.lowercase = lowercase
+        self.strip_accents = strip_accents
+        self.ngram_range = tuple(ngram_range)
+        self.stop_words = frozenset(stop_words) if stop_words else None
+
+    def _preprocess(self, doc):
+        if self.lowercase:
+            doc = doc.lower()
+        if self.strip_accents == 'ascii':
+            doc = unicodedata.normalize('NFKD', doc).encode('ASCII', 'ignore').decode('ASCII')
+        elif self.strip_accents == 'unicode':
+            doc = ''.join(c for c in unicodedata.normalize('NFKD', doc) if not unicodedata.combining(c))
+        return doc
+
+    def __call__(self, doc):
+        tokens = self.token_re.findall(self._preprocess(doc))
+        if self.stop_words is not None:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            ngrams.extend(' '.join(tokens[i:i+n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+
+class NumpyBowVAEInferencer(object):
+    """Encoder-only inference for bag-of-words topic models exported as a NumPy bundle.
+
+    Parameters:
+        arrays (dict): Model weight arrays keyed by name
+        config (dict): Bundle configuration (layer structure, vocabulary, analyzer settings and label map)
+    """
+    def __init__(self, arrays, config):
+        self.arrays = arrays
+        self.config = config
+        self.vocab = config['vocabulary']
+        self.token_to_idx = {t: i for i, t in enumerate(self.vocab)}
+        self.n_latent = config['n_latent']
+        self.analyzer = _TextAnalyzer(**config['analyzer'])
+        self.binary = config.get('binary', False)
+        self.label_map = config.get('label_map') or {}
+        self.multilabel = config.get('multilabel', False)
+
+    @classmethod
+    def from_bundle(cls, bundle_file: str) -> 'NumpyBowVAEInferencer':
+        """Load an inferencer from a bundle written by :meth:`tmnt.inference.BowVAEInferencer.export_bundle`"""
+        with np.load(bundle_file) as bundle:
+            arrays = {k: bundle[k] for k in bundle.files if k != 'config'}
+            config = json.loads(str(bundle['config']))
+        return cls(arrays, config)
+
+    def vectorize(self, texts):
+        """Transform a list of texts into a sparse document-term matrix of shape (n_docs, vocab_size)"""
+        indptr, indices = [0], []
+        for txt in texts:
+            for t in self.analyzer(txt):
+                i = self.token_to_idx.get(t)
+                if i is not None:
+                    indices.append(i)
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.ones(len(indices), dtype='float32'), np.array(indices, dtype='int64'), np.array(indptr)),
+                          shape=(len(texts), len(self.vocab)))
+        X.sum_duplicates()
+        if self.binary:
+            X.data[:] = 1.0
+        return X
+
+    def _encode(self, X):
+        h = _ACTIVATIONS[self.config['embedding_act']](X @ self.arrays['embedding.weight'] + self.arrays['embedding.bias'])
+        for i, act in enumerate(self.config['encoder_acts']):
+            h = _ACTIVATIONS[act](h @ self.arrays['encoder.{}.weight'.format(i)] + self.arrays['encoder.{}.bias'.format(i)])
+        return h @ self.arrays['mu_encoder.weight'] + self.arrays['mu_encoder.bias']
+
+    def _batch_norm(self, mu):
+        a = self.arrays
+        return (mu - a['mu_bn.running_mean']) / np.sqrt(a['mu_bn.running_var'] + self.config['mu_bn_eps']) \
+            * a['mu_bn.gamma'] + a['mu_bn.beta']
+
+    def _to_encodings(self, mu, use_probs, include_bn, target_entropy):
+        if include_bn:
+            mu = self._batch_norm(mu)
+        if use_probs:
+            e1 = (mu - mu.min(axis=1, keepdims=True)).astype('float64')
+            e1 = np.exp(e1 - e1.max(axis=1, keepdims=True))
+            return recalibrate_scores_batch(e1 / e1.sum(axis=1, keepdims=True), target_entropy=target_entropy).astype('float32')
+        return mu.astype('float32')
+
+    def encode_data(self, X, use_probs=True, include_bn=False, target_entropy=1.0):
+        """Encode a document-term matrix.
+
+        Parameters:
+            X (sparse matrix or array): Document-term matrix of shape (n_docs, vocab_size)
+            use_probs (bool): Return recalibrated topic probabilities rather than unnormalized encodings
+            include_bn (bool): Apply the latent batch normalization to encodings
+            target_entropy (float): Target entropy for recalibrated topic probabilities
+
+        Returns:
+            (:class:`numpy.ndarray`): Encodings of shape (n_docs, n_latent)
+        """
+        return self._to_encodings(self._encode(X), use_probs, include_bn, target_entropy)
+
+    def encode_texts(self, texts, use_probs=True, include_bn=False, target_entropy=1.0):
+        """Encode a list of texts, returning encodings of shape (n_docs, n_latent)"""
+        return self.encode_data(self.vectorize(texts), use_probs=use_probs, include_bn=include_bn,
+                                target_entropy=target_entropy)
+
+    def predict_text(self, texts, pred_threshold=0.5):
+        """Predict labels for a list of texts (requires a model with a classifier)
+
+        Returns:
+            (tuple): Predicted label(s) for each text and topic encodings of shape (n_docs, n_latent)
+        """
+        if 'classifier.weight' not in self.arrays:
+            raise Exception("Exported model does not include a classifier")
+        mu = self._encode(self.vectorize(texts))
+        encodings = self._to_encodings(mu, True, False, 1.0)
+        preds = mu @ self.arrays['classifier.weight'] + self.arrays['classifier.bias']
+        inv_map = [0] * len(self.label_map)
+        for k in self.label_map:
+            inv_map[self.label_map[k]] = k
+        if not self.multilabel:
+            best_strs = [inv_map[best] for best in np.argmax(preds, axis=1)]
+        else:
+            best_strs = [[inv_map[i] for i in np.where(p > pred_threshold)[0]] for p in preds]
+        return best_strs, encodings
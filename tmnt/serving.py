@@ -0,0 +1,197 @@
+# coding: utf-8
+# Copyright (c) 2021. The MITRE Corporation.
+"""
+Asyncio serving layer that groups concurrent inference requests into dynamic micro-batches.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['MicroBatcher', 'InferenceServer']
+
+
+class MicroBatcher(object):
+    """Queue individual requests and process them in micro-batches.
+
+    A batch is formed from the queued items once `max_batch_size` items are available or `max_wait_ms`
+    has elapsed since the first item of the batch was taken from the queue. The batch function is run
+    on a single worker thread (so the event loop remains responsive and the model is never called
+    concurrently) and each request's future is resolved with its own result.
+
+    Parameters:
+        batch_fn (function): Function mapping a list of items to a sequence of results of the same length
+        max_batch_size (int): Maximum number of items per batch
+        max_wait_ms (float): Maximum time to wait for additional items once a batch has been started
+        metrics_window (int): Number of recent requests/batches used for latency and batch size metrics
+    """
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=5.0, metrics_window=10000):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue_latencies = deque(maxlen=metrics_window)
+        self._batch_sizes = deque(maxlen=metrics_window)
+        self.n_requests = 0
+        self.n_batches = 0
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def close(self):
+        """Stop batching and shut down the worker thread once any running batch completes. A closed batcher
+        cannot be restarted."""
+        await self.stop()
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def submit(self, item):
+        """Submit a single item and wait for its result"""
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.monotonic()))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            start = time.monotonic()
+            self._queue_latencies.extend(start - submitted for _, _, submitted in batch)
+            self._batch_sizes.append(len(batch))
+            self.n_requests += len(batch)
+            self.n_batches += 1
+            try:
+                results = await loop.run_in_executor(self._executor, self.batch_fn, [item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise Exception("Batch function returned {} results for {} items".format(len(results), len(batch)))
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logging.error("Micro-batch of size {} failed: {}".format(len(batch), e))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def get_metrics(self):
+        """Request/batch counts with queue latency (seconds) and batch size statistics over the recent window"""
+        latencies = np.array(self._queue_latencies) if len(self._queue_latencies) > 0 else np.zeros(1)
+        sizes = np.array(self._batch_sizes) if len(self._batch_sizes) > 0 else np.zeros(1)
+        return {'requests': self.n_requests, 'batches': self.n_batches,
+                'queue_latency_mean': float(latencies.mean()),
+                'queue_latency_p50': float(np.percentile(latencies, 50)),
+                'queue_latency_p99': float(np.percentile(latencies, 99)),
+                'batch_size_mean': float(sizes.mean()), 'batch_size_max': int(sizes.max())}
+
+
+class InferenceServer(object):
+    """Micro-batching server around an inferencer providing `encode_texts` (and optionally `predict_text`)
+    for lists of texts, e.g. :class:`tmnt.inference.BowVAEInferencer` or :class:`tmnt.runtime.NumpyBowVAEInferencer`.
+
+    Requests may be made in-process (:meth:`encode`, :meth:`predict`) or over HTTP (:meth:`serve_http`),
+    with JSON bodies of the form ``{"text": "..."}`` posted to ``/encode`` or ``/predict``; ``GET /metrics``
+    returns batching metrics.
+
+    Parameters:
+        inferencer: Inferencer object
+        max_batch_size (int): Maximum number of texts per batch
+        max_wait_ms (float): Maximum time to wait for additional texts once a batch has been started
+        use_probs (bool): Return topic probabilities rather than unnormalized encodings
+    """
+    def __init__(self, inferencer, max_batch_size=64, max_wait_ms=5.0, use_probs=True):
+        self.inferencer = inferencer
+        self.encode_batcher = MicroBatcher(self._encode_batch, max_batch_size, max_wait_ms)
+        self.predict_batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait_ms)
+        self.use_probs = use_probs
+
+    def _encode_batch(self, texts):
+        return [np.asarray(e).tolist() for e in self.inferencer.encode_texts(texts, use_probs=self.use_probs)]
+
+    def _predict_batch(self, texts):
+        labels, encodings = self.inferencer.predict_text(texts)
+        return [{'label': l, 'encoding': np.asarray(e).tolist()} for l, e in zip(labels, encodings)]
+
+    async def encode(self, text):
+        """Topic encoding (as a list) for a single text"""
+        return await self.encode_batcher.submit(text)
+
+    async def predict(self, text):
+        """Predicted label and topic encoding for a single text"""
+        return await self.predict_batcher.submit(text)
+
+    def get_metrics(self):
+        return {'encode': self.encode_batcher.get_metrics(), 'predict': self.predict_batcher.get_metrics()}
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                k, _, v = line.partition(':')
+                headers[k.strip().lower()] = v.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            method, path = request_line[0], request_line[1]
+            if method == 'GET' and path == '/metrics':
+                status, result = 200, self.get_metrics()
+            elif method == 'POST' and path in ('/encode', '/predict'):
+                text = json.loads(body.decode('utf-8'))['text']
+                result = await (self.encode(text) if path == '/encode' else self.predict(text))
+                status = 200
+            else:
+                status, result = 404, {'error': 'Not found'}
+        except Exception as e:
+            status, result = 500, {'error': str(e)}
+        payload = json.dumps(result).encode('utf-8')
+        writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'
+                     .format(status, 'OK' if status == 200 else 'Error', len(payload)).encode('latin-1') + payload)
+        await writer.drain()
+        writer.close()
+
+    async def serve_http(self, host='127.0.0.1', port=8080):
+        """Start the HTTP server, returning the :class:`asyncio.AbstractServer`"""
+        await self.encode_batcher.start()
+        await self.predict_batcher.start()
+        return await asyncio.start_server(self._handle_http, host, port)
+
+    async def stop(self):
+        await self.encode_batcher.stop()
+        await self.predict_batcher.stop()
+
+    async def close(self):
+        """Stop the batchers and shut down their worker threads"""
+        await self.encode_batcher.close()
+        await self.predict_batcher.close()
@@ -21,7 +21,8 @@ from pathlib import Path
 from tmnt.utils import log_utils
 from tmnt.utils.random import seed_rng
 from tmnt.utils.log_utils import logging_config
-from tmnt.data_loading import load_vocab, file_to_data
+from tmnt.data_loading import load_vocab, file_to_data, is_sharded_corpus, ShardedCorpus
+from tmnt.utils.ngram_helpers import CooccurrenceIndex
 from tmnt.bert_handling import get_bert_datasets, JsonlDataset
 from tmnt.estimator import BowEstimator, CovariateBowEstimator, SeqBowEstimator
 from tmnt.preprocess.vectorizer import TMNTVectorizer
@@ -48,6 +49,7 @@ class BaseTrainer(object):
         self.rng_seed     = rng_seed
         self.vocabulary   = vocabulary
         self.vocab_cache  = {}
+        self.corpus_cache = {}
         self.validate_each_epoch = val_each_epoch
 
 
@@ -211,12 +213,14 @@ class BowVAETrainer(BaseTrainer):
         use_gpu (bool): Flag to force use of a GPU if available.  Default = False.
         val_each_epoch (bool): Perform validation (NPMI and perplexity) on the validation set after each epoch. Default = False.
         rng_seed (int): Seed for random number generator. Default = 1234
+        reference_index (str): Directory with a co-occurrence index over a reference corpus to compute coherence against. 
+            Default = None (compute coherence against the validation data)
     """
     def __init__(self, vocabulary, train_data_or_path, test_data_or_path,
                  log_out_dir='_exps', model_out_dir='_model_dir', coherence_via_encoder=False, aux_data_or_path=None,
                  pretrained_param_file=None, topic_seed_file = None, use_labels_as_covars=False, coherence_coefficient=8.0,
                  use_gpu=False, n_labels=0,
-                 val_each_epoch=True, rng_seed=1234):
+                 val_each_epoch=True, rng_seed=1234, reference_index=None):
         super().__init__(vocabulary, train_data_or_path, test_data_or_path, aux_data_or_path, use_gpu, val_each_epoch, rng_seed)
         if not log_utils.CONFIGURED:
             logging_config(folder=log_out_dir, name='tmnt', level='info', console_level='info')
@@ -228,6 +232,7 @@ class BowVAETrainer(BaseTrainer):
         self.use_labels_as_covars = use_labels_as_covars
         self.coherence_via_encoder = coherence_via_encoder
         self.coherence_coefficient = coherence_coefficient
+        self.reference_index = reference_index
         if topic_seed_file:
             self.seed_matrix = get_seed_matrix_from_file(topic_seed_file, vocabulary, ctx)
         
@@ -254,24 +259,33 @@ class BowVAETrainer(BaseTrainer):
         if c_args.vocab_file and c_args.tr_vec_file:
             vpath = Path(c_args.vocab_file)
             tpath = Path(c_args.tr_vec_file)
-            if not (vpath.is_file() and tpath.is_file()):
+            if not (vpath.is_file() and tpath.exists()):
                 raise Exception("Vocab file {} and/or training vector file {} do not exist"
                                 .format(c_args.vocab_file, c_args.tr_vec_file))
         logging.info("Loading data via pre-computed vocabulary and sparse vector format document representation")
         vocab = load_vocab(c_args.vocab_file, encoding=c_args.str_encoding)
         voc_size = len(vocab)
-        X, y, wd_freqs, _ = file_to_data(c_args.tr_vec_file, voc_size)
+        tr_corpus = None
+        if is_sharded_corpus(c_args.tr_vec_file):
+            tr_corpus = ShardedCorpus(c_args.tr_vec_file, voc_size)
+            n_labels = int(tr_corpus.max_label + 1)
+        else:
+            X, y, wd_freqs, _ = file_to_data(c_args.tr_vec_file, voc_size)
+            n_labels = int(float(np.max(y)) + 1)
         model_out_dir = c_args.model_dir if c_args.model_dir else os.path.join(log_out_dir, 'MODEL')
-        n_labels = int(float(np.max(y)) + 1)
         if not os.path.exists(model_out_dir):
             os.mkdir(model_out_dir)
-        return cls(vocab, c_args.tr_vec_file, c_args.val_vec_file,
-                   coherence_via_encoder=c_args.encoder_coherence,
-                   log_out_dir=log_out_dir,
-                   model_out_dir=model_out_dir,
-                   pretrained_param_file=c_args.pretrained_param_file, topic_seed_file=c_args.topic_seed_file,
-                   use_labels_as_covars=c_args.use_labels_as_covars,
-                   use_gpu=c_args.use_gpu, n_labels=n_labels, val_each_epoch=val_each_epoch)
+        trainer = cls(vocab, c_args.tr_vec_file, c_args.val_vec_file,
+                      coherence_via_encoder=c_args.encoder_coherence,
+                      log_out_dir=log_out_dir,
+                      model_out_dir=model_out_dir,
+                      pretrained_param_file=c_args.pretrained_param_file, topic_seed_file=c_args.topic_seed_file,
+                      use_labels_as_covars=c_args.use_labels_as_covars,
+                      use_gpu=c_args.use_gpu, n_labels=n_labels, val_each_epoch=val_each_epoch,
+                      reference_index=c_args.reference_index)
+        if tr_corpus is not None:
+            trainer.corpus_cache[c_args.tr_vec_file] = tr_corpus ## reuse the streaming pass made to find the labels
+        return trainer
 
 
     def pre_cache_vocabularies(self, sources):
@@ -301,16 +315,19 @@ class BowVAETrainer(BaseTrainer):
         """
         embedding_source = config.embedding.source
         vocab, _ = self._initialize_vocabulary(embedding_source)
+        ## index arrays are memory-mapped, so opening the index for each evaluation is cheap
+        reference_index = CooccurrenceIndex.load(self.reference_index) if self.reference_index else None
         if self.use_labels_as_covars:
             estimator = CovariateBowEstimator.from_config(self.n_labels, config, vocab,
                                                      pretrained_param_file=self.pretrained_param_file,
-                                                     reporter=reporter, ctx=ctx)
+                                                     reporter=reporter, ctx=ctx, reference_index=reference_index)
         else:
            estimator = BowEstimator.from_config(config, vocab, n_labels = self.n_labels,
                                                 coherence_via_encoder   = self.coherence_via_encoder,
                                                 validate_each_epoch     = self.validate_each_epoch,
                                                 pretrained_param_file   = self.pretrained_param_file,
                                                 coherence_coefficient   = self.coherence_coefficient,
+                                                reference_index         = reference_index,
                                                 reporter=reporter, ctx=ctx)
         return estimator
     
@@ -333,6 +350,12 @@ class BowVAETrainer(BaseTrainer):
         ctx_list = self._get_mxnet_visible_gpus() if self.use_gpu else [mx.cpu()]
         ctx = ctx_list[0]
         vae_estimator = self._get_estimator(config, reporter, ctx)
+        if isinstance(self.train_data_or_path, str) and is_sharded_corpus(self.train_data_or_path):
+            ## directory of shards: stream training and validation data from disk
+            tr_corpus = self._get_sharded_corpus(self.train_data_or_path)
+            val_corpus = self._get_sharded_corpus(self.test_data_or_path) if self.test_data_or_path else None
+            obj, v_res = vae_estimator.fit_with_validation_streaming(tr_corpus, val_corpus)
+            return vae_estimator, obj, v_res
         X, y = self._get_x_y_data(self.train_data_or_path)
         if self.test_data_or_path is None:
             vX, vy = None, None
@@ -341,6 +364,12 @@ class BowVAETrainer(BaseTrainer):
         obj, v_res = vae_estimator.fit_with_validation(X, y, vX, vy)
         return vae_estimator, obj, v_res
 
+    def _get_sharded_corpus(self, path):
+        ## shard boundaries and word frequencies are computed once and reused across model evaluations
+        if path not in self.corpus_cache:
+            self.corpus_cache[path] = ShardedCorpus(path, len(self.vocabulary))
+        return self.corpus_cache[path]
+
     def write_model(self, estimator):
         """Method to write an estimated model to disk
 
@@ -431,7 +460,7 @@ class SeqBowVEDTrainer(BaseTrainer):
         logging.info('Number of examples: {}'.format(num_examples))
         seq_ved_estimator = SeqBowEstimator.from_config(config, bert_base, vectorizer.get_vocab(), n_labels=len(classes),
                                                         log_interval=self.log_interval,
-                                                        reporter=reporter, ctx=ctx)
+                                                        reporter=reporter, bert_vocab=bert_vocab, ctx=ctx)
         obj, v_res = \
             seq_ved_estimator.fit_with_validation(tr_dataset, val_dataset, num_examples, aux_data=(aux_ds is not None))
         return seq_ved_estimator, obj, v_res
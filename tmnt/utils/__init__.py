@@ -3,10 +3,20 @@
 Copyright (c) 2019 The MITRE Corporation.
 """
 
+import importlib
 
-from .log_utils import *
-from .mat_utils import *
-from .random import *
-##from .pubmed_utils import *
+## Submodules are imported on first attribute access so that numpy-only utilities
+## (e.g. tmnt.utils.recalibrate) can be imported without importing MXNet
+_submodules = ['log_utils', 'mat_utils', 'random', 'cache']
+##_submodules += ['pubmed_utils']
 
-__all__ = log_utils.__all__ + mat_utils.__all__ + random.__all__ 
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    modules = [importlib.import_module('.' + m, __name__) for m in _submodules]
+    if name == '__all__':
+        return [n for m in modules for n in m.__all__]
+    for m in modules:
+        if name in m.__all__:
+            return getattr(m, name)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
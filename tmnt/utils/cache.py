@@ -0,0 +1,105 @@
+# coding: utf-8
+# Copyright (c) 2021. The MITRE Corporation.
+"""
+Bounded LRU cache for document encodings and predictions keyed by document content.
+"""
+
+import sys
+import time
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+__all__ = ['EncodingCache']
+
+_ENTRY_OVERHEAD = 200 ## approximate per-entry bytes for the key, timestamp and dictionary slot
+
+
+def _normalize_text(txt):
+    return ' '.join(txt.split())
+
+def _sizeof(value):
+    if hasattr(value, 'size') and hasattr(value, 'dtype'): ## NumPy or MXNet arrays
+        return value.size * np.dtype(value.dtype).itemsize
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class EncodingCache(object):
+    """Least-recently-used cache mapping document content to encodings (or predictions).
+
+    Keys are digests of the whitespace-normalized text together with any parameters that affect the cached
+    value. The cache is bound to a model identifier; binding it to a different model (e.g. when a model is
+    reloaded) clears all entries.
+
+    Parameters:
+        max_entries (int): Maximum number of cached entries
+        max_bytes (int): Optional bound on the (approximate) total size of cached values in bytes
+        ttl (float): Optional time-to-live in seconds after which entries are treated as missing
+    """
+    def __init__(self, max_entries=100000, max_bytes=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.model_id = None
+        self._entries = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, model_id):
+        """Associate the cache with a model, clearing it if it currently holds entries for a different model"""
+        if model_id != self.model_id:
+            self.clear()
+            self.model_id = model_id
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
+
+    def text_key(self, txt, *params):
+        """Cache key for a text string and any parameters affecting the cached value"""
+        md5 = hashlib.md5(_normalize_text(txt).encode('utf-8'))
+        md5.update(repr(params).encode('utf-8'))
+        return md5.hexdigest()
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.n_bytes -= size
+
+    def get(self, key):
+        """Cached value for `key` (marked as most recently used) or None"""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Add (or replace) an entry, evicting least-recently-used entries to satisfy the size bounds"""
+        if key in self._entries:
+            self._remove(key)
+        size = _sizeof(value) + _ENTRY_OVERHEAD
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, time.monotonic())
+        self.n_bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.n_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_stats(self):
+        """Entry count, approximate size in bytes and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'bytes': self.n_bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': (self.hits / lookups) if lookups > 0 else 0.0}
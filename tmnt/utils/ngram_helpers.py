@@ -2,9 +2,19 @@
 Copyright (c) 2019 The MITRE Corporation.
 """
 
+import io
+import os
+import json
+import glob
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+
 from collections import Counter
+from typing import Optional
+
+__all__ = ['UnigramReader', 'CooccurrenceIndex']
 
-from itertools import combinations as C
 
 class UnigramReader(object):
     def __init__(self, vocab_file):
@@ -14,28 +24,243 @@ class UnigramReader(object):
                 _, count = line.strip().split()
                 self.unigrams[i] = int(count)
 
-                
-class BigramReader(object):
-    def __init__(self, training_file):
-        self.bigrams = Counter()
-        self.unigrams = Counter()
-        self.n_docs = 0
-        with open(training_file) as f:
-            for line in f:
-                self.n_docs += 1
-                label, *word_occurrences = line.strip().split()
-                counts = sorted(map(lambda s: int(s.split(":")[0]), word_occurrences))
-                for w in counts:
-                    self.unigrams[w] += 1
-                for (w_i, w_j) in C(counts, 2):
-                    # If we've previously stored this in a different order, keep storing it that way
-                    ## BRW - leaving this here, but it shouldn't happen as we've sorted these
-                    if self.bigrams[(w_j, w_i)] != 0:
-                        self.bigrams[(w_j, w_i)] += 1
-                    else:
-                        self.bigrams[(w_i, w_j)] += 1
+
+class CooccurrenceIndex(object):
+    """Document co-occurrence index over a reference corpus.
+
+    Holds a sparse symmetric matrix of co-document frequencies (the diagonal holds
+    the document frequency of each term) along with the document frequency vector
+    and the number of documents. An index is built by streaming over a corpus in chunks
+    and may be saved to a directory with files named by the corpus checksum; saved
+    indices are opened memory-mapped so that count lookups never require loading
+    the full matrix.
+
+    Parameters:
+        doc_freqs (:class:`numpy.ndarray`): Document frequency for each term, shape (V,)
+        indptr (:class:`numpy.ndarray`): CSR row pointers of the co-document frequency matrix
+        indices (:class:`numpy.ndarray`): CSR column indices (sorted within each row)
+        data (:class:`numpy.ndarray`): CSR co-document frequencies
+        n_docs (int): Number of documents in the corpus
+        checksum (str): Checksum of the corpus the index was built from
+    """
+    def __init__(self, doc_freqs, indptr, indices, data, n_docs, checksum=None):
+        self.doc_freqs = doc_freqs
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_docs = n_docs
+        self.checksum = checksum
+
+    @property
+    def vocab_size(self):
+        return self.doc_freqs.shape[0]
+
+    def doc_freq(self, w: int) -> int:
+        """Number of documents containing term `w`"""
+        return int(self.doc_freqs[w]) if w < self.vocab_size else 0
+
+    def co_doc_freq(self, w1: int, w2: int) -> int:
+        """Number of documents containing both terms `w1` and `w2`"""
+        if w1 >= self.vocab_size or w2 >= self.vocab_size:
+            return 0
+        start, end = self.indptr[w1], self.indptr[w1+1]
+        row = self.indices[start:end]
+        i = np.searchsorted(row, w2)
+        if i < row.shape[0] and row[i] == w2:
+            return int(self.data[start + i])
+        return 0
+
+    def get_counts(self, ids):
+        """Document frequencies and co-document frequencies restricted to the provided term ids.
+
+        Parameters:
+            ids (list): Term ids
+
+        Returns:
+            (tuple): Tuple of document frequencies, shape (U,), and co-document frequencies, shape (U, U)
+        """
+        ids = np.asarray(ids, dtype='int64')
+        bigram_cnts = np.zeros((ids.shape[0], ids.shape[0]), dtype='int64')
+        in_vocab = ids < self.vocab_size
+        order = np.argsort(ids)
+        sorted_ids = ids[order]
+        for i, w in enumerate(ids):
+            if not in_vocab[i]:
+                continue
+            start, end = self.indptr[w], self.indptr[w+1]
+            row = self.indices[start:end]
+            pos = np.minimum(np.searchsorted(row, sorted_ids), max(row.shape[0] - 1, 0))
+            if row.shape[0] > 0:
+                found = row[pos] == sorted_ids
+                bigram_cnts[i, order[found]] = self.data[start + pos[found]]
+        unigram_cnts = np.zeros(ids.shape[0], dtype='int64')
+        unigram_cnts[in_vocab] = self.doc_freqs[ids[in_vocab]]
+        return unigram_cnts, bigram_cnts
+
+    @staticmethod
+    def _file_checksum(path, block_size=1 << 20):
+        md5 = hashlib.md5()
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(block_size), b''):
+                md5.update(block)
+        return md5.hexdigest()
+
+    @staticmethod
+    def _csr_checksum(X):
+        md5 = hashlib.md5()
+        md5.update(np.array(X.shape, dtype='int64').tobytes())
+        md5.update(np.ascontiguousarray(X.indptr, dtype='int64').tobytes())
+        md5.update(np.ascontiguousarray(X.indices, dtype='int64').tobytes())
+        md5.update(np.ascontiguousarray(X.data > 0).tobytes())
+        return md5.hexdigest()
+
+    @staticmethod
+    def _index_files(index_dir, checksum):
+        prefix = os.path.join(index_dir, checksum)
+        return {'meta': prefix + '.meta.json',
+                'doc_freqs': prefix + '.df.npy',
+                'indptr': prefix + '.cooc.indptr.npy',
+                'indices': prefix + '.cooc.indices.npy',
+                'data': prefix + '.cooc.data.npy'}
+
+    @staticmethod
+    def _iter_svmlight_chunks(sp_file, chunk_size):
+        rows, indptr = [], [0]
+        with io.open(sp_file, 'r') as fp:
+            for line in fp:
+                _, *word_occurrences = line.strip().split()
+                for el in word_occurrences:
+                    w, c = el.split(':')
+                    if float(c) > 0:
+                        rows.append(int(w))
+                indptr.append(len(rows))
+                if len(indptr) > chunk_size:
+                    yield np.array(rows, dtype='int64'), np.array(indptr, dtype='int64')
+                    rows, indptr = [], [0]
+        if len(indptr) > 1:
+            yield np.array(rows, dtype='int64'), np.array(indptr, dtype='int64')
+
+    @staticmethod
+    def _iter_csr_chunks(X, chunk_size):
+        for i in range(0, X.shape[0], chunk_size):
+            chunk = (X[i:i+chunk_size] > 0).tocsr()
+            yield chunk.indices.astype('int64'), chunk.indptr.astype('int64')
+
+    @classmethod
+    def _build(cls, chunks, vocab_size, checksum):
+        cooc = None
+        n_docs = 0
+        for indices, indptr in chunks:
+            n_rows = indptr.shape[0] - 1
+            n_docs += n_rows
+            n_cols = max(vocab_size or 0, int(indices.max()) + 1 if indices.shape[0] > 0 else 0)
+            occur = sp.csr_matrix((np.ones(indices.shape[0], dtype='int64'), indices, indptr), shape=(n_rows, n_cols))
+            occur.sum_duplicates()
+            occur.data[:] = 1
+            chunk_cooc = (occur.T @ occur).tocsr()
+            if cooc is None:
+                cooc = chunk_cooc
+            else:
+                size = max(cooc.shape[0], chunk_cooc.shape[0])
+                cooc.resize((size, size))
+                chunk_cooc.resize((size, size))
+                cooc = cooc + chunk_cooc
+        if cooc is None:
+            cooc = sp.csr_matrix((vocab_size or 0, vocab_size or 0), dtype='int64')
+        cooc = cooc.tocsr()
+        cooc.sum_duplicates()
+        cooc.sort_indices()
+        doc_freqs = np.asarray(cooc.diagonal(), dtype='int64')
+        return cls(doc_freqs, cooc.indptr.astype('int64'), cooc.indices.astype('int64'), cooc.data.astype('int64'),
+                   n_docs, checksum=checksum)
+
+    @classmethod
+    def from_svmlight_file(cls, sp_file: str, vocab_size: int = None, index_dir: str = None,
+                           chunk_size: int = 10000) -> 'CooccurrenceIndex':
+        """Build (or load a previously saved) index by streaming over a corpus in sparse vector (svmlight) format.
+
+        Parameters:
+            sp_file: Path to corpus in sparse vector format
+            vocab_size: Size of the vocabulary (inferred from the largest term id if not provided)
+            index_dir: Directory in which to look for a saved index and in which to save a newly built index
+            chunk_size: Number of documents to process at a time
+
+        Returns:
+            Co-occurrence index for the corpus
+        """
+        checksum = cls._file_checksum(sp_file)
+        if index_dir is not None and cls.exists(index_dir, checksum):
+            return cls.load(index_dir, checksum)
+        index = cls._build(cls._iter_svmlight_chunks(sp_file, chunk_size), vocab_size, checksum)
+        if index_dir is not None:
+            index.save(index_dir)
+        return index
+
+    @classmethod
+    def from_csr(cls, X: sp.csr_matrix, index_dir: str = None, chunk_size: int = 10000) -> 'CooccurrenceIndex':
+        """Build (or load a previously saved) index over a document-term matrix, processed in chunks of rows.
+
+        Parameters:
+            X: Document-term matrix
+            index_dir: Directory in which to look for a saved index and in which to save a newly built index
+            chunk_size: Number of documents to process at a time
+
+        Returns:
+            Co-occurrence index for the corpus
+        """
+        X = sp.csr_matrix(X)
+        checksum = cls._csr_checksum(X)
+        if index_dir is not None and cls.exists(index_dir, checksum):
+            return cls.load(index_dir, checksum)
+        index = cls._build(cls._iter_csr_chunks(X, chunk_size), X.shape[1], checksum)
+        if index_dir is not None:
+            index.save(index_dir)
+        return index
+
+    @classmethod
+    def exists(cls, index_dir: str, checksum: str) -> bool:
+        return os.path.exists(cls._index_files(index_dir, checksum)['meta'])
+
+    def save(self, index_dir: str) -> None:
+        """Save index files, named by the corpus checksum, to `index_dir`"""
+        if not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        files = self._index_files(index_dir, self.checksum)
+        np.save(files['doc_freqs'], self.doc_freqs)
+        np.save(files['indptr'], self.indptr)
+        np.save(files['indices'], self.indices)
+        np.save(files['data'], self.data)
+        ## write metadata last so a partially written index is never picked up
+        with io.open(files['meta'], 'w') as fp:
+            json.dump({'n_docs': int(self.n_docs), 'vocab_size': int(self.vocab_size), 'checksum': self.checksum}, fp)
+
+    @classmethod
+    def load(cls, index_dir: str, checksum: Optional[str] = None) -> 'CooccurrenceIndex':
+        """Open a saved index with all arrays memory-mapped
+
+        Parameters:
+            index_dir: Directory containing saved index files
+            checksum: Checksum of the corpus; may be omitted if `index_dir` holds a single index
+
+        Returns:
+            Co-occurrence index with memory-mapped arrays
+        """
+        if checksum is None:
+            metas = glob.glob(os.path.join(index_dir, '*.meta.json'))
+            if len(metas) != 1:
+                raise Exception("Expected a single co-occurrence index in {}, found {}".format(index_dir, len(metas)))
+            checksum = os.path.basename(metas[0])[:-len('.meta.json')]
+        files = cls._index_files(index_dir, checksum)
+        with io.open(files['meta'], 'r') as fp:
+            meta = json.load(fp)
+        return cls(np.load(files['doc_freqs'], mmap_mode='r'),
+                   np.load(files['indptr'], mmap_mode='r'),
+                   np.load(files['indices'], mmap_mode='r'),
+                   np.load(files['data'], mmap_mode='r'),
+                   meta['n_docs'], checksum=checksum)
+
 
 if __name__ == "__main__":
     import sys
-    reader = BigramReader(sys.argv[1])
-    print(reader.bigrams.most_common(10))
+    index = CooccurrenceIndex.from_svmlight_file(sys.argv[1], index_dir=(sys.argv[2] if len(sys.argv) > 2 else None))
+    print("Documents: {}, vocabulary size: {}".format(index.n_docs, index.vocab_size))
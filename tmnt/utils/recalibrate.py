@@ -5,7 +5,6 @@ Utilities for recalibrating posterior distributions.
 """
 import math
 import numpy as np
-from scipy.optimize import minimize_scalar
 
 def entropy(x):
     return - ( x * np.log(x) ).sum()
@@ -14,37 +13,45 @@ def rescale(x, t):
     x0 = x ** t
     return x0 / np.sum(x0)
 
-def recalibrate_scores(x, target_entropy=1.0):
-    e_x = entropy(x)
-    entropy_ratio = e_x / np.log(x.shape[0])
+def _batch_rescale(x, t):
+    x0 = x ** t[:, None]
+    return x0 / x0.sum(axis=1, keepdims=True)
+
+def _batch_entropy(x):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return - np.where(x > 0, x * np.log(x), 0.0).sum(axis=1)
+
+def recalibrate_scores_batch(x, target_entropy=1.0, n_iter=40):
+    """Recalibrate each row of a matrix of posterior distributions by finding, for each row, the temperature
+    (exponent) at which the rescaled distribution has entropy closest to `target_entropy`. All rows are solved
+    together with a vectorized bisection, using that entropy decreases monotonically with the exponent.
+
+    Parameters:
+        x (:class:`numpy.ndarray`): Distributions of shape (N, n_latent), each row summing to 1
+        target_entropy (float): Target entropy for each recalibrated row
+        n_iter (int): Number of bisection steps
+
+    Returns:
+        (:class:`numpy.ndarray`): Recalibrated distributions of shape (N, n_latent)
+    """
+    x = np.asarray(x, dtype='float64')
+    e_x = _batch_entropy(x)
+    entropy_ratio = e_x / np.log(x.shape[1])
     ## Some heuristics to rescale and get entropies in the ball-park of 1.0
     ## This seems to be necessary as sometimes the line search is thrown off around boundaries
-    if e_x < 1e-20:
-        x = rescale(x, 0.1)
-    elif e_x < 0.01:
-        x = rescale(x, 0.5)
-    elif entropy_ratio > 0.998:
-        x = rescale(x, 32.0)
-    elif entropy_ratio > 0.994:
-        x = rescale(x, 16.0)
-    elif entropy_ratio > 0.98:
-        x = rescale(x, 8.0)
-    elif e_x > 2.0:
-        x = rescale(x, 4.0)
-    e_x = entropy(x)
-    if e_x < target_entropy:
-        bounds = (0.05, 1.0)
-    else:
-        bounds = (1.0, 32.0)
-    ## line search
-    def obj_fn(t):
-        rescaled = rescale(x, t)
-        mval = np.min(rescaled)
-        mxval = np.max(rescaled)
-        if mval < 1e-50 or (1.0 - mxval) < 1e-50:
-            return target_entropy
-        else:
-            return abs( entropy(rescale(x, t)) - target_entropy )
-    res = minimize_scalar(obj_fn, method='bounded', bounds=bounds)
-    return rescale(x, res.x)
+    t0 = np.select([e_x < 1e-20, e_x < 0.01, entropy_ratio > 0.998, entropy_ratio > 0.994, entropy_ratio > 0.98, e_x > 2.0],
+                   [0.1, 0.5, 32.0, 16.0, 8.0, 4.0], default=1.0)
+    x = _batch_rescale(x, t0)
+    e_x = _batch_entropy(x)
+    lo = np.where(e_x < target_entropy, 0.05, 1.0)
+    hi = np.where(e_x < target_entropy, 1.0, 32.0)
+    ## bisection on the exponent; converges to a bound when the target is not attainable within it
+    for _ in range(n_iter):
+        mid = (lo + hi) / 2.0
+        above = _batch_entropy(_batch_rescale(x, mid)) > target_entropy
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+    return _batch_rescale(x, (lo + hi) / 2.0)
 
+def recalibrate_scores(x, target_entropy=1.0):
+    return recalibrate_scores_batch(np.expand_dims(x, 0), target_entropy=target_entropy)[0]